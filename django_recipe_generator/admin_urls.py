@@ -0,0 +1,20 @@
+"""Admin URLconf.
+
+Kept separate from the root URLconf so it can be loaded on first use
+(see ``LAZY_SUBSYSTEMS``); registering the ``ModelAdmin`` classes then
+happens here instead of at app loading.
+"""
+from django.conf import settings
+from django.contrib import admin
+from allauth.account.decorators import secure_admin_login
+
+app_name = 'admin'
+
+if 'admin' in settings.LAZY_SUBSYSTEMS:
+    # SimpleAdminConfig skips autodiscovery in AppConfig.ready()
+    admin.autodiscover()
+
+# allauth admin
+admin.site.login = secure_admin_login(admin.site.login)
+
+urlpatterns = admin.site.get_urls()
@@ -2,6 +2,8 @@ import os
 from celery import Celery
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "django_recipe_generator.settings")
-app = Celery("django_recipe_generator")
+# publish tasks in a tracing span, see django_recipe_generator.tracing
+app = Celery("django_recipe_generator",
+             task_cls="django_recipe_generator.tracing:TracedTask")
 app.config_from_object("django.conf:settings", namespace="CELERY")
 app.autodiscover_tasks()
\ No newline at end of file
@@ -0,0 +1,137 @@
+"""Read replica routing for the search, list and detail views.
+
+``DATABASE_REPLICA_URLS`` adds one ``replicaN`` alias per replica. Reads
+go to a replica only while a view that opted in is handling the request
+(``ReplicaRoutingMiddleware``):
+
+- Django views list the HTTP methods whose reads may use a replica in
+  ``replica_methods``, DRF viewsets their actions in ``replica_actions``,
+- everything else (writes, other views, Celery tasks, management
+  commands, reads inside a transaction) uses ``default``.
+
+Read-your-writes: a request that wrote pins its client to the primary
+for ``REPLICA_PIN_SECONDS`` with a cookie, and reads after a write in the
+same request stay on the primary. Replicas lagging more than
+``REPLICA_MAX_LAG`` seconds, or failing the lag check, are skipped until
+the next check (``REPLICA_CHECK_INTERVAL``); with none left reads fall
+back to the primary.
+"""
+import contextlib
+import logging
+import random
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+
+logger = logging.getLogger(__name__)
+
+PIN_COOKIE = 'db_primary'
+
+# seconds since the standby last replayed WAL, 0 when it is caught up
+# (NULL on a primary)
+PG_REPLICATION_LAG = """
+SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+       ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END
+"""
+
+
+class RoutingState:
+    """Replica routing of the request being handled."""
+
+    def __init__(self, pinned=False):
+        """Start with reads on the primary until the view is known."""
+        self.pinned = pinned
+        self.replica_reads = False
+        self.wrote = False
+
+
+_current_state = ContextVar('replica_routing', default=None)
+
+_health = {}  # alias: (checked at, healthy)
+
+
+@contextlib.contextmanager
+def routing(pinned=False):
+    """Route the reads of the enclosed request by a new ``RoutingState``."""
+    state = RoutingState(pinned)
+    token = _current_state.set(state)
+    try:
+        yield state
+    finally:
+        _current_state.reset(token)
+
+
+def current_state():
+    """Return the ``RoutingState`` of the current request, or None."""
+    return _current_state.get()
+
+
+def reads_from_replica(request, view_func):
+    """Whether ``view_func`` opted in to replica reads for ``request``."""
+    view_class = getattr(view_func, 'cls', getattr(view_func, 'view_class', None))
+    actions = getattr(view_func, 'actions', None)
+    if actions:  # DRF viewset
+        action = actions.get(request.method.lower())
+        return action in getattr(view_class, 'replica_actions', ())
+    return request.method in getattr(view_class, 'replica_methods', ())
+
+
+def replication_lag(alias):
+    """Seconds ``alias`` lags behind the primary (0 if it cannot tell)."""
+    connection = connections[alias]
+    if connection.vendor != 'postgresql':
+        return 0
+    with connection.cursor() as cursor:
+        cursor.execute(PG_REPLICATION_LAG)
+        lag = cursor.fetchone()[0]
+    return float(lag or 0)
+
+
+def is_healthy(alias):
+    """Whether ``alias`` answers and is within ``REPLICA_MAX_LAG``, cached."""
+    now = time.monotonic()
+    checked_at, healthy = _health.get(alias, (None, False))
+    if checked_at is not None and now - checked_at < settings.REPLICA_CHECK_INTERVAL:
+        return healthy
+    try:
+        lag = replication_lag(alias)
+    except DatabaseError as exc:
+        logger.warning("Replica '%s' unavailable: %s", alias, exc)
+        healthy = False
+    else:
+        healthy = lag <= settings.REPLICA_MAX_LAG
+        if not healthy:
+            logger.warning("Replica '%s' lags %.1fs behind, reading from the "
+                           "primary", alias, lag)
+    _health[alias] = (now, healthy)
+    return healthy
+
+
+class ReplicaRouter:
+    """Send the reads of opted-in views to a healthy replica."""
+
+    def db_for_read(self, model, **hints):
+        state = current_state()
+        if state is None or not state.replica_reads or state.pinned or state.wrote:
+            return None
+        if 'instance' in hints or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return None  # the instance's database, or the transaction's
+        replicas = [alias for alias in settings.DATABASE_REPLICAS
+                    if is_healthy(alias)]
+        return random.choice(replicas) if replicas else None
+
+    def db_for_write(self, model, **hints):
+        """Write to the primary, also objects read from a replica."""
+        state = current_state()
+        if state is not None:
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        """Relate objects from the primary and its replicas: same data."""
+        databases = {DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
@@ -0,0 +1,216 @@
+"""Prometheus metrics of the web and Celery processes.
+
+Metrics are updated in-process and exposed by ``metrics_view``. With
+several processes (gunicorn workers, the Celery worker pool) point
+``PROMETHEUS_MULTIPROC_DIR`` at a directory they share: every process
+then writes its values to files named after its pid there and the view
+merges them, so any web worker reports the totals of all of them.
+
+The directory must be empty at startup and only shared by processes of
+one machine (container): pids are only unique there, and files of an
+earlier run would be merged in. The web and Celery containers thus each
+get their own, and the Celery worker serves its metrics itself on
+``CELERY_METRICS_PORT`` (``start_worker_exporter``).
+"""
+import hmac
+import logging
+import os
+
+from celery.signals import task_postrun, worker_process_shutdown, worker_ready
+from django.conf import settings
+from django.core.signals import request_finished
+from django.http import HttpResponse, HttpResponseForbidden, JsonResponse
+from django.views.decorators.cache import never_cache
+from django.views.decorators.http import require_GET
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram,
+    generate_latest, multiprocess, start_http_server)
+from prometheus_client.core import GaugeMetricFamily
+
+logger = logging.getLogger(__name__)
+
+# Gemini answers take seconds, the default buckets stop at 10s
+GEMINI_BUCKETS = (0.25, 0.5, 1, 2, 4, 8, 16, 32, 64)
+
+REQUEST_DURATION = Histogram(
+    'recipe_generator_request_duration_seconds',
+    'Time to handle a request, by view', ['view', 'method', 'status'])
+RENDER_DURATION = Histogram(
+    'recipe_generator_render_duration_seconds',
+    'Time to render template and API responses, by view', ['view'])
+SEARCH_DURATION = Histogram(
+    'recipe_generator_search_duration_seconds',
+    'Time to search recipes and fetch a page of results, by view', ['view'])
+ANNOTATE_DURATION = Histogram(
+    'recipe_generator_annotate_recipes_duration_seconds',
+    'Time of the matching/missing ingredient analysis of a page')
+GEMINI_DURATION = Histogram(
+    'recipe_generator_gemini_request_duration_seconds',
+    'Time of Gemini twist requests, failed ones included',
+    buckets=GEMINI_BUCKETS)
+GEMINI_ERRORS = Counter(
+    'recipe_generator_gemini_errors',
+    'Failed Gemini twist requests, by exception', ['error'])
+TWIST_STATUS = Counter(
+    'recipe_generator_twist_status',
+    'AI twist task status changes, by ai_generation_status', ['status'])
+CACHE_REQUESTS = Counter(
+    'recipe_generator_cache_requests',
+    'Cache lookups, by cache and hit/miss', ['cache', 'result'])
+# summed over the live processes: each has its own pools
+DB_POOL_CONNECTIONS = Gauge(
+    'recipe_generator_db_pool_connections',
+    'Connections of the psycopg pools, by database and state (open: idle or '
+    'in use, idle, max)', ['database', 'state'], multiprocess_mode='livesum')
+DB_POOL_WAITING = Gauge(
+    'recipe_generator_db_pool_waiting',
+    'Requests waiting for a pool connection, by database', ['database'],
+    multiprocess_mode='livesum')
+DB_POOL_REQUESTS = Counter(
+    'recipe_generator_db_pool_requests',
+    'Connections borrowed from the pools, by database and whether they were '
+    'served at once, after waiting or failed (pool timeout)',
+    ['database', 'result'])
+DB_POOL_WAIT = Counter(
+    'recipe_generator_db_pool_wait_seconds',
+    'Time spent waiting for pool connections, by database', ['database'])
+DB_POOL_LOST = Counter(
+    'recipe_generator_db_pool_connections_lost',
+    'Pool connections found broken, by database', ['database'])
+
+
+def record_cache_lookup(name, value):
+    """Count a lookup of cache ``name`` (None is a miss) and return ``value``."""
+    CACHE_REQUESTS.labels(name, 'miss' if value is None else 'hit').inc()
+    return value
+
+
+def record_pool_stats(**kwargs):
+    """Update the ``db_pool`` metrics from the pools of this process.
+
+    Connected to ``request_finished`` and Celery's ``task_postrun``.
+    """
+    from django_recipe_generator.services import db_pools
+
+    for alias, stats in db_pools.pool_stats(pop=True).items():
+        DB_POOL_CONNECTIONS.labels(alias, 'open').set(stats.get('pool_size', 0))
+        DB_POOL_CONNECTIONS.labels(alias, 'idle').set(stats.get('pool_available', 0))
+        DB_POOL_CONNECTIONS.labels(alias, 'max').set(stats.get('pool_max', 0))
+        DB_POOL_WAITING.labels(alias).set(stats.get('requests_waiting', 0))
+        queued = stats.get('requests_queued', 0)
+        errors = stats.get('requests_errors', 0)
+        served = stats.get('requests_num', 0) - queued
+        for result, value in (('served', served), ('queued', queued - errors),
+                              ('failed', errors)):
+            if value > 0:
+                DB_POOL_REQUESTS.labels(alias, result).inc(value)
+        if stats.get('requests_wait_ms'):
+            DB_POOL_WAIT.labels(alias).inc(stats['requests_wait_ms'] / 1000)
+        if stats.get('connections_lost'):
+            DB_POOL_LOST.labels(alias).inc(stats['connections_lost'])
+
+
+request_finished.connect(record_pool_stats, dispatch_uid='record_pool_stats')
+task_postrun.connect(record_pool_stats, weak=False)
+
+
+class QueueLengthCollector:
+    """Length of the Celery queues, read from the Redis broker on scrape."""
+
+    def describe(self):
+        """Describe the gauge without a broker round trip (on registration)."""
+        yield self.gauge()
+
+    def collect(self):
+        """Yield the ``celery_queue_length`` gauge."""
+        from django_recipe_generator.celery import app
+        from django_recipe_generator.services.redis_client import get_redis
+
+        gauge = self.gauge()
+        queue = app.conf.task_default_queue
+        try:
+            gauge.add_metric([queue], get_redis().llen(queue))
+        except Exception:
+            logger.warning("Cannot read the length of Celery queue %s", queue,
+                           exc_info=True)
+        yield gauge
+
+    @staticmethod
+    def gauge():
+        return GaugeMetricFamily('recipe_generator_celery_queue_length',
+                                 'Tasks waiting in the Celery queue', labels=['queue'])
+
+
+REGISTRY.register(QueueLengthCollector())
+
+
+def exposed_registry():
+    """Registry with the metrics of every process (``PROMETHEUS_MULTIPROC_DIR``)."""
+    if not os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        return REGISTRY
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    registry.register(QueueLengthCollector())
+    return registry
+
+
+@worker_ready.connect
+def start_worker_exporter(**kwargs):
+    """Serve the Celery worker's metrics on ``CELERY_METRICS_PORT``, if set.
+
+    Started in the main worker process once its pool is up, for Prometheus
+    to scrape next to the web ``/metrics``.
+    """
+    port = os.getenv('CELERY_METRICS_PORT')
+    if port:
+        start_http_server(int(port), registry=exposed_registry())
+
+
+@worker_process_shutdown.connect
+def mark_worker_process_dead(pid, **kwargs):
+    """Drop the live gauges of an exiting Celery pool process."""
+    if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        multiprocess.mark_process_dead(pid)
+
+
+def authorized(request):
+    """Whether ``request`` carries ``Authorization: Bearer <METRICS_TOKEN>``.
+
+    Without the setting only ``DEBUG`` (development) servers answer.
+    """
+    if not settings.METRICS_TOKEN:
+        return settings.DEBUG
+    return hmac.compare_digest(
+        request.headers.get('Authorization', '').encode(),
+        f'Bearer {settings.METRICS_TOKEN}'.encode())
+
+
+@never_cache
+@require_GET
+def metrics_view(request):
+    """Prometheus text exposition of the metrics of every web process.
+
+    Requires ``Authorization: Bearer <METRICS_TOKEN>`` (see ``authorized``).
+    """
+    if not authorized(request):
+        return HttpResponseForbidden()
+
+    return HttpResponse(generate_latest(exposed_registry()),
+                        content_type=CONTENT_TYPE_LATEST)
+
+
+@never_cache
+@require_GET
+def db_health_view(request):
+    """JSON health of the databases and their connection pools.
+
+    Answers 503 when the primary database is unavailable; requires the
+    ``METRICS_TOKEN`` like ``metrics_view``.
+    """
+    from django_recipe_generator.services import db_pools
+
+    if not authorized(request):
+        return HttpResponseForbidden()
+    databases = db_pools.health()
+    return JsonResponse({'databases': databases},
+                        status=200 if databases['default']['ok'] else 503)
@@ -0,0 +1,408 @@
+"""Project-wide middleware.
+
+- ``TracingMiddleware``: a tracing span per request,
+- ``MetricsMiddleware``: request and rendering time metrics,
+- ``CompressionMiddleware``: Brotli/gzip response compression,
+- ``QueryProfilingMiddleware``: sampled per-request SQL profiling,
+- ``ReplicaRoutingMiddleware``: read replica routing of opted-in views.
+"""
+import hashlib
+import heapq
+import json
+import logging
+import random
+import re
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.utils.cache import patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+from django.utils.text import compress_string
+
+from django_recipe_generator import db_router, metrics, tracing
+
+try:
+    import brotli
+except ImportError:  # optional: pip install .[brotli]
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+COMPRESSIBLE_TYPES = re.compile(
+    r'^(text/|application/(json|javascript|xml)|image/svg\+xml|[^;]*\+(json|xml))')
+
+
+def add_server_timing(response, name, duration_ms, description=None):
+    """Append a ``Server-Timing`` metric to ``response``."""
+    metric = f'{name};dur={duration_ms:.2f}'
+    if description:
+        metric += f';desc="{description}"'
+    existing = response.get('Server-Timing')
+    response['Server-Timing'] = f'{existing}, {metric}' if existing else metric
+
+
+def negotiate_encoding(accept_encoding):
+    """Return ``'br'``, ``'gzip'`` or None for an ``Accept-Encoding`` header.
+
+    Follows the q-values (``*`` covers unlisted codings) and prefers
+    Brotli on a tie; Brotli only when the ``brotli`` package is installed.
+    """
+    weights = {}
+    for part in accept_encoding.split(','):
+        coding, _, params = part.partition(';')
+        match = re.search(r'q=([0-9.]+)', params)
+        try:
+            weights[coding.strip().lower()] = float(match[1]) if match else 1.0
+        except ValueError:
+            continue
+    candidates = ('br', 'gzip') if brotli else ('gzip',)
+    best = max(candidates, key=lambda c: weights.get(c, weights.get('*', 0)))
+    return best if weights.get(best, weights.get('*', 0)) > 0 else None
+
+
+class TracingMiddleware:
+    """Handle each request in a server span, continuing a ``traceparent``.
+
+    Only used when tracing is configured (``TRACING_EXPORTER``).
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        """Opt out unless tracing is enabled."""
+        if not tracing.enabled():
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with self.span(request) as span:
+            response = self.get_response(request)
+            self.finish(span, request, response)
+        return response
+
+    async def __acall__(self, request):
+        """Async counterpart of ``__call__``."""
+        with self.span(request) as span:
+            response = await self.get_response(request)
+            self.finish(span, request, response)
+        return response
+
+    @staticmethod
+    def span(request):
+        return tracing.span(
+            request.method, kind='server',
+            context=tracing.propagate.extract(request.headers),
+            attributes={'http.request.method': request.method,
+                        'url.path': request.path})
+
+    @staticmethod
+    def finish(span, request, response):
+        """Name the span after the matched view and record the status."""
+        if request.resolver_match:
+            span.update_name(f'{request.method} {request.resolver_match.view_name}')
+        span.set_attribute('http.response.status_code', response.status_code)
+        if response.status_code >= 500:
+            span.set_status(tracing.trace.StatusCode.ERROR)
+
+
+class MetricsMiddleware(MiddlewareMixin):
+    """Observe request and response rendering times, by view name.
+
+    Template and DRF responses are rendered after the view returns, so the
+    render time runs from ``process_template_response`` to the response's
+    post-render callback.
+    """
+
+    def process_request(self, request):
+        request._metrics_started = time.perf_counter()
+
+    def process_template_response(self, request, response):
+        started = time.perf_counter()
+        view = self.view_name(request)
+        response.add_post_render_callback(
+            lambda r: metrics.RENDER_DURATION.labels(view).observe(
+                time.perf_counter() - started))
+        return response
+
+    def process_response(self, request, response):
+        started = getattr(request, '_metrics_started', None)
+        if started is not None:
+            metrics.REQUEST_DURATION.labels(
+                self.view_name(request), request.method, response.status_code,
+            ).observe(time.perf_counter() - started)
+        return response
+
+    @staticmethod
+    def view_name(request):
+        """URL name of the matched view (bounded label values)."""
+        match = getattr(request, 'resolver_match', None)
+        return match.view_name if match else 'unmatched'
+
+
+class CompressionMiddleware(MiddlewareMixin):
+    """Compress responses with Brotli or gzip, whichever the client prefers.
+
+    Like Django's ``GZipMiddleware`` (Vary, weak ETags, BREACH padding for
+    gzip) plus Brotli, a size threshold (``COMPRESSION_MIN_SIZE``) and a
+    content type check. Streaming responses are left alone so server-sent
+    events are not held back by the compressor.
+
+    Responses that can be shared between users (an ETag, no ``Vary:
+    Cookie``, not private) are cached compressed, keyed by a hash of the
+    body, so repeated representations are compressed only once. Each
+    compressed response reports the CPU time and ratio in ``Server-Timing``
+    (``compress;dur=0.84;desc="br 5.2x"``) and the debug log.
+    """
+
+    max_random_bytes = 100
+
+    def process_response(self, request, response):
+        if response.streaming or response.has_header('Content-Encoding'):
+            return response
+        if not COMPRESSIBLE_TYPES.match(response.get('Content-Type', '')):
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        if len(response.content) < settings.COMPRESSION_MIN_SIZE:
+            return response
+        encoding = negotiate_encoding(request.headers.get('Accept-Encoding', ''))
+        if encoding is None:
+            return response
+
+        started = time.thread_time()
+        content, cached = self.compress(response, encoding)
+        cpu_ms = (time.thread_time() - started) * 1000
+        if len(content) >= len(response.content):
+            return response
+
+        ratio = len(response.content) / len(content)
+        logger.debug("%s %s: %s %d -> %d bytes (%.1fx) in %.2f ms cpu%s",
+                     request.method, request.path, encoding,
+                     len(response.content), len(content), ratio, cpu_ms,
+                     ' (cached)' if cached else '')
+        add_server_timing(response, 'compress', cpu_ms,
+                          f"{encoding} {ratio:.1f}x{' cached' if cached else ''}")
+
+        response.content = content
+        response['Content-Length'] = str(len(content))
+        response['Content-Encoding'] = encoding
+        # the ETag must differ from the uncompressed representation's
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        return response
+
+    def compress(self, response, encoding):
+        """Return ``(compressed content, whether it came from the cache)``."""
+        if not self.is_shared(response):
+            return self._compress(response.content, encoding), False
+
+        digest = hashlib.blake2b(response.content, digest_size=16).hexdigest()
+        key = f'compressed:{encoding}:{digest}'
+        content = metrics.record_cache_lookup('compressed', cache.get(key))
+        if content is not None:
+            return content, True
+        content = self._compress(response.content, encoding)
+        cache.set(key, content, settings.COMPRESSION_CACHE_TIMEOUT)
+        return content, False
+
+    def _compress(self, content, encoding):
+        if encoding == 'br':
+            return brotli.compress(content, quality=settings.COMPRESSION_BROTLI_QUALITY)
+        return compress_string(content, max_random_bytes=self.max_random_bytes)
+
+    @staticmethod
+    def is_shared(response):
+        """Whether the same body is likely served again, to other users too."""
+        if not response.has_header('ETag'):
+            return False
+        if 'cookie' in response.get('Vary', '').lower():
+            return False
+        cache_control = response.get('Cache-Control', '')
+        return 'private' not in cache_control and 'no-store' not in cache_control
+
+
+class QueryProfile:
+    """Queries run while handling one request."""
+
+    def __init__(self):
+        """Start with no queries."""
+        self.count = 0
+        self.duration = 0.0
+        self.slowest = []  # min-heap of (seconds, sql)
+
+    def record(self, sql, duration):
+        """Add one executed statement."""
+        self.count += 1
+        self.duration += duration
+        entry = (duration, sql)
+        if len(self.slowest) < settings.QUERY_PROFILE_TOP_QUERIES:
+            heapq.heappush(self.slowest, entry)
+        elif self.slowest and entry > self.slowest[0]:
+            heapq.heapreplace(self.slowest, entry)
+
+
+_current_profile = ContextVar('query_profile', default=None)
+
+
+def record_query(execute, sql, params, many, context):
+    """Database execute wrapper timing queries into the current profile.
+
+    Installed on every connection; a no-op outside sampled requests. The
+    profile lives in a context variable, so queries that async views run
+    through ``sync_to_async`` threads are recorded as well.
+    """
+    profile = _current_profile.get()
+    if profile is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        profile.record(sql, time.perf_counter() - started)
+
+
+def install_query_recorder(connection, **kwargs):
+    """Add ``record_query`` to ``connection``'s execute wrappers, once."""
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+class QueryProfilingMiddleware:
+    """Profile the SQL of a sample of requests (``QUERY_PROFILE_SAMPLE_RATE``).
+
+    A sampled request gets a ``Server-Timing`` entry
+    (``db;dur=12.40;desc="7 queries"``) and a JSON log line with its query
+    count, DB time and slowest statements. It is logged as a warning, with
+    the exceeded thresholds in ``flags``, when a statement takes more than
+    ``QUERY_PROFILE_SLOW_QUERY_MS``, all statements more than
+    ``QUERY_PROFILE_SLOW_DB_MS`` or there are more than
+    ``QUERY_PROFILE_MAX_QUERIES`` queries. Unsampled requests only pay for
+    the random draw.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        """Install the query recorder on current and future connections."""
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+        connection_created.connect(install_query_recorder,
+                                   dispatch_uid='install_query_recorder')
+        for connection in connections.all(initialized_only=True):
+            install_query_recorder(connection)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if random.random() >= settings.QUERY_PROFILE_SAMPLE_RATE:
+            return self.get_response(request)
+
+        profile = QueryProfile()
+        token = _current_profile.set(profile)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current_profile.reset(token)
+        self.report(request, response, profile)
+        return response
+
+    async def __acall__(self, request):
+        """Async counterpart of ``__call__``."""
+        if random.random() >= settings.QUERY_PROFILE_SAMPLE_RATE:
+            return await self.get_response(request)
+
+        profile = QueryProfile()
+        token = _current_profile.set(profile)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current_profile.reset(token)
+        self.report(request, response, profile)
+        return response
+
+    def report(self, request, response, profile):
+        """Log the profile and add it to the ``Server-Timing`` header."""
+        db_ms = profile.duration * 1000
+        slowest = sorted(profile.slowest, reverse=True)
+        flags = []
+        if slowest and slowest[0][0] * 1000 > settings.QUERY_PROFILE_SLOW_QUERY_MS:
+            flags.append('slow_query')
+        if db_ms > settings.QUERY_PROFILE_SLOW_DB_MS:
+            flags.append('slow_db')
+        if profile.count > settings.QUERY_PROFILE_MAX_QUERIES:
+            flags.append('too_many_queries')
+
+        add_server_timing(response, 'db', db_ms, f'{profile.count} queries')
+        logger.log(logging.WARNING if flags else logging.INFO, json.dumps({
+            'event': 'query_profile',
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'queries': profile.count,
+            'db_ms': round(db_ms, 2),
+            'slowest': [{'ms': round(duration * 1000, 2), 'sql': sql[:500]}
+                        for duration, sql in slowest],
+            'flags': flags,
+        }))
+
+
+class ReplicaRoutingMiddleware:
+    """Let opted-in views read from the replicas, see ``db_router``.
+
+    Pins clients to the primary for ``REPLICA_PIN_SECONDS`` after a request
+    of theirs wrote to the database. Only used when there are replicas
+    (``DATABASE_REPLICA_URLS``).
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        """Opt out without replicas."""
+        if not settings.DATABASE_REPLICAS:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with db_router.routing(db_router.PIN_COOKIE in request.COOKIES) as state:
+            response = self.get_response(request)
+        return self.pin(state, response)
+
+    async def __acall__(self, request):
+        """Async counterpart of ``__call__``."""
+        with db_router.routing(db_router.PIN_COOKIE in request.COOKIES) as state:
+            response = await self.get_response(request)
+        return self.pin(state, response)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        state = db_router.current_state()
+        if state is not None:
+            state.replica_reads = db_router.reads_from_replica(request, view_func)
+
+    @staticmethod
+    def pin(state, response):
+        """Keep the client's reads on the primary after it wrote."""
+        if state.wrote:
+            response.set_cookie(
+                db_router.PIN_COOKIE, '1', max_age=settings.REPLICA_PIN_SECONDS,
+                secure=settings.SESSION_COOKIE_SECURE, httponly=True,
+                samesite='Lax')
+        return response
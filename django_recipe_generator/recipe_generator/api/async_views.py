@@ -0,0 +1,82 @@
+"""Async views (API) for ASGI deployments (``ASYNC_VIEWS``).
+
+DRF dispatches synchronously, so ``AsyncAPIView`` runs the usual request
+cycle (authentication, permissions, throttling) in a worker thread and
+awaits the handler itself on the event loop.
+"""
+from asgiref.sync import sync_to_async
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from django_recipe_generator.recipe_generator.api.pagination import (
+    KeysetPagination)
+from django_recipe_generator.recipe_generator.api.serializers import (
+    RecipeValuesSerializer)
+from django_recipe_generator.recipe_generator.api.views import (
+    RecipeViewSet, requested_fields, search_queryset, search_spec)
+
+
+class AsyncAPIView(APIView):
+    """APIView with coroutine handlers (``async def get`` etc.)."""
+
+    async def dispatch(self, request, *args, **kwargs):
+        """Async counterpart of ``APIView.dispatch``."""
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+
+        try:
+            await sync_to_async(self.initial)(request, *args, **kwargs)
+
+            if request.method.lower() in self.http_method_names:
+                handler = getattr(self, request.method.lower(),
+                                  self.http_method_not_allowed)
+            else:
+                handler = self.http_method_not_allowed
+
+            response = handler(request, *args, **kwargs)
+            if not isinstance(response, Response):
+                response = await response
+
+        except Exception as exc:
+            response = self.handle_exception(exc)
+
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        return self.response
+
+
+class RecipeFilterSearchView(AsyncAPIView):
+    """Async version of ``RecipeViewSet.filter_search``.
+
+    Same parameters and response; only the requested page is fetched and
+    annotated, with the async ORM.
+    """
+
+    permission_classes = RecipeViewSet.permission_classes
+    pagination_class = KeysetPagination
+    throttle_scope = RecipeViewSet.throttle_scopes['filter_search']
+    replica_methods = ('POST',)  # a search, it only reads
+
+    async def post(self, request):
+        """Filter recipes by name, time, and included/excluded ingredients."""
+        fields = requested_fields(request.query_params)
+        qs, query_ingredients = search_queryset(request.data, fields)
+        self.search_spec = search_spec(request.data)
+
+        paginator = self.pagination_class()
+        page = await paginator.apaginate_queryset(qs, request, view=self)
+        recipes = page if page is not None else [r async for r in qs]
+
+        serializer = RecipeValuesSerializer(
+            recipes,
+            many=True,
+            fields=fields,
+            context={'request': request, 'include_ingredient_analysis': True,
+                     'query_ingredients': query_ingredients}
+        )
+        data = await serializer.adata()
+        if page is not None:
+            return paginator.get_paginated_response(data)
+        return Response(data)
@@ -0,0 +1,135 @@
+"""View mixins for the Recipe Generator API."""
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Max
+from rest_framework import status
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+
+from django_recipe_generator.services.conditional import (
+    make_etag, not_modified, set_validators)
+
+
+class ConditionalGetMixin:
+    """ETag/Last-Modified validators and 304 responses for list and retrieve.
+
+    Validators are derived from the model's ``updated_at``. The list ETag
+    is ``max(updated_at)`` plus the row count, computed in one aggregate
+    query without loading rows; any create, update or delete changes it.
+    Lists have no Last-Modified: deleting a row other than the latest one
+    leaves ``max(updated_at)`` as it was, so ``If-Modified-Since`` would
+    wrongly get a 304.
+    """
+
+    def list(self, request, *args, **kwargs):
+        """List, or 304 if nothing in the queryset changed."""
+        stats = self.filter_queryset(self.get_queryset()).aggregate(
+            last_modified=Max('updated_at'), count=Count('pk'))
+        etag = make_etag('list', stats['count'], stats['last_modified'],
+                         request.accepted_renderer.format)
+
+        response = not_modified(request, etag)
+        if response is None:
+            response = set_validators(super().list(request, *args, **kwargs), etag)
+        return response
+
+    def retrieve(self, request, *args, **kwargs):
+        """Retrieve, or 304 without serializing the object."""
+        instance = self.get_object()  # also runs the object permission checks
+        etag = make_etag(instance.pk, instance.updated_at,
+                         request.accepted_renderer.format)
+
+        response = not_modified(request, etag, instance.updated_at)
+        if response is None:
+            serializer = self.get_serializer(self.prefetch_object(instance))
+            response = set_validators(Response(serializer.data),
+                                      etag, instance.updated_at)
+        return response
+
+    def prefetch_object(self, instance):
+        """Load related data of a modified object before serializing it.
+
+        Keep prefetches for ``retrieve`` out of ``get_queryset`` and add
+        them here, so a 304 costs a single query.
+        """
+        return instance
+
+
+def bulk_ids(ids, name='ids'):
+    """Validate a list of distinct integer IDs of at most ``API_BULK_MAX_ITEMS``."""
+    if not isinstance(ids, list) or not ids:
+        raise ValidationError({name: ['Expected a non-empty list of IDs.']})
+    if len(ids) > settings.API_BULK_MAX_ITEMS:
+        raise ValidationError(
+            {name: [f'At most {settings.API_BULK_MAX_ITEMS} items per request.']})
+    if any(type(pk) is not int for pk in ids):
+        raise ValidationError({name: ['IDs must be integers.']})
+    if len(set(ids)) < len(ids):
+        raise ValidationError({name: ['IDs must be distinct.']})
+    return ids
+
+
+class BulkMixin:
+    """``bulk`` action: create, update or delete many objects per request.
+
+    - ``POST <list>/bulk/`` takes a list of objects to create,
+    - ``PATCH <list>/bulk/`` a list of partial objects with their ``id``,
+    - ``DELETE <list>/bulk/`` ``{"ids": [...]}``.
+
+    Up to ``API_BULK_MAX_ITEMS`` items, validated together and written in
+    one transaction by the serializer's ``list_serializer_class`` (see
+    ``BulkListSerializer``). Creates and updates return the objects as
+    ``{"results": [...]}`` in the order of the items, or, if any item is
+    invalid, nothing is written and the 400 lists the errors of each item
+    (``{}`` for valid ones). Deletes return ``{"id": ..., "deleted": true}``
+    or ``{"id": ..., "detail": "Not found."}`` per ID.
+    """
+
+    @action(detail=False, methods=['post', 'patch', 'delete'])
+    def bulk(self, request):
+        """Create, update or delete many objects, depending on the method."""
+        if not request.user.is_authenticated:
+            self.permission_denied(request)
+        handler = {'POST': self.bulk_create, 'PATCH': self.bulk_update,
+                   'DELETE': self.bulk_destroy}[request.method]
+        with transaction.atomic():
+            return handler(request)
+
+    def bulk_create(self, request):
+        serializer = self.get_serializer(data=request.data, many=True,
+                                         max_length=settings.API_BULK_MAX_ITEMS)
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        return Response({'results': serializer.data}, status=status.HTTP_201_CREATED)
+
+    def bulk_update(self, request):
+        items = request.data
+        if not isinstance(items, list) or not all(isinstance(i, dict) for i in items):
+            raise ValidationError(['Expected a list of objects.'])
+        bulk_ids([item.get('id') for item in items], name='id')
+        instances = self.get_queryset().in_bulk([item['id'] for item in items])
+        errors = [{} if item['id'] in instances else {'id': ['Not found.']}
+                  for item in items]
+        if any(errors):
+            raise ValidationError(errors)
+        for instance in instances.values():
+            self.check_object_permissions(request, instance)
+
+        serializer = self.get_serializer(
+            [instances[item['id']] for item in items], data=items, many=True,
+            partial=True)
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        return Response({'results': serializer.data})
+
+    def bulk_destroy(self, request):
+        data = request.data if isinstance(request.data, dict) else {}
+        ids = bulk_ids(data.get('ids'))
+        instances = self.get_queryset().in_bulk(ids)
+        for instance in instances.values():
+            self.check_object_permissions(request, instance)
+        self.get_queryset().filter(pk__in=instances).delete()
+        return Response({'results': [
+            {'id': pk, 'deleted': True} if pk in instances
+            else {'id': pk, 'detail': 'Not found.'} for pk in ids]})
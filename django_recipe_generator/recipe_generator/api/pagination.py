@@ -0,0 +1,119 @@
+"""Pagination classes for the Recipe Generator API."""
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+from django_recipe_generator.services import keyset, search_cache
+
+
+class KeysetPagination(BasePagination):
+    """Cursor pagination on ``(missing, id)`` / ``id``, see ``services.keyset``.
+
+    Same response format as ``PageNumberPagination`` with ``?cursor=``
+    links instead of page numbers; ``count`` follows ``SEARCH_COUNT_MODE``
+    (null with ``none``). The async ``apaginate_queryset`` lets async views
+    paginate without blocking the event loop.
+
+    Views setting a ``search_spec`` (see ``services.search_cache``) get
+    their pages from the search cache.
+    """
+
+    page_size = api_settings.PAGE_SIZE
+    cursor_query_param = 'cursor'
+    cursor_query_description = 'The pagination cursor value.'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        """Return the rows of the requested page."""
+        self.request = request
+        spec = getattr(view, 'search_spec', None)
+        try:
+            if spec is not None:
+                self.page = search_cache.paginate(
+                    queryset, spec, self.get_cursor(request), self.page_size)
+                return self.page.object_list
+            self.page = keyset.paginate(queryset, self.get_cursor(request),
+                                        self.page_size)
+        except keyset.InvalidCursor:
+            raise NotFound(self.invalid_cursor_message)
+        self.page.count, self.page.count_is_estimate = keyset.count_results(queryset)
+        return self.page.object_list
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """Async counterpart of ``paginate_queryset``."""
+        self.request = request
+        spec = getattr(view, 'search_spec', None)
+        try:
+            if spec is not None:
+                self.page = await search_cache.apaginate(
+                    queryset, spec, self.get_cursor(request), self.page_size)
+                return self.page.object_list
+            self.page = await keyset.apaginate(queryset, self.get_cursor(request),
+                                               self.page_size)
+        except keyset.InvalidCursor:
+            raise NotFound(self.invalid_cursor_message)
+        self.page.count, self.page.count_is_estimate = (
+            await keyset.acount_results(queryset))
+        return self.page.object_list
+
+    def get_cursor(self, request):
+        return request.query_params.get(self.cursor_query_param, '')
+
+    def get_next_link(self):
+        cursor = self.page.next_cursor
+        if cursor is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+    def get_previous_link(self):
+        cursor = self.page.previous_cursor
+        if cursor is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'count': self.page.count,
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['count', 'results'],
+            'properties': {
+                'count': {
+                    'type': 'integer',
+                    'nullable': True,
+                    'example': 123,
+                },
+                'next': {
+                    'type': 'string',
+                    'nullable': True,
+                    'format': 'uri',
+                    'example': 'http://api.example.org/accounts/?cursor=eyJ2IjpbMjBd',
+                },
+                'previous': {
+                    'type': 'string',
+                    'nullable': True,
+                    'format': 'uri',
+                    'example': 'http://api.example.org/accounts/?cursor=eyJ2IjpbMjFd',
+                },
+                'results': schema,
+            },
+        }
+
+    def get_schema_operation_parameters(self, view):
+        return [{
+            'name': self.cursor_query_param,
+            'required': False,
+            'in': 'query',
+            'description': self.cursor_query_description,
+            'schema': {'type': 'string'},
+        }]
@@ -0,0 +1,32 @@
+"""Parsers for the Recipe Generator API."""
+import codecs
+
+from django.conf import settings
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+
+from django_recipe_generator.recipe_generator.api.renderers import (
+    ORJSONRenderer, orjson)
+
+
+class ORJSONParser(JSONParser):
+    """``JSONParser`` decoding with orjson.
+
+    Falls back to the stdlib ``JSONParser`` when orjson is not installed,
+    for bodies that are not UTF-8 and when ``STRICT_JSON`` is off (orjson
+    always rejects NaN and Infinity).
+    """
+
+    renderer_class = ORJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        """Parse the request body as JSON."""
+        encoding = (parser_context or {}).get('encoding', settings.DEFAULT_CHARSET)
+        utf8 = codecs.lookup(encoding).name == 'utf-8'
+        if orjson is None or not self.strict or not utf8:
+            return super().parse(stream, media_type, parser_context)
+
+        try:
+            return orjson.loads(stream.read())
+        except orjson.JSONDecodeError as exc:
+            raise ParseError('JSON parse error - %s' % str(exc))
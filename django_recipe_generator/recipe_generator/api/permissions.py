@@ -8,7 +8,8 @@ class IsOwnerOrAdmin(BasePermission):
         if request.method in SAFE_METHODS:
             return True
 
-        return obj.owner == request.user or request.user.is_staff
+        # owner_id: checking many objects (bulk actions) must not load owners
+        return obj.owner_id == request.user.pk or request.user.is_staff
 
 
 class IsAdmin(BasePermission):
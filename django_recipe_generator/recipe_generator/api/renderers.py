@@ -0,0 +1,39 @@
+"""Renderers for the Recipe Generator API."""
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson
+except ImportError:  # optional: pip install .[fast-json]
+    orjson = None
+
+
+class ORJSONRenderer(JSONRenderer):
+    """``JSONRenderer`` encoding with orjson, byte-for-byte compatible.
+
+    Types orjson does not handle itself (Decimal, lazy translations,
+    querysets, timedelta, ...) go through DRF's ``JSONEncoder``, and so do
+    dates and times: orjson formats some of them differently (e.g. UTC
+    offsets with seconds, as in historical time zones). Falls
+    back to the stdlib ``JSONRenderer`` when orjson is not installed, for
+    indented or ASCII-only output (e.g. the browsable API), and for data
+    orjson rejects (integers beyond 64 bits, non-string dict keys, ...).
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        """Render ``data`` into JSON bytes."""
+        indent = self.get_indent(accepted_media_type, renderer_context or {})
+        # orjson only writes compact JSON without \u escapes
+        supported = self.compact and not self.ensure_ascii and not indent
+        if orjson is None or data is None or not supported:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        try:
+            ret = orjson.dumps(
+                data, default=self.encoder_class().default,
+                option=orjson.OPT_PASSTHROUGH_DATETIME,
+            )
+        except orjson.JSONEncodeError:
+            return super().render(data, accepted_media_type, renderer_context)
+        # escaped like JSONRenderer does, to stay a strict javascript subset
+        return (ret.replace('\u2028'.encode(), b'\\u2028')
+                   .replace('\u2029'.encode(), b'\\u2029'))
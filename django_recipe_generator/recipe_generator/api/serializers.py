@@ -1,8 +1,210 @@
 """Serializers for recipes, ingredients, and user management."""
+from collections import defaultdict
+from functools import cache
+from operator import itemgetter
+
 from rest_framework import serializers
+from rest_framework.settings import api_settings
+from rest_framework.utils.serializer_helpers import ReturnList
 from django.contrib.auth.models import User
 from django.db import transaction
+from django.db.models import Prefetch, Q, prefetch_related_objects
+from django.utils import timezone
 from ..models import Recipe, Ingredient, RecipeIngredient
+from ..signals import ingredients_bulk_saved, recipes_bulk_saved
+from django_recipe_generator.services.ingredients import (
+    match_ingredients, resolve_ingredients)
+
+
+class BulkListSerializer(serializers.ListSerializer):
+    """``many=True`` serializer of the ``bulk`` actions, see ``BulkMixin``.
+
+    For updates ``instance`` is the list of objects being updated, each
+    item of the data carrying the ``id`` of its object. Subclasses write
+    all items at once in ``create`` and ``update``.
+    """
+
+    def run_child_validation(self, data):
+        if self.instance is not None:
+            self.child.instance = self.instances_by_pk[data['id']]
+        return super().run_child_validation(data)
+
+    @property
+    def instances_by_pk(self):
+        return {obj.pk: obj for obj in self.instance}
+
+
+class IngredientBulkListSerializer(BulkListSerializer):
+    """Create or update many ingredients with one query each."""
+
+    def to_internal_value(self, data):
+        """Validate the items, then their (name, category) uniqueness at once."""
+        items = super().to_internal_value(data)
+        instances = self.instance or [None] * len(items)
+        keys = [(attrs.get('name', getattr(obj, 'name', None)),
+                 attrs.get('category', getattr(obj, 'category', None)))
+                for obj, attrs in zip(instances, items)]
+        taken = {}
+        if keys:
+            query = Q()
+            for name, category in set(keys):
+                query |= Q(name=name, category=category)
+            taken = {(name, category): pk for pk, name, category in
+                     Ingredient.objects.filter(query).values_list(
+                         'pk', 'name', 'category')}
+        errors, seen = [], set()
+        for obj, key in zip(instances, keys):
+            pk = getattr(obj, 'pk', None)
+            duplicate = key in seen or taken.get(key, pk) != pk
+            seen.add(key)
+            errors.append({api_settings.NON_FIELD_ERRORS_KEY: [
+                "An ingredient with this name and category already exists."
+            ]} if duplicate else {})
+        if any(errors):
+            raise serializers.ValidationError(errors)
+        return items
+
+    def create(self, validated_data):
+        ingredients = Ingredient.objects.bulk_create(
+            [Ingredient(**attrs) for attrs in validated_data])
+        ingredients_bulk_saved.send(sender=Ingredient, created=True,
+                                    ingredient_ids=[i.pk for i in ingredients])
+        return ingredients
+
+    def update(self, instances, validated_data):
+        fields = {'updated_at'}
+        now = timezone.now()
+        for ingredient, attrs in zip(instances, validated_data):
+            for attr, value in attrs.items():
+                setattr(ingredient, attr, value)
+            fields.update(attrs)
+            ingredient.updated_at = now
+        Ingredient.objects.bulk_update(instances, sorted(fields))
+        ingredients_bulk_saved.send(sender=Ingredient,
+                                    ingredient_ids=[i.pk for i in instances])
+        return instances
+
+
+class RecipeBulkListSerializer(BulkListSerializer):
+    """Create or update many recipes and their ingredients with bulk queries.
+
+    The ingredients of all items are resolved at once (``IngredientField``);
+    the model signals, which bulk queries bypass, are replaced by one
+    ``recipes_bulk_saved``.
+    """
+
+    def to_internal_value(self, data):
+        """Validate the items, with the ingredients they use resolved at once."""
+        if isinstance(data, list):
+            IngredientField.resolve(self.context, {
+                pk for recipe in data if isinstance(recipe, dict)
+                for pk in referenced_ingredient_ids(recipe.get('ingredients'))})
+        return super().to_internal_value(data)
+
+    def create(self, validated_data):
+        request = self.context.get('request')
+        links = [attrs.pop('recipeingredient_set', []) for attrs in validated_data]
+        recipes = Recipe.objects.bulk_create([
+            Recipe(owner=request.user if request else None, **attrs)
+            for attrs in validated_data])
+        RecipeIngredient.objects.bulk_create([
+            RecipeIngredient(recipe=recipe, ingredient=link['ingredient'],
+                             quantity=link['quantity'])
+            for recipe, recipe_links in zip(recipes, links)
+            for link in recipe_links])
+        recipes_bulk_saved.send(
+            sender=Recipe, recipe_ids=[recipe.pk for recipe in recipes],
+            ingredients_changed=[recipe.pk for recipe, recipe_links
+                                 in zip(recipes, links) if recipe_links])
+        return self.prefetch(recipes)
+
+    def update(self, instances, validated_data):
+        fields = {'updated_at'}
+        now = timezone.now()
+        renamed, relinked, links = [], [], []
+        for recipe, attrs in zip(instances, validated_data):
+            recipe_links = attrs.pop('recipeingredient_set', None)
+            for attr, value in attrs.items():
+                setattr(recipe, attr, value)
+            fields.update(attrs)
+            recipe.updated_at = now
+            if recipe.tracker.has_changed('name'):
+                renamed.append(recipe.pk)
+            if recipe_links is not None:
+                relinked.append(recipe.pk)
+                links += [RecipeIngredient(recipe=recipe, ingredient=link['ingredient'],
+                                           quantity=link['quantity'])
+                          for link in recipe_links]
+        Recipe.objects.bulk_update(instances, sorted(fields))
+        if relinked:
+            RecipeIngredient.objects.filter(recipe__in=relinked).delete()
+            RecipeIngredient.objects.bulk_create(links)
+        recipes_bulk_saved.send(
+            sender=Recipe, recipe_ids=[recipe.pk for recipe in instances],
+            ingredients_changed=relinked, renamed=renamed)
+        return self.prefetch(instances)
+
+    @staticmethod
+    def prefetch(recipes):
+        """Load the ingredients of all ``recipes`` for the response at once."""
+        prefetch_related_objects(recipes, Prefetch(
+            'recipeingredient_set',
+            queryset=RecipeIngredient.objects.select_related('ingredient')))
+        return recipes
+
+
+def referenced_ingredient_ids(links):
+    """Ingredient IDs of raw ``[{"ingredient": id, ...}]`` data, minus invalid ones."""
+    ids = set()
+    for link in links if isinstance(links, list) else ():
+        try:
+            if not isinstance(link['ingredient'], bool):
+                ids.add(int(link['ingredient']))
+        except (KeyError, TypeError, ValueError):
+            pass  # reported by the field
+    return ids
+
+
+class IngredientField(serializers.PrimaryKeyRelatedField):
+    """Ingredient ``PrimaryKeyRelatedField`` resolving all IDs at once.
+
+    A ``PrimaryKeyRelatedField`` runs one query per value. Instead, the
+    list serializers around it (``RecipeIngredientListSerializer``,
+    ``RecipeBulkListSerializer``) resolve the IDs of all their items
+    with ``resolve_ingredients`` (one query, or none from the cached
+    catalogue) into ``context['ingredients']``, where the field looks
+    them up; each item referring to a missing ID gets its error.
+    """
+
+    @staticmethod
+    def resolve(context, ids):
+        """Resolve the ``ids`` not resolved yet into ``context['ingredients']``."""
+        resolved = context.setdefault('ingredients', {})
+        ids = set(ids) - resolved.keys()
+        if ids:
+            resolved.update(resolve_ingredients(ids))
+
+    def to_internal_value(self, data):
+        resolved = self.context.get('ingredients', {})
+        if isinstance(data, bool):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        try:
+            pk = int(data)
+        except (TypeError, ValueError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        if pk not in resolved:
+            return super().to_internal_value(data)  # used on its own
+        if resolved[pk] is None:
+            self.fail('does_not_exist', pk_value=data)
+        return resolved[pk]
+
+
+class RecipeIngredientListSerializer(serializers.ListSerializer):
+    """The ingredients of a recipe, their ingredient IDs resolved at once."""
+
+    def to_internal_value(self, data):
+        IngredientField.resolve(self.context, referenced_ingredient_ids(data))
+        return super().to_internal_value(data)
 
 
 class IngredientSerializer(serializers.ModelSerializer):
@@ -10,8 +212,15 @@ class IngredientSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Ingredient
-        fields = '__all__'
+        exclude = ['updated_at']
         read_only_fields = ['id']
+        list_serializer_class = IngredientBulkListSerializer
+
+    def get_validators(self):
+        """Skip the per-item uniqueness query of bulk writes (checked at once)."""
+        if isinstance(self.parent, IngredientBulkListSerializer):
+            return []
+        return super().get_validators()
 
     def validate_name(self, value):
         """Ensure name is a minimum length."""
@@ -36,13 +245,14 @@ class RecipeIngredientSerializer(serializers.ModelSerializer):
     Provides nested ingredient ID and quantity input/output.
     """
 
-    ingredient = serializers.PrimaryKeyRelatedField(
+    ingredient = IngredientField(
         queryset=Ingredient.objects.all()
     )
 
     class Meta:
         model = RecipeIngredient
         fields = ['ingredient', 'quantity']
+        list_serializer_class = RecipeIngredientListSerializer
 
     def to_representation(self, instance):
         """Customize output to show both id and name."""
@@ -55,7 +265,21 @@ class RecipeIngredientSerializer(serializers.ModelSerializer):
         return representation
 
 
-class RecipeSerializer(serializers.ModelSerializer):
+class DynamicFieldsMixin:
+    """Serializer mixin taking a ``fields`` argument (sparse fieldsets).
+
+    Only the named top-level fields are kept; None keeps all of them.
+    """
+
+    def __init__(self, *args, fields=None, **kwargs):
+        """Drop the fields that were not requested."""
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+
+class RecipeSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     """Full serializer for Recipe objects.
 
     Handles nested ingredient creation and supports contextual flags
@@ -70,8 +294,10 @@ class RecipeSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Recipe
-        exclude = ['ai_generation_status']
+        exclude = ['ai_generation_error', 'ai_generation_attempts',
+                   'ai_generation_failed_at', 'updated_at']
         read_only_fields = ['id', 'owner', 'elevating_twist', 'ai_generation_status']
+        list_serializer_class = RecipeBulkListSerializer
 
     def to_representation(self, instance):
         """Dynamically adds matching/missing ingredient fields.
@@ -147,6 +373,99 @@ class RecipeSerializer(serializers.ModelSerializer):
         return instance
 
 
+@cache
+def recipe_field_names():
+    """Top-level fields of ``RecipeSerializer``, in output order."""
+    return tuple(RecipeSerializer().fields)
+
+
+class RecipeValuesListSerializer(serializers.ListSerializer):
+    """Serializes a batch of ``.values()`` rows, see ``RecipeValuesSerializer``."""
+
+    def to_representation(self, data):
+        rows = list(data)
+        ingredients = self.child.ingredients_queryset(rows)
+        return self.child.build(rows, ingredients if ingredients is not None else ())
+
+    async def adata(self):
+        """Async ``data``, fetching the ingredient tuples with the async ORM."""
+        rows = list(self.instance)
+        ingredients = self.child.ingredients_queryset(rows)
+        if ingredients is not None:
+            ingredients = [row async for row in ingredients]
+        return ReturnList(self.child.build(rows, ingredients or ()), serializer=self)
+
+
+class RecipeValuesSerializer(serializers.BaseSerializer):
+    """Read-only fast path of ``RecipeSerializer`` for many recipes.
+
+    Produces the same output from ``.values()`` rows (see
+    ``api.views.values_queryset``) and a single query of ingredient tuples
+    for the whole batch, skipping the per-field serializer machinery.
+    Meant for ``many=True``; takes ``fields`` like ``RecipeSerializer``
+    and, with ``include_ingredient_analysis``, the ``query_ingredients``
+    of a search from the context.
+    """
+
+    class Meta:
+        list_serializer_class = RecipeValuesListSerializer
+
+    def __init__(self, *args, fields=None, **kwargs):
+        """Resolve the requested fields once for the whole batch."""
+        super().__init__(*args, **kwargs)
+        self.field_names = [name for name in recipe_field_names()
+                            if fields is None or name in fields]
+        self.analysis = self.context.get('include_ingredient_analysis', False)
+
+    def ingredients_queryset(self, rows):
+        """``(recipe_id, ingredient_id, name, quantity)`` of ``rows``, if needed."""
+        if not rows or not (self.analysis or 'ingredients' in self.field_names):
+            return None
+        return RecipeIngredient.objects.filter(
+            recipe_id__in=[row['id'] for row in rows]
+        ).values_list('recipe_id', 'ingredient_id', 'ingredient__name', 'quantity')
+
+    def build(self, rows, ingredient_rows):
+        """Representations of ``rows`` given their ingredient tuples."""
+        by_recipe = defaultdict(list)
+        for recipe_id, *ingredient in ingredient_rows:
+            by_recipe[recipe_id].append(ingredient)
+        query_ingredients = set(self.context.get('query_ingredients') or ())
+
+        result = []
+        for row in rows:
+            ingredients = by_recipe[row['id']]
+            item = {
+                name: [
+                    {'ingredient': {'id': ingredient_id, 'name': ingredient_name},
+                     'quantity': quantity}
+                    for ingredient_id, ingredient_name, quantity in ingredients
+                ] if name == 'ingredients' else row[name]
+                for name in self.field_names
+            }
+            if self.analysis:
+                item.update(self.analyse(ingredients, query_ingredients))
+            result.append(item)
+        return result
+
+    def analyse(self, ingredients, query_ingredients):
+        """Matching/missing ingredient names, as ``annotate_recipes`` sets them."""
+        if not query_ingredients:
+            return {'matching_ingredient_names': [], 'missing_ingredient_names': []}
+        # the prefetched ``ingredients`` relation is ordered by ingredient id
+        ingredients = sorted(ingredients, key=itemgetter(0))
+        names = {ingredient_id: name for ingredient_id, name, _ in ingredients}
+        matching_ids, missing_ids = match_ingredients(names, query_ingredients)
+        return {
+            'matching_ingredient_names': [names[i] for i in matching_ids],
+            'missing_ingredient_names': [name for i, name, _ in ingredients
+                                         if i in missing_ids],
+        }
+
+    def to_representation(self, instance):
+        return self.build([instance], self.ingredients_queryset([instance]) or ())[0]
+
+
 class UserSerializer(serializers.ModelSerializer):
     """Serializer for user registration using username and password."""
 
@@ -0,0 +1,19 @@
+"""Views (API) for social login.
+
+Kept out of ``views`` so the OAuth adapters are only imported when the
+social login endpoint is used (see ``LAZY_SUBSYSTEMS``).
+"""
+import os
+
+from rest_framework.decorators import permission_classes
+from rest_framework.permissions import AllowAny
+from dj_rest_auth.registration.views import SocialLoginView
+from allauth.socialaccount.providers.google.views import GoogleOAuth2Adapter
+from allauth.socialaccount.providers.oauth2.client import OAuth2Client
+
+
+@permission_classes([AllowAny])
+class GoogleLogin(SocialLoginView):
+    adapter_class = GoogleOAuth2Adapter
+    callback_url = os.getenv('CALLBACK_URL')
+    client_class = OAuth2Client
@@ -0,0 +1,176 @@
+"""Throttles counting requests in Redis, shared by every worker.
+
+DRF's throttles keep a list of request timestamps per client in the
+Django cache: per process with the local memory cache (so every gunicorn
+worker grants the full rate) and the whole list is pickled on each
+request. These throttles use a sliding window counter instead: two
+integers per client and scope (the current and the previous fixed
+window), the previous one weighted by how much of it still overlaps the
+sliding window. A Lua script reads, checks and increments them atomically.
+A request counts once, or ``view.get_throttle_cost(request)`` times in
+its endpoint's scope (e.g. a batch of recipes weighs as much as the
+single recipe requests it replaces).
+
+If Redis is unreachable the throttles let requests through, like the
+circuit breaker, rather than failing the API; they then skip Redis for
+``OUTAGE_BACKOFF`` seconds so requests do not each wait for a timeout.
+The scopes in ``FALLBACK_SCOPES`` (login) stay limited meanwhile, by DRF's
+timestamp list in process memory: each worker grants the full rate, but
+passwords cannot be guessed at full speed while Redis is down. The cache
+tiers are no help there, they live in the same Redis.
+"""
+import logging
+import time
+
+import redis
+from django.core.cache.backends.locmem import LocMemCache
+from rest_framework.throttling import SimpleRateThrottle
+
+from django_recipe_generator.services.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+OUTAGE_BACKOFF = 5
+
+# scopes limited per process rather than let through while Redis is down
+FALLBACK_SCOPES = {'dj_rest_auth'}
+fallback_cache = LocMemCache('throttle-fallback', {})
+
+# KEYS: current window, previous window
+# ARGV: limit, window duration, seconds elapsed in the current window, cost
+# Returns {1, 0} if the request is allowed (and counted cost times), else
+# {0, wait in ms}.
+SLIDING_WINDOW = """
+local limit = tonumber(ARGV[1])
+local duration = tonumber(ARGV[2])
+local elapsed = tonumber(ARGV[3])
+local cost = tonumber(ARGV[4] or '1')
+local current = tonumber(redis.call('GET', KEYS[1]) or '0')
+local previous = tonumber(redis.call('GET', KEYS[2]) or '0')
+local overlap = (duration - elapsed) / duration
+if previous * overlap + current + cost <= limit then
+    redis.call('INCRBY', KEYS[1], cost)
+    redis.call('EXPIRE', KEYS[1], duration * 2)
+    return {1, 0}
+end
+local wait = duration - elapsed
+if current + cost <= limit then
+    -- until enough of the previous window has slid out
+    wait = duration * (1 - (limit - current - cost) / previous) - elapsed
+end
+return {0, math.ceil(wait * 1000)}
+"""
+
+_script = None
+_skip_until = 0
+
+
+def sliding_window(client):
+    """Return the sliding window ``Script``, created on first use."""
+    global _script
+    if _script is None:
+        _script = client.register_script(SLIDING_WINDOW)
+    return _script
+
+
+class RedisRateThrottle(SimpleRateThrottle):
+    """``SimpleRateThrottle`` with a sliding window counter in Redis."""
+
+    def get_cost(self, request, view):
+        """Units the request counts for; one per request by default."""
+        return 1
+
+    def allow_request(self, request, view):
+        """Count the request; False once the client is over the rate."""
+        if self.rate is None:
+            return True
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+
+        global _skip_until
+        now = time.time()
+        if now < _skip_until:
+            return self.allow_without_redis(request, view)
+        window, elapsed = divmod(now, self.duration)
+        # capped at the limit, else the request could never be allowed
+        cost = min(self.get_cost(request, view), self.num_requests)
+        keys = [f"{self.key}:{int(window)}", f"{self.key}:{int(window) - 1}"]
+        try:
+            client = get_redis()
+            allowed, self.wait_ms = sliding_window(client)(
+                keys=keys, args=[self.num_requests, self.duration, elapsed, cost],
+                client=client)
+        except redis.RedisError as exc:
+            logger.warning("Throttles unavailable for %ss: %s", OUTAGE_BACKOFF, exc)
+            _skip_until = now + OUTAGE_BACKOFF
+            return self.allow_without_redis(request, view)
+        return bool(allowed)
+
+    def allow_without_redis(self, request, view):
+        """Count ``FALLBACK_SCOPES`` in process memory, let the others through."""
+        if self.scope not in FALLBACK_SCOPES:
+            return True
+        self.cache = fallback_cache
+        self.wait_ms = None
+        return super().allow_request(request, view)
+
+    def wait(self):
+        """Seconds until the client may send the next request."""
+        if self.wait_ms is None:
+            return super().wait()
+        return self.wait_ms / 1000
+
+
+class AnonRedisThrottle(RedisRateThrottle):
+    """Limit anonymous clients by IP address (``anon`` rate)."""
+
+    scope = 'anon'
+
+    def get_cache_key(self, request, view):
+        if request.user and request.user.is_authenticated:
+            return None
+        return self.cache_format % {'scope': self.scope,
+                                    'ident': self.get_ident(request)}
+
+
+class UserRedisThrottle(RedisRateThrottle):
+    """Limit users by id, anonymous clients by IP address (``user`` rate)."""
+
+    scope = 'user'
+
+    def get_cache_key(self, request, view):
+        if request.user and request.user.is_authenticated:
+            ident = request.user.pk
+        else:
+            ident = self.get_ident(request)
+        return self.cache_format % {'scope': self.scope, 'ident': ident}
+
+
+class ScopedRedisThrottle(UserRedisThrottle):
+    """Limit each endpoint at the rate of its own scope.
+
+    The scope is the view's ``throttle_scopes[action]`` (viewsets) or its
+    ``throttle_scope``; views without one are not limited by this throttle.
+    Requests count ``view.get_throttle_cost(request)`` units if the view
+    defines it.
+    """
+
+    scope_attr = 'throttle_scope'
+
+    def __init__(self):
+        """Defer reading the rate until the view's scope is known."""
+
+    def allow_request(self, request, view):
+        """Determine the scope of ``view`` and count the request against it."""
+        self.scope = getattr(view, 'throttle_scopes', {}).get(
+            getattr(view, 'action', None), getattr(view, self.scope_attr, None))
+        if not self.scope:
+            return True
+        self.rate = self.get_rate()
+        self.num_requests, self.duration = self.parse_rate(self.rate)
+        return super().allow_request(request, view)
+
+    def get_cost(self, request, view):
+        get_throttle_cost = getattr(view, 'get_throttle_cost', None)
+        return max(1, get_throttle_cost(request)) if get_throttle_cost else 1
@@ -3,8 +3,8 @@
 Views for recipe creation, editing, deletion,
 listing, and detail display, user registration and token obtaining.
 """
-import os
-from dotenv import load_dotenv
+from django.conf import settings
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
 from rest_framework import viewsets
 from rest_framework import generics
@@ -12,30 +12,187 @@ from rest_framework.decorators import action
 from rest_framework.reverse import reverse
 from rest_framework.permissions import AllowAny
 from rest_framework.decorators import permission_classes
-from dj_rest_auth.registration.views import SocialLoginView
-from allauth.socialaccount.providers.google.views import GoogleOAuth2Adapter
-from allauth.socialaccount.providers.oauth2.client import OAuth2Client
 
-from django_recipe_generator.recipe_generator.models import Recipe, Ingredient
+from django_recipe_generator.recipe_generator.models import (
+    Recipe, Ingredient, RecipeIngredient)
+from django_recipe_generator.recipe_generator.api.mixins import (
+    BulkMixin, ConditionalGetMixin)
 from django_recipe_generator.recipe_generator.api.permissions import (
     IsOwnerOrAdmin, IsAdmin)
 from django_recipe_generator.recipe_generator.api.serializers import (
     RecipeSerializer,
+    RecipeValuesSerializer,
     IngredientSerializer,
-    UserSerializer
+    UserSerializer,
+    recipe_field_names,
 )
 
-from django_recipe_generator.services.ingredients import annotate_recipes
-from django.db.models import Prefetch
+from django_recipe_generator import metrics, tracing
+from django_recipe_generator.services import search_cache
+from django_recipe_generator.services.keyset import keyset_keys
+from django.db.models import Prefetch, prefetch_related_objects
 from django.contrib.auth.models import User
-load_dotenv()
 
-class RecipeViewSet(viewsets.ModelViewSet):
+
+# list items are slim unless more is asked for with ?expand= or ?fields=
+LIST_FIELDS = ('id', 'name', 'cooking_time', 'owner', 'ai_generation_status')
+
+
+def _split(value):
+    return {name.strip() for name in (value or '').split(',') if name.strip()}
+
+
+def requested_fields(query_params, default=None):
+    """Recipe fields requested with ``?fields=`` and ``?expand=``.
+
+    ``fields`` replaces ``default`` (None meaning all fields) and
+    ``expand`` adds to it. Returns None for all fields.
+
+    Raises:
+        ValidationError: For unknown field names.
+    """
+    fields = _split(query_params.get('fields'))
+    expand = _split(query_params.get('expand'))
+    unknown = (fields | expand) - set(recipe_field_names())
+    if unknown:
+        raise ValidationError(
+            {'fields': f"Unknown field(s): {', '.join(sorted(unknown))}"})
+
+    if fields:
+        return fields | expand
+    if default is None:
+        return None
+    return set(default) | expand
+
+
+def nested_prefetches(fields):
+    """Prefetch lookups for the nested data among ``fields``."""
+    if fields is None or 'ingredients' in fields:
+        return [Prefetch(
+            'recipeingredient_set',
+            queryset=RecipeIngredient.objects.select_related('ingredient')
+        )]
+    return []
+
+
+def only_requested(queryset, fields):
+    """Load only the columns needed to serialize ``fields``."""
+    if fields is None:
+        return queryset
+    columns = {f.name for f in Recipe._meta.concrete_fields} & set(fields)
+    # updated_at feeds the ETag of ConditionalGetMixin
+    return queryset.only('id', 'updated_at', *columns)
+
+
+def values_queryset(queryset, fields):
+    """``.values()`` rows with the columns ``RecipeValuesSerializer`` needs."""
+    columns = {f.name for f in Recipe._meta.concrete_fields}
+    columns &= set(recipe_field_names() if fields is None else fields)
+    # the ordering keys make the keyset pagination cursors
+    return queryset.values(*dict.fromkeys([*keyset_keys(queryset), *columns]))
+
+
+def batch_ids(query_params):
+    """Distinct recipe IDs of ``?ids=1,2,3``, in the order given.
+
+    Raises:
+        ValidationError: For a missing, non-integer or too long list.
+    """
+    try:
+        ids = list(dict.fromkeys(
+            int(i) for i in (query_params.get('ids') or '').split(',') if i.strip()))
+    except ValueError:
+        raise ValidationError({'ids': 'Recipe IDs must be integers.'})
+    if not ids:
+        raise ValidationError({'ids': 'Give the recipe IDs as ?ids=1,2,3.'})
+    if len(ids) > settings.RECIPE_BATCH_MAX_IDS:
+        raise ValidationError(
+            {'ids': f'At most {settings.RECIPE_BATCH_MAX_IDS} recipes per request.'})
+    return ids
+
+
+def search_spec(data):
+    """Return the normalized filter_search parameters of the request data."""
+    try:
+        return search_cache.search_spec(
+            query_name=data.get('query_name', ''),
+            query_ingredients=data.get('query_ingredients', []),
+            time_filter=data.get('time_filter', ''),
+            exclude_ingredients=data.get('exclude_ingredients', []),
+        )
+    except (TypeError, ValueError):
+        raise ValidationError('Ingredient IDs must be integers.')
+
+
+def search_queryset(data, fields=None):
+    """Build the filter_search queryset from request data.
+
+    Returns ``.values()`` rows for ``RecipeValuesSerializer`` with the
+    columns ``fields`` (see ``requested_fields``) needs, and the set of
+    query ingredient IDs (pass them to the serializer as
+    ``query_ingredients`` for the matching/missing ingredient analysis).
+    """
+    spec = search_spec(data)
+    qs = search_cache.search_queryset(spec)
+    return values_queryset(qs, fields), set(spec['query_ingredients'])
+
+
+class RecipeViewSet(ConditionalGetMixin, BulkMixin, viewsets.ModelViewSet):
     """ViewSet for listing, creating, and managing recipes."""
 
     queryset = Recipe.objects.all()
     serializer_class = RecipeSerializer
     permission_classes = [IsOwnerOrAdmin]
+    # actions honouring ?fields= / ?expand=
+    sparse_actions = ('list', 'retrieve', 'filter_search', 'batch')
+    # rates of ScopedRedisThrottle: a search costs far more than a detail
+    throttle_scopes = {'filter_search': 'search', 'retrieve': 'detail',
+                       'batch': 'detail'}
+    # actions reading from the replicas, see db_router
+    replica_actions = ('list', 'retrieve', 'filter_search', 'batch')
+
+    def get_requested_fields(self):
+        """Fields to serialize; the list is slim by default."""
+        default = LIST_FIELDS if self.action == 'list' else None
+        return requested_fields(self.request.query_params, default)
+
+    def get_queryset(self):
+        """Fetch only what the requested fields need."""
+        qs = super().get_queryset()
+        if self.action in ('list', 'retrieve'):
+            fields = self.get_requested_fields()
+            if self.action == 'list':
+                return values_queryset(qs, fields)
+            qs = only_requested(qs, fields)
+        return qs
+
+    def get_throttle_cost(self, request):
+        """Count a batch as many ``detail`` requests as it has recipes."""
+        if self.action == 'batch':
+            try:
+                return len(batch_ids(request.query_params))
+            except ValidationError:
+                return 1  # answered with 400 by the action
+        return 1
+
+    def prefetch_object(self, instance):
+        """Load nested data once retrieve knows it has to serialize."""
+        prefetch_related_objects(
+            [instance], *nested_prefetches(self.get_requested_fields()))
+        return instance
+
+    def get_serializer(self, *args, **kwargs):
+        """Apply sparse fieldsets to read actions.
+
+        Lists of ``.values()`` rows go through ``RecipeValuesSerializer``;
+        single objects, writes and the schema use ``RecipeSerializer``.
+        """
+        if self.action in self.sparse_actions:
+            kwargs.setdefault('fields', self.get_requested_fields())
+        if kwargs.get('many') and self.action in ('list', 'filter_search', 'batch'):
+            kwargs.setdefault('context', self.get_serializer_context())
+            return RecipeValuesSerializer(*args, **kwargs)
+        return super().get_serializer(*args, **kwargs)
 
     @action(detail=False, methods=['get'])
     def api_root(self, request):
@@ -51,6 +208,26 @@ class RecipeViewSet(viewsets.ModelViewSet):
             },
         })
 
+    @action(detail=False, methods=['GET'])
+    def batch(self, request):
+        """Retrieve several recipes at once: ``?ids=1,2,3``.
+
+        Returns ``{"results": [...]}`` in the order of the IDs, with
+        ``{"id": 7, "detail": "Not found."}`` for recipes that do not
+        exist. Up to ``RECIPE_BATCH_MAX_IDS`` IDs; takes ``?fields=`` and
+        ``?expand=`` like retrieve. The recipes and their ingredients
+        cost one query each whatever their number.
+        """
+        ids = batch_ids(request.query_params)
+        fields = self.get_requested_fields()
+        if fields is not None:
+            fields.add('id')  # to match the results with the IDs
+        qs = values_queryset(self.get_queryset().filter(pk__in=ids), fields)
+        found = {item['id']: item
+                 for item in self.get_serializer(qs, many=True, fields=fields).data}
+        return Response({'results': [
+            found.get(pk) or {'id': pk, 'detail': 'Not found.'} for pk in ids]})
+
     @action(detail=False, methods=['POST'])
     def filter_search(self, request):
         """Filter recipes.
@@ -60,7 +237,8 @@ class RecipeViewSet(viewsets.ModelViewSet):
 
         Args:
             request (Request): The HTTP request containing search
-            and filter parameters:
+            and filter parameters (``?fields=``/``?expand=`` select the
+            returned fields, see ``requested_fields``):
                 - query_name (str): Text to match recipe names.
                 - time_filter (str): Time-based filter ('quick',
                     'standard', 'long').
@@ -74,43 +252,28 @@ class RecipeViewSet(viewsets.ModelViewSet):
         Raises:
             KeyError: If ingredient IDs are invalid or lookup fails.
         """
-        query_name = request.data.get('query_name', '')
-        time_filter = request.data.get('time_filter', '')
-        query_ingredients = set(request.data.get('query_ingredients', []))
-        exclude_ingredients = request.data.get('exclude_ingredients', [])
-
-        ingredient_qs = Ingredient.objects.only('id', 'name')
-
-        qs = Recipe.objects.search(
-            query_name=query_name,
-            query_ingredients=query_ingredients
-        ).filter_recipes(
-            time_filter=time_filter,
-            exclude_ingredients=exclude_ingredients
-        ).prefetch_related(Prefetch("ingredients", queryset=ingredient_qs))
-
-        if query_ingredients:
-            qs = annotate_recipes(qs, query_ingredients)
-
-        page = self.paginate_queryset(qs)
-        if page is not None:
-            serializer = self.get_serializer(
-                page,
-                many=True,
-                context={'include_ingredient_analysis': True}
-            )
-            return self.get_paginated_response(serializer.data)
-
-        serializer = self.get_serializer(
-            qs,
-            many=True,
-            context={'include_ingredient_analysis': True}
-        )
+        qs, query_ingredients = search_queryset(request.data,
+                                                self.get_requested_fields())
+        # KeysetPagination serves the page from the search cache
+        self.search_spec = search_spec(request.data)
+        # only the rows being serialized get the analysis
+        context = {'include_ingredient_analysis': True,
+                   'query_ingredients': query_ingredients}
 
-        return Response(serializer.data)
+        with (metrics.SEARCH_DURATION.labels('filter_search').time(),
+              tracing.span('search.fetch_page')):
+            page = self.paginate_queryset(qs)
+            if page is not None:
+                serializer = self.get_serializer(page, many=True, context=context)
+                return self.get_paginated_response(serializer.data)
 
+            serializer = self.get_serializer(qs, many=True, context=context)
+            data = serializer.data
 
-class IngredientViewSet(viewsets.ModelViewSet):
+        return Response(data)
+
+
+class IngredientViewSet(ConditionalGetMixin, BulkMixin, viewsets.ModelViewSet):
     """ViewSet for listing, creating, and managing ingredients."""
 
     queryset = Ingredient.objects.all()
@@ -124,10 +287,3 @@ class RegisterView(generics.CreateAPIView):
 
     queryset = User.objects.all()
     serializer_class = UserSerializer
-
-
-@permission_classes([AllowAny])
-class GoogleLogin(SocialLoginView):
-    adapter_class = GoogleOAuth2Adapter
-    callback_url = os.getenv('CALLBACK_URL')
-    client_class = OAuth2Client
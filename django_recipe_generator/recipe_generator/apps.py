@@ -9,4 +9,7 @@ class RecipeGeneratorConfig(AppConfig):
     name = 'django_recipe_generator.recipe_generator'
 
     def ready(self):
+        from django_recipe_generator import tracing
         from . import signals
+
+        tracing.configure()
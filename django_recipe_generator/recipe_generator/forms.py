@@ -7,27 +7,83 @@ formset logic for handling inline recipe ingredients.
 from django import forms
 from django.core.validators import MaxLengthValidator
 from django.core.exceptions import ValidationError
+from django.forms.models import ModelChoiceIterator
+from django_recipe_generator.services.ingredients import (
+    ingredient_catalogue, resolve_ingredients)
 from .models import Recipe, RecipeIngredient, Ingredient
 
 
+class CatalogueChoiceIterator(ModelChoiceIterator):
+    """Ingredient choices from the cached catalogue instead of a query per form."""
+
+    def __iter__(self):
+        """Yield the empty choice, then one choice per catalogue ingredient."""
+        if self.field.empty_label is not None:
+            yield ("", self.field.empty_label)
+        for ingredient in ingredient_catalogue():
+            yield self.choice(ingredient)
+
+    def __len__(self):
+        """Count the choices without a ``COUNT`` query."""
+        return len(ingredient_catalogue()) + (self.field.empty_label is not None)
+
+
+class IngredientChoiceField(forms.ModelChoiceField):
+    """Ingredient ``ModelChoiceField`` checking values against resolved IDs.
+
+    ``BaseRecipeIngredientFormSet`` resolves the ingredients of all its
+    forms at once into ``resolved`` (``{id: Ingredient or None}``); without
+    it the field queries like a ``ModelChoiceField``.
+    """
+
+    iterator = CatalogueChoiceIterator
+
+    def __init__(self, *args, **kwargs):
+        """Start with nothing resolved."""
+        super().__init__(*args, **kwargs)
+        self.resolved = None
+
+    def to_python(self, value):
+        if value in self.empty_values or self.resolved is None:
+            return super().to_python(value)
+        try:
+            ingredient = self.resolved.get(int(value))
+        except (TypeError, ValueError):
+            ingredient = None
+        if ingredient is None:
+            raise ValidationError(self.error_messages['invalid_choice'],
+                                  code='invalid_choice', params={'value': value})
+        return ingredient
+
+
 class RecipeIngredientForm(forms.ModelForm):
     """Form for creating or editing a single RecipeIngredient."""
 
     class Meta:
         model = RecipeIngredient
         fields = ('ingredient', 'quantity')
+        field_classes = {'ingredient': IngredientChoiceField}
         widgets = {
             'ingredient': forms.Select(),
             'quantity': forms.TextInput(),
         }
 
+    def _get_validation_exclusions(self):
+        """Skip the model's existence query of an ingredient the field resolved."""
+        exclude = super()._get_validation_exclusions()
+        if self.fields['ingredient'].resolved is not None:
+            exclude.add('ingredient')
+        return exclude
+
 
 class RecipeForm(forms.ModelForm):
     """Form for creating or editing a Recipe instance."""
 
     class Meta:
         model = Recipe
-        exclude = ['ingredients', 'owner', 'elevating_twist', 'ai_generation_status']
+        exclude = ['ingredients', 'owner', 'elevating_twist', 'ai_generation_status',
+                   'ai_generation_error', 'ai_generation_attempts',
+                   'ai_generation_failed_at']
         widgets = {
             'name': forms.TextInput(attrs={'class': 'input'}),
             'instructions': forms.Textarea(
@@ -58,6 +114,20 @@ class RecipeForm(forms.ModelForm):
 class BaseRecipeIngredientFormSet(forms.BaseInlineFormSet):
     """Formset for managing multiple RecipeIngredient forms."""
 
+    def full_clean(self):
+        """Resolve the ingredients chosen in all forms at once, then validate."""
+        if self.is_bound:
+            ids = set()
+            for form in self.forms:
+                try:
+                    ids.add(int(self.data.get(form.add_prefix('ingredient'))))
+                except (TypeError, ValueError):
+                    pass  # empty or invalid: reported by the form
+            resolved = resolve_ingredients(ids) if ids else {}
+            for form in self.forms:
+                form.fields['ingredient'].resolved = resolved
+        super().full_clean()
+
     def clean(self):
         """Validate ingredient uniqueness, count, and quantity presence."""
         super().clean()
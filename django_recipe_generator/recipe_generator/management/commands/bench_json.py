@@ -0,0 +1,78 @@
+"""Django management command to benchmark the API JSON renderer and parser."""
+import io
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from django_recipe_generator.recipe_generator.api import parsers, renderers
+from django_recipe_generator.recipe_generator.api.serializers import (
+    RecipeValuesSerializer)
+from django_recipe_generator.recipe_generator.api.views import search_queryset
+from django_recipe_generator.recipe_generator.models import Ingredient
+
+
+class Command(BaseCommand):
+    """Compare stdlib json and orjson on filter_search response payloads."""
+
+    help = ('Build filter_search responses of N recipes and time rendering '
+            'and parsing them with the stdlib and the orjson classes')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, nargs='+', default=[20, 100, 1000])
+        parser.add_argument('--ingredients', type=int, default=8,
+                            help='Pantry size of the search')
+        parser.add_argument('--repeat', type=int, default=20,
+                            help='Runs per measurement; the best one is kept')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        """Entry point for the management command."""
+        if renderers.orjson is None:
+            raise CommandError("orjson is not installed: pip install .[fast-json]")
+        ingredient_ids = list(Ingredient.objects.values_list('id', flat=True))
+        if not ingredient_ids:
+            raise CommandError("No data to search. Run load_data first.")
+
+        rng = random.Random(options['seed'])
+        pantry = rng.sample(ingredient_ids, min(options['ingredients'],
+                                                len(ingredient_ids)))
+        qs, query_ingredients = search_queryset({'query_ingredients': pantry})
+        context = {'include_ingredient_analysis': True,
+                   'query_ingredients': query_ingredients}
+
+        def best(func, arg):
+            timings = []
+            for _ in range(options['repeat']):
+                started = time.perf_counter()
+                func(arg)
+                timings.append(time.perf_counter() - started)
+            return min(timings)
+
+        def compare(label, slow, fast, arg):
+            slow_s, fast_s = best(slow, arg), best(fast, arg)
+            self.stdout.write(f"  {label:6} {slow_s * 1000:10.2f} ms "
+                              f"{fast_s * 1000:10.2f} ms {slow_s / fast_s:8.1f}x")
+
+        stdlib_renderer = JSONRenderer()
+        orjson_renderer = renderers.ORJSONRenderer()
+        stdlib_parser = JSONParser()
+        orjson_parser = parsers.ORJSONParser()
+
+        for n in options['rows']:
+            results = RecipeValuesSerializer(qs[:n], many=True, context=context).data
+            data = {'count': len(results), 'next': None, 'previous': None,
+                    'results': results}
+            body = stdlib_renderer.render(data)
+
+            self.stdout.write(self.style.MIGRATE_HEADING(
+                f"\n=== filter_search, {len(results)} recipes, "
+                f"{len(body) / 1024:.0f} KiB (best of {options['repeat']}) ==="
+            ))
+            self.stdout.write(f"  {'':6} {'stdlib':>13} {'orjson':>13} {'speedup':>9}")
+            compare('render', stdlib_renderer.render, orjson_renderer.render, data)
+            compare('parse',
+                    lambda b: stdlib_parser.parse(io.BytesIO(b)),
+                    lambda b: orjson_parser.parse(io.BytesIO(b)), body)
@@ -0,0 +1,65 @@
+"""Django management command to benchmark the recipe list serializers."""
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Prefetch
+
+from django_recipe_generator.recipe_generator.api.serializers import (
+    RecipeSerializer, RecipeValuesSerializer)
+from django_recipe_generator.recipe_generator.api.views import values_queryset
+from django_recipe_generator.recipe_generator.models import Recipe, RecipeIngredient
+
+
+class Command(BaseCommand):
+    """Compare RecipeSerializer and RecipeValuesSerializer per-row cost."""
+
+    help = ('Serialize the first N recipes with RecipeSerializer (model '
+            'instances) and RecipeValuesSerializer (.values() rows) and '
+            'report the time per row, queries included')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, nargs='+', default=[100, 1000])
+        parser.add_argument('--repeat', type=int, default=5,
+                            help='Runs per measurement; the best one is kept')
+
+    def handle(self, *args, **options):
+        """Entry point for the management command."""
+        total = Recipe.objects.count()
+        if not total:
+            raise CommandError("No recipes to serialize. Run load_data first.")
+
+        def model_serializer(n):
+            recipes = Recipe.objects.prefetch_related(Prefetch(
+                'recipeingredient_set',
+                queryset=RecipeIngredient.objects.select_related('ingredient'),
+            ))[:n]
+            return RecipeSerializer(recipes, many=True).data
+
+        def values_serializer(n):
+            rows = values_queryset(Recipe.objects.all(), None)[:n]
+            return RecipeValuesSerializer(rows, many=True).data
+
+        def best(serialize, n):
+            timings = []
+            for _ in range(options['repeat']):
+                started = time.perf_counter()
+                serialize(n)
+                timings.append(time.perf_counter() - started)
+            return min(timings)
+
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f"\n=== Serializer cost per row (best of {options['repeat']}) ==="
+        ))
+        self.stdout.write(f"{'rows':>6} {'RecipeSerializer':>18} "
+                          f"{'RecipeValuesSerializer':>24} {'speedup':>8}")
+        for n in options['rows']:
+            if n > total:
+                self.stdout.write(self.style.WARNING(
+                    f"Only {total} recipes, measuring {total} instead of {n}"))
+                n = total
+            slow = best(model_serializer, n)
+            fast = best(values_serializer, n)
+            self.stdout.write(
+                f"{n:6d} {slow / n * 1e6:15.1f} us {fast / n * 1e6:21.1f} us "
+                f"{slow / fast:7.1f}x"
+            )
@@ -0,0 +1,96 @@
+"""Django management command to load test search endpoints of a running server."""
+import json
+import random
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
+
+from django.core.management.base import BaseCommand, CommandError
+
+from django_recipe_generator.recipe_generator.models import Ingredient, Recipe
+
+
+class Command(BaseCommand):
+    """Fire concurrent search/detail requests and report throughput and latency."""
+
+    help = ('Load test a running server (WSGI or ASGI) with concurrent '
+            'search, list or detail requests')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--base-url', default='http://localhost:8000')
+        parser.add_argument('--target', default='filter_search',
+                            choices=['filter_search', 'list', 'detail'])
+        parser.add_argument('--concurrency', type=int, default=32)
+        parser.add_argument('--requests', type=int, default=2000)
+        parser.add_argument('--ingredients', type=int, default=8,
+                            help='Pantry size of each ingredient search')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--token', default=None,
+                            help='API token; the API throttles anonymous '
+                                 'clients to 10 requests/minute')
+
+    def handle(self, *args, **options):
+        """Entry point for the management command."""
+        rng = random.Random(options['seed'])
+        ingredient_ids = list(Ingredient.objects.values_list('id', flat=True))
+        recipe_ids = list(Recipe.objects.values_list('id', flat=True))
+        if not ingredient_ids or not recipe_ids:
+            raise CommandError("No data to search. Run load_data first.")
+
+        base = options['base_url'].rstrip('/') + '/recipe_generator'
+        headers = {}
+        if options['token']:
+            headers['Authorization'] = f"Token {options['token']}"
+        pantry_size = min(options['ingredients'], len(ingredient_ids))
+
+        def make_request():
+            pantry = rng.sample(ingredient_ids, pantry_size)
+            if options['target'] == 'filter_search':
+                return urllib.request.Request(
+                    f"{base}/api/recipes/filter_search/",
+                    data=json.dumps({'query_ingredients': pantry}).encode(),
+                    headers={**headers, 'Content-Type': 'application/json'},
+                )
+            if options['target'] == 'list':
+                query = urlencode({'query_ingredients': pantry}, doseq=True)
+                return urllib.request.Request(f"{base}/recipes/?{query}",
+                                              headers=headers)
+            return urllib.request.Request(
+                f"{base}/recipes/{rng.choice(recipe_ids)}/", headers=headers
+            )
+
+        def send(request):
+            started = time.perf_counter()
+            try:
+                with urllib.request.urlopen(request, timeout=60) as response:
+                    response.read()
+                    status = response.status
+            except urllib.error.HTTPError as e:
+                status = e.code
+            except OSError:
+                status = None
+            return time.perf_counter() - started, status
+
+        requests = [make_request() for _ in range(options['requests'])]
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['concurrency']) as pool:
+            results = list(pool.map(send, requests))
+        elapsed = time.perf_counter() - started
+
+        latencies = sorted(latency for latency, _ in results)
+        errors = sum(1 for _, status in results if status != 200)
+
+        def percentile(p):
+            return latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000
+
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f"\n=== {options['target']} x{len(results)}, "
+            f"concurrency {options['concurrency']} ==="
+        ))
+        self.stdout.write(f"Throughput: {len(results) / elapsed:8.1f} req/s")
+        self.stdout.write(f"p50:        {percentile(0.50):8.1f} ms")
+        self.stdout.write(f"p95:        {percentile(0.95):8.1f} ms")
+        self.stdout.write(f"p99:        {percentile(0.99):8.1f} ms")
+        self.stdout.write(f"Errors:     {errors:8d}")
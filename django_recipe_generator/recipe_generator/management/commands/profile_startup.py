@@ -0,0 +1,77 @@
+"""Django management command to profile web worker startup."""
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from django_recipe_generator.startup import profile_startup
+
+
+class Command(BaseCommand):
+    """Report per-module import time and time to first request."""
+
+    help = ('Boot the WSGI app in a fresh interpreter with -X importtime, '
+            'serve one request and report where startup time goes')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default='/recipe_generator/',
+                            help='URL path of the first request')
+        parser.add_argument('--host', default=None,
+                            help='Host header (defaults to the first ALLOWED_HOSTS)')
+        parser.add_argument('--top', type=int, default=25,
+                            help='Number of slowest modules to list')
+        parser.add_argument('--lazy', default=None,
+                            help='Override LAZY_SUBSYSTEMS for the profiled process')
+        parser.add_argument('--budget-ms', type=float, default=None,
+                            help='Fail if time to first request exceeds this')
+
+    def handle(self, *args, **options):
+        """Run the profile and print the breakdown."""
+        host = options['host'] or next(
+            (h for h in settings.ALLOWED_HOSTS if h and h != '*'), 'localhost'
+        )
+        env = {}
+        if options['lazy'] is not None:
+            env['LAZY_SUBSYSTEMS'] = options['lazy']
+
+        try:
+            profile = profile_startup(options['path'], host, env=env)
+        except RuntimeError as e:
+            raise CommandError(f"Startup failed: {e}")
+
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f"\n=== Slowest {options['top']} modules (self time) ==="
+        ))
+        slowest = sorted(profile['imports'], key=lambda row: row[1], reverse=True)
+        for name, self_us, cumulative_us, _ in slowest[:options['top']]:
+            self.stdout.write(
+                f"{self_us / 1000:8.1f} ms {cumulative_us / 1000:8.1f} ms  {name}"
+            )
+
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            "\n=== Import time by top-level package ==="
+        ))
+        by_package = defaultdict(int)
+        for name, self_us, _, _ in profile['imports']:
+            by_package[name.split('.')[0]] += self_us
+        total_us = sum(by_package.values())
+        for package, self_us in sorted(by_package.items(), key=lambda kv: kv[1],
+                                       reverse=True)[:options['top']]:
+            self.stdout.write(f"{self_us / 1000:8.1f} ms  {package}")
+        self.stdout.write(f"{total_us / 1000:8.1f} ms  (all imports)")
+
+        self.stdout.write(self.style.MIGRATE_HEADING("\n=== Timings ==="))
+        self.stdout.write(f"App load:              {profile['app_load_ms']:8.1f} ms")
+        self.stdout.write(
+            f"First request:         {profile['first_request_ms']:8.1f} ms"
+            f"  ({profile['status']} {options['path']})"
+        )
+        ttfr = profile['time_to_first_request_ms']
+        self.stdout.write(f"Time to first request: {ttfr:8.1f} ms")
+
+        if options['budget_ms'] is not None and ttfr > options['budget_ms']:
+            raise CommandError(
+                f"Time to first request {ttfr:.1f} ms exceeds the "
+                f"{options['budget_ms']:.1f} ms budget"
+            )
+        self.stdout.write(self.style.SUCCESS("\n=== STARTUP PROFILE DONE ==="))
@@ -0,0 +1,27 @@
+"""Django management command to rebuild the recipe ingredient signatures."""
+from django.core.management.base import BaseCommand
+
+from django_recipe_generator.recipe_generator.models import Recipe, RecipeSignature
+from django_recipe_generator.services import keyset, search_cache
+
+
+class Command(BaseCommand):
+    """Recompute every ``RecipeSignature`` from ``RecipeIngredient``."""
+
+    help = ('Rebuild the ingredient signatures ingredient searches run on, '
+            'e.g. after loading data or bulk edits that bypass the signals')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Recipes recomputed per transaction')
+
+    def handle(self, *args, **options):
+        """Entry point for the management command."""
+        batch_size = options['batch_size']
+        total = recipes = 0
+        for recipe_ids in keyset.pk_batches(Recipe.objects.all(), batch_size):
+            total += RecipeSignature.objects.refresh(recipe_ids)
+            recipes += len(recipe_ids)
+        search_cache.invalidate()
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt {total} signatures of {recipes} recipes"))
@@ -0,0 +1,98 @@
+"""Django management command to print traces of the tracing file exporter."""
+import json
+from collections import defaultdict
+from datetime import datetime
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+def parse_time(value):
+    """Timestamp of an exported span time."""
+    return datetime.fromisoformat(value).timestamp()
+
+
+class Command(BaseCommand):
+    """Print the span trees of the latest traces in ``TRACING_FILE``."""
+
+    help = ('Read the spans written with TRACING_EXPORTER=file and print the '
+            'latest traces as trees with span offsets and durations')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--file', default=None,
+                            help='Trace file (defaults to TRACING_FILE)')
+        parser.add_argument('--last', type=int, default=5,
+                            help='Number of most recent traces to print')
+        parser.add_argument('--name', default=None,
+                            help='Only traces with a span whose name contains this, '
+                                 'e.g. generate_ai_twist')
+        parser.add_argument('--trace-id', default=None,
+                            help='Print only this trace')
+
+    def handle(self, *args, **options):
+        """Group the spans by trace and print the selected traces."""
+        path = options['file'] or settings.TRACING_FILE
+        try:
+            with open(path) as f:
+                spans = [json.loads(line) for line in f if line.strip()]
+        except OSError as e:
+            raise CommandError(f"Cannot read {path}: {e}")
+
+        traces = defaultdict(list)
+        for span in spans:
+            span['start'] = parse_time(span['start_time'])
+            span['duration_ms'] = (parse_time(span['end_time']) - span['start']) * 1000
+            traces[span['context']['trace_id']].append(span)
+
+        def matches(trace_id, trace_spans):
+            if options['trace_id'] not in (None, trace_id):
+                return False
+            return options['name'] is None or any(
+                options['name'] in span['name'] for span in trace_spans)
+
+        selected = [(trace_id, trace_spans) for trace_id, trace_spans in traces.items()
+                    if matches(trace_id, trace_spans)]
+        selected.sort(key=lambda item: min(span['start'] for span in item[1]))
+        if not selected:
+            raise CommandError("No matching traces.")
+        for trace_id, trace_spans in selected[-options['last']:]:
+            self.print_trace(trace_id, trace_spans)
+
+    def print_trace(self, trace_id, spans):
+        """Print one trace, children under their parents in start order."""
+        started = min(span['start'] for span in spans)
+        span_ids = {span['context']['span_id'] for span in spans}
+        children = defaultdict(list)
+        for span in sorted(spans, key=lambda span: span['start']):
+            parent = span['parent_id'] if span['parent_id'] in span_ids else None
+            children[parent].append(span)
+
+        ended = max(parse_time(span['end_time']) for span in spans)
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f"\n=== trace {trace_id} {datetime.fromtimestamp(started):%H:%M:%S} "
+            f"{(ended - started) * 1000:.1f} ms, {len(spans)} spans ==="
+        ))
+        self.stdout.write(f"{'start':>10} {'duration':>11}")
+
+        def walk(parent, depth):
+            for span in children[parent]:
+                offset_ms = (span['start'] - started) * 1000
+                self.stdout.write(
+                    f"{offset_ms:7.1f} ms {span['duration_ms']:8.1f} ms"
+                    f"  {'  ' * depth}{span['name']}{self.details(span)}"
+                )
+                walk(span['context']['span_id'], depth + 1)
+
+        walk(None, 0)
+
+    @staticmethod
+    def details(span):
+        """Service, query counts and errors of a span."""
+        attributes = span['attributes']
+        details = [span['resource']['attributes'].get('service.name', '')]
+        if 'db.query_count' in attributes:
+            details.append(f"{attributes['db.query_count']} queries "
+                           f"{attributes['db.duration_ms']:.1f} ms")
+        if span['status']['status_code'] == 'ERROR':
+            details.append(f"ERROR {span['status'].get('description') or ''}".strip())
+        return f"  [{', '.join(filter(None, details))}]"
@@ -0,0 +1,28 @@
+# Generated by Django 5.2 on 2026-10-18 22:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipe_generator', '0003_recipe_ai_generation_status'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='ai_generation_attempts',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='ai_generation_error',
+            field=models.TextField(blank=True, default=''),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='ai_generation_failed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 5.2 on 2026-10-19 00:10
+
+from collections import defaultdict
+
+import django.db.models.deletion
+import django_recipe_generator.recipe_generator.models
+from django.db import migrations, models
+
+
+def create_gin_index(apps, schema_editor):
+    # array overlap (&&) lookups of ingredient searches; arrays are PostgreSQL only
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(
+            'CREATE INDEX recipe_signature_ingredient_ids_gin '
+            'ON recipe_generator_recipesignature USING gin (ingredient_ids)')
+
+
+def drop_gin_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(
+            'DROP INDEX IF EXISTS recipe_signature_ingredient_ids_gin')
+
+
+def build_signatures(apps, schema_editor):
+    RecipeIngredient = apps.get_model('recipe_generator', 'RecipeIngredient')
+    RecipeSignature = apps.get_model('recipe_generator', 'RecipeSignature')
+    ingredient_ids = defaultdict(set)
+    for recipe_id, ingredient_id in RecipeIngredient.objects.values_list(
+            'recipe_id', 'ingredient_id').iterator():
+        ingredient_ids[recipe_id].add(ingredient_id)
+    RecipeSignature.objects.bulk_create([
+        RecipeSignature(recipe_id=recipe_id, ingredient_count=len(ids),
+                        ingredient_ids=sorted(ids))
+        for recipe_id, ids in ingredient_ids.items()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipe_generator', '0005_recipe_ingredient_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecipeSignature',
+            fields=[
+                ('recipe', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='signature', serialize=False, to='recipe_generator.recipe')),
+                ('ingredient_count', models.PositiveSmallIntegerField()),
+                ('ingredient_ids', django_recipe_generator.recipe_generator.models.IntegerArrayField(base_field=models.IntegerField(), default=list, size=None)),
+            ],
+        ),
+        migrations.RunPython(create_gin_index, drop_gin_index),
+        migrations.RunPython(build_signatures, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.2 on 2026-10-19 01:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipe_generator', '0006_recipesignature'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipesignature',
+            name='stale',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddIndex(
+            model_name='recipesignature',
+            index=models.Index(condition=models.Q(('stale', True)), fields=['recipe'], name='recipe_signature_stale'),
+        ),
+    ]
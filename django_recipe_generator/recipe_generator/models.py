@@ -3,14 +3,62 @@
 Models for Recipe, general  and recipe-related ingredients,
 macros, manager for search and filter logic.
 """
+import json
+from collections import defaultdict
 
-from django.db import models
+from django.conf import settings
+from django.db import connections, models, transaction
 from django.contrib.auth.models import User
+from django.contrib.postgres.fields import ArrayField
 from django.core.validators import MinLengthValidator, MinValueValidator
-from django.db.models import Count, ExpressionWrapper, F, IntegerField, Q
+from django.db.models import (
+    Case, Count, ExpressionWrapper, F, Func, IntegerField, OuterRef, Q, Subquery,
+    Value, When)
+from django.utils import timezone
 from model_utils import FieldTracker
 
 
+class IntegerArrayField(ArrayField):
+    """``integer[]`` on PostgreSQL, a JSON list in a text column elsewhere.
+
+    Other databases (SQLite in tests) store and load the same lists, but
+    only PostgreSQL can filter on them (``__overlap``, GIN index).
+    """
+
+    def __init__(self, base_field=None, **kwargs):
+        """Use integer elements unless told otherwise (migrations)."""
+        super().__init__(base_field or IntegerField(), **kwargs)
+
+    def db_type(self, connection):
+        if connection.vendor == 'postgresql':
+            return super().db_type(connection)
+        return 'text'
+
+    def get_placeholder(self, value, compiler, connection):
+        if connection.vendor == 'postgresql':
+            return super().get_placeholder(value, compiler, connection)
+        return '%s'
+
+    def get_db_prep_value(self, value, connection, prepared=False):
+        value = super().get_db_prep_value(value, connection, prepared)
+        if connection.vendor != 'postgresql' and value is not None:
+            return json.dumps(value)
+        return value
+
+    def from_db_value(self, value, expression, connection):
+        if isinstance(value, str):
+            return json.loads(value)
+        return value
+
+
+class ArrayIntersectionSize(Func):
+    """Number of distinct elements shared by two arrays (PostgreSQL)."""
+
+    template = 'cardinality(ARRAY(SELECT unnest(%(expressions)s)))'
+    arg_joiner = ') INTERSECT SELECT unnest('
+    output_field = IntegerField()
+
+
 class RecipeQuerySet(models.QuerySet):
     """Custom queryset for filtering and searching recipes."""
 
@@ -31,7 +79,36 @@ class RecipeQuerySet(models.QuerySet):
         if query_name:
             qs = qs.filter(name__icontains=query_name)
 
-        if query_ingredients:
+        if query_ingredients and self.uses_signatures():
+            ids = sorted({int(i) for i in query_ingredients})
+            # one indexed (GIN) overlap test per recipe instead of a GROUP BY
+            # over all of their ingredients; recipes whose signature is not
+            # refreshed yet (stale) are matched on their ingredients instead
+            fresh = Q(signature__stale=False)
+            links = RecipeIngredient.objects.filter(
+                recipe=OuterRef('pk')).order_by().values('recipe')
+            stale = Q(signature__stale=True, pk__in=RecipeIngredient.objects.filter(
+                ingredient__in=ids).values('recipe'))
+            distinct = Count('ingredient', distinct=True)
+            qs = qs.filter(
+                Q(fresh, signature__ingredient_ids__overlap=ids) | stale
+            ).annotate(
+                total=Case(
+                    When(fresh, then=F('signature__ingredient_count')),
+                    default=Subquery(links.annotate(n=distinct).values('n')),
+                    output_field=IntegerField()),
+                matching=Case(
+                    When(fresh, then=ArrayIntersectionSize(
+                        'signature__ingredient_ids',
+                        Value(ids, output_field=IntegerArrayField()))),
+                    default=Subquery(links.filter(ingredient__in=ids).annotate(
+                        n=distinct).values('n')),
+                    output_field=IntegerField()),
+            ).annotate(
+                missing=ExpressionWrapper(F('total') - F('matching'),
+                                          output_field=IntegerField())
+            ).order_by('missing')
+        elif query_ingredients:
             qs = qs.annotate(
                 total=Count('ingredients', distinct=True),
                 matching=Count('ingredients',
@@ -69,6 +146,18 @@ class RecipeQuerySet(models.QuerySet):
 
         return qs
 
+    def touch(self):
+        """Bump `updated_at` for changes that bypass `save()`.
+
+        E.g. ingredient list changes, renamed ingredients or `update()` calls.
+        """
+        return self.update(updated_at=timezone.now())
+
+    def uses_signatures(self):
+        """Whether ingredient searches run on `RecipeSignature` (PostgreSQL)."""
+        vendor = connections[self.db].vendor
+        return settings.SEARCH_USE_SIGNATURES and vendor == 'postgresql'
+
 
 class RecipeManager(models.Manager):
     """Custom manager using RecipeQuerySet."""
@@ -91,6 +180,7 @@ class Ingredient(models.Model):
 
     name = models.CharField(max_length=100)
     category = models.CharField(max_length=50)  # e.g., "protein", "vegetable"
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     class Meta:
         ordering = ['id']
@@ -128,6 +218,10 @@ class Recipe(models.Model):
         ],
         default='pending'
     )
+    ai_generation_error = models.TextField(blank=True, default='')
+    ai_generation_attempts = models.PositiveSmallIntegerField(default=0)
+    ai_generation_failed_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     objects = RecipeManager()
 
@@ -153,6 +247,81 @@ class RecipeIngredient(models.Model):
         return self.quantity
 
 
+class RecipeSignatureManager(models.Manager):
+    """Manager maintaining the signatures from `RecipeIngredient`."""
+
+    def mark_stale(self, recipe_ids):
+        """Flag the signatures of `recipe_ids` as out of date until refreshed.
+
+        Run in the transaction changing their ingredients: searches then
+        match these recipes on `RecipeIngredient` (see `search`), so they are
+        not missed while the refresh task is queued, late, or never queued.
+        Recipes without a signature yet get an empty, stale one.
+        """
+        self.bulk_create(
+            [self.model(recipe_id=recipe_id, ingredient_count=0, stale=True)
+             for recipe_id in recipe_ids],
+            update_conflicts=True, unique_fields=['recipe'],
+            update_fields=['stale'])
+
+    def refresh(self, recipe_ids=None):
+        """Recompute the signatures of `recipe_ids` (of all recipes if None).
+
+        Recipes left without ingredients lose their signature.
+        """
+        links = RecipeIngredient.objects.order_by()
+        stale = self.all()
+        if recipe_ids is not None:
+            links = links.filter(recipe_id__in=recipe_ids)
+            stale = stale.filter(recipe_id__in=recipe_ids)
+        ingredient_ids = defaultdict(set)
+        for recipe_id, ingredient_id in links.values_list('recipe_id',
+                                                          'ingredient_id'):
+            ingredient_ids[recipe_id].add(ingredient_id)
+        signatures = [
+            self.model(recipe_id=recipe_id, ingredient_count=len(ids),
+                       ingredient_ids=sorted(ids), stale=False)
+            for recipe_id, ids in ingredient_ids.items()
+        ]
+        with transaction.atomic(using=self.db):
+            stale.exclude(recipe_id__in=RecipeIngredient.objects.values(
+                'recipe_id')).delete()
+            self.bulk_create(signatures, batch_size=1000, update_conflicts=True,
+                             unique_fields=['recipe'],
+                             update_fields=['ingredient_count', 'ingredient_ids',
+                                            'stale'])
+        return len(signatures)
+
+
+class RecipeSignature(models.Model):
+    """Ingredient signature of a recipe, what ingredient searches run on.
+
+    The recipe's distinct ingredient IDs, sorted, and their count; kept in
+    step with `RecipeIngredient` by the `refresh_signatures` task (see
+    signals), rebuilt with `manage.py rebuild_signatures`. `stale` is set
+    with every ingredient change and cleared by the refresh. The GIN index
+    on `ingredient_ids` (PostgreSQL only) is created by its migration.
+    """
+
+    recipe = models.OneToOneField(Recipe, on_delete=models.CASCADE,
+                                  primary_key=True, related_name='signature')
+    ingredient_count = models.PositiveSmallIntegerField()
+    ingredient_ids = IntegerArrayField(default=list)
+    stale = models.BooleanField(default=False)
+
+    objects = RecipeSignatureManager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['recipe'], condition=Q(stale=True),
+                         name='recipe_signature_stale'),
+        ]
+
+    def __str__(self):
+        """Recipesignature representation."""
+        return f"Signature of recipe {self.recipe_id}"
+
+
 class Macro(models.Model):
     """Nutritional information for a recipe."""
 
@@ -1,10 +1,28 @@
-from django.db.models.signals import post_save, m2m_changed
-from django.dispatch import receiver
-from .models import Recipe
-from .tasks import generate_ai_twist
+import logging
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete, m2m_changed
+from django.dispatch import Signal, receiver
+
+from django_recipe_generator import tracing
+from django_recipe_generator.services import search_cache
+from django_recipe_generator.services.ingredients import invalidate_catalogue
+from django_recipe_generator.services.recipe_cache import bump_version
+from .models import Ingredient, Recipe, RecipeIngredient, RecipeSignature
+from .tasks import generate_ai_twist, refresh_signatures
+
+logger = logging.getLogger(__name__)
+
+# Sent by the bulk API writes, which bypass the model signals:
+# recipe_ids (saved), ingredients_changed (their ingredient list was
+# written) and renamed (updates only).
+recipes_bulk_saved = Signal()
+# ingredient_ids and created (bulk create, else bulk update)
+ingredients_bulk_saved = Signal()
 
 
 @receiver(post_save, sender=Recipe)
+@tracing.traced()
 def trigger_ai_twist_on_recipe_change(sender, instance, created, **kwargs):
     """Trigger AI for name changes"""
     # hasattr safety check if not tracker(bulk oper,raw SQL updates)
@@ -13,7 +31,135 @@ def trigger_ai_twist_on_recipe_change(sender, instance, created, **kwargs):
 
 
 @receiver(m2m_changed, sender=Recipe.ingredients.through)
+@tracing.traced()
 def trigger_ai_twist_on_ingredients_change(sender, instance, action, **kwargs):
     """Trigger AI when ingredients change"""
     if action in ['post_add', 'post_remove', 'post_clear']:
         generate_ai_twist.delay(instance.id)
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def invalidate_recipe_fragment(sender, instance, **kwargs):
+    """Drop the cached detail fragment of a saved/deleted recipe."""
+    bump_version(instance.pk)
+
+
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def touch_recipe_on_ingredients_change(sender, instance, action, **kwargs):
+    """Bump `updated_at` and drop the cached fragment on ingredient list changes."""
+    if action in ['post_add', 'post_remove', 'post_clear']:
+        Recipe.objects.filter(pk=instance.pk).touch()
+        bump_version(instance.pk)
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(pre_delete, sender=Ingredient)
+def touch_recipes_on_ingredient_change(sender, instance, created=False, **kwargs):
+    """Touch all recipes using a renamed/deleted ingredient."""
+    if not created:
+        recipe_ids = list(instance.recipe_set.values_list('pk', flat=True))
+        Recipe.objects.filter(pk__in=recipe_ids).touch()
+        bump_version(*recipe_ids)
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+@receiver(pre_delete, sender=Ingredient)
+def invalidate_search_pages(sender, action=None, **kwargs):
+    """Mark the cached search result pages stale."""
+    if action in (None, 'post_add', 'post_remove', 'post_clear'):
+        search_cache.invalidate()
+
+
+def queue_signature_refresh(recipe_ids):
+    """Queue `refresh_signatures` for `recipe_ids` once the transaction commits.
+
+    Their signatures are marked stale right away, so searches do not miss
+    the recipes until the task has run.
+    """
+    recipe_ids = sorted(recipe_ids)
+    if not recipe_ids:
+        return
+    RecipeSignature.objects.mark_stale(recipe_ids)
+
+    def queue():
+        try:
+            refresh_signatures.apply_async((recipe_ids,), retry=False)
+        except Exception:
+            # searched without their signature until the next change or
+            # `manage.py rebuild_signatures`
+            logger.warning("Cannot queue the signature refresh of recipes %s",
+                           recipe_ids, exc_info=True)
+
+    transaction.on_commit(queue)
+
+
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def refresh_signatures_on_ingredients_change(sender, instance, action, reverse,
+                                             pk_set, **kwargs):
+    """Refresh the signatures of recipes whose ingredient list changed."""
+    if not reverse:
+        if action in ['post_add', 'post_remove', 'post_clear']:
+            queue_signature_refresh([instance.pk])
+    elif action in ['post_add', 'post_remove']:
+        queue_signature_refresh(pk_set)
+    elif action == 'pre_clear':
+        queue_signature_refresh(instance.recipe_set.values_list('pk', flat=True))
+
+
+@receiver(post_save, sender=RecipeIngredient)
+@receiver(post_delete, sender=RecipeIngredient)
+def refresh_signature_on_recipe_ingredient_change(sender, instance, created=False,
+                                                  origin=None, **kwargs):
+    """Refresh the signature on links saved/deleted one by one (admin, load_data).
+
+    Deletions through the m2m manager or a recipe/ingredient deletion are
+    handled by the other receivers, once per call rather than per row.
+    """
+    if created or origin is instance:
+        queue_signature_refresh([instance.recipe_id])
+
+
+@receiver(pre_delete, sender=Ingredient)
+def refresh_signatures_on_ingredient_delete(sender, instance, **kwargs):
+    """Refresh the signatures of the recipes losing a deleted ingredient."""
+    queue_signature_refresh(instance.recipe_set.values_list('pk', flat=True))
+
+
+@receiver(recipes_bulk_saved)
+def update_after_recipes_bulk_saved(sender, recipe_ids, ingredients_changed=(),
+                                    renamed=(), **kwargs):
+    """Do for recipes written in bulk what the model signals do one by one."""
+    bump_version(*recipe_ids)
+    search_cache.invalidate()
+    queue_signature_refresh(ingredients_changed)
+    twist_ids = sorted({*ingredients_changed, *renamed})
+
+    def queue_twists():
+        for recipe_id in twist_ids:
+            generate_ai_twist.delay(recipe_id)
+
+    if twist_ids:
+        transaction.on_commit(queue_twists)
+
+
+@receiver(ingredients_bulk_saved)
+def touch_recipes_on_ingredients_bulk_saved(sender, ingredient_ids, created=False,
+                                            **kwargs):
+    """Touch all recipes using ingredients updated in bulk."""
+    if created:
+        return
+    recipe_ids = list(Recipe.objects.filter(ingredients__in=ingredient_ids)
+                      .values_list('pk', flat=True).distinct())
+    Recipe.objects.filter(pk__in=recipe_ids).touch()
+    bump_version(*recipe_ids)
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+@receiver(ingredients_bulk_saved)
+def invalidate_ingredient_catalogue(sender, **kwargs):
+    """Drop the cached ingredient catalogue on any ingredient change."""
+    invalidate_catalogue()
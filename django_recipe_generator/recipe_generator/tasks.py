@@ -1,26 +1,110 @@
 from celery import shared_task
-from django_recipe_generator.services.gemini_client import get_unexpected_twist
-from .models import Recipe, RecipeIngredient
+from celery.exceptions import Retry
+from celery.utils.time import get_exponential_backoff_interval
+from django.conf import settings
+from django.utils import timezone
 
+from django_recipe_generator import metrics, tracing
+from django_recipe_generator.services.circuit_breaker import (
+    CircuitOpenError, gemini_breaker)
+from django_recipe_generator.services.gemini_client import (
+    get_unexpected_twist, is_retryable_error)
+from django_recipe_generator.services.recipe_cache import bump_version
+from django_recipe_generator.services.search_cache import invalidate, refresh_page
+from django_recipe_generator.services.twist_status import publish_status
+from .models import Recipe, RecipeIngredient, RecipeSignature
 
-@shared_task
-def generate_ai_twist(recipe_id):
+
+@tracing.traced('twist.set_status')
+def _set_status(recipe_id, owner_id, status, **fields):
+    """Update `ai_generation_status` and notify the status stream subscribers."""
+    Recipe.objects.filter(id=recipe_id).update(ai_generation_status=status,
+                                               updated_at=timezone.now(),
+                                               **fields)
+    bump_version(recipe_id)
+    metrics.TWIST_STATUS.labels(status).inc()
+    publish_status(recipe_id, owner_id, status, fields.get('elevating_twist'))
+
+
+def _mark_failed(recipe_id, owner_id, exc, attempts):
+    """Store failure metadata, leaving `elevating_twist` untouched."""
+    _set_status(
+        recipe_id, owner_id, 'failed',
+        ai_generation_error=f"{type(exc).__name__}: {exc}"[:1000],
+        ai_generation_attempts=attempts,
+        ai_generation_failed_at=timezone.now(),
+    )
+
+
+@shared_task(bind=True, max_retries=settings.GEMINI_MAX_RETRIES)
+def generate_ai_twist(self, recipe_id):
+    attempts = self.request.retries + 1
+    recipe = Recipe.objects.filter(id=recipe_id).values_list(
+        'name', 'owner_id').first()
+    if recipe is None:
+        return  # deleted before the task ran
+    recipe_name, owner_id = recipe
+    probing = False
     try:
-        Recipe.objects.filter(id=recipe_id).update(
-            ai_generation_status='generating'
-        )
-        recipe_name = Recipe.objects.filter(id=recipe_id
-                                            ).values_list('name', flat=True).first()
+        # fast-fail while Gemini is unhealthy instead of waiting on a timeout
+        probing = gemini_breaker.before_call()
 
-        ingredients = RecipeIngredient.objects.filter(
-            recipe_id=recipe_id).select_related('ingredient').values_list(
-                'ingredient__name', flat=True)
+        _set_status(recipe_id, owner_id, 'generating',
+                    ai_generation_attempts=attempts)
 
-        generated_text = get_unexpected_twist(recipe_name, list(ingredients))
+        with tracing.span('twist.load_ingredients'):
+            ingredients = list(RecipeIngredient.objects.filter(
+                recipe_id=recipe_id).select_related('ingredient').values_list(
+                    'ingredient__name', flat=True))
 
-        Recipe.objects.filter(id=recipe_id).update(elevating_twist=generated_text,
-                                                   ai_generation_status='completed')
+        generated_text = get_unexpected_twist(recipe_name, ingredients)
+    except CircuitOpenError as e:
+        _set_status(recipe_id, owner_id, 'pending')
+        # defer until the breaker lets a probe through, spread out a little;
+        # re-sent like retry() does but keeping the retry count: waiting out
+        # an outage is no attempt and must not use up max_retries
+        countdown = e.retry_after + get_exponential_backoff_interval(
+            settings.GEMINI_RETRY_BACKOFF, 0, e.retry_after, full_jitter=True)
+        self.signature_from_request(
+            countdown=countdown, retries=self.request.retries).apply_async()
+        raise Retry(exc=e, when=countdown)
     except Exception as e:
-        error_msg = f"Generation error: {str(e)}"
-        Recipe.objects.filter(id=recipe_id).update(elevating_twist=error_msg,
-                                                   ai_generation_status='failed')
+        if not is_retryable_error(e):
+            if probing:
+                # says nothing about Gemini's health: let the next call probe
+                gemini_breaker.release_probe()
+            _mark_failed(recipe_id, owner_id, e, attempts)
+            return
+
+        gemini_breaker.record_failure()
+        if self.request.retries >= self.max_retries:
+            _mark_failed(recipe_id, owner_id, e, attempts)
+            return
+        _set_status(recipe_id, owner_id, 'pending')
+        countdown = get_exponential_backoff_interval(
+            settings.GEMINI_RETRY_BACKOFF,
+            self.request.retries,
+            settings.GEMINI_RETRY_BACKOFF_MAX,
+            full_jitter=True,
+        )
+        raise self.retry(exc=e, countdown=countdown)
+
+    gemini_breaker.record_success()
+    _set_status(recipe_id, owner_id, 'completed',
+                elevating_twist=generated_text,
+                ai_generation_error='',
+                ai_generation_failed_at=None)
+
+
+@shared_task(ignore_result=True)
+def refresh_search_page(spec, cursor, page_size, count_mode):
+    """Recompute a cached search page before it expires (``search_cache``)."""
+    refresh_page(spec, cursor, page_size, count_mode)
+
+
+@shared_task(ignore_result=True)
+def refresh_signatures(recipe_ids):
+    """Recompute the ingredient signatures of recipes (``RecipeSignature``)."""
+    RecipeSignature.objects.refresh(recipe_ids)
+    # cached search pages may predate the new signatures
+    invalidate()
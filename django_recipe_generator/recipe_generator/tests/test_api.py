@@ -1,23 +1,50 @@
 """Test module for API."""
+import datetime
+import io
+import time
+import zoneinfo
+from decimal import Decimal
+
+from unittest import skipUnless
+
+from asgiref.sync import sync_to_async
 from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.cache.backends.locmem import LocMemCache
 from django.urls import reverse
+from django.utils import timezone
+from django.utils.http import http_date
+from django.utils.translation import gettext_lazy
 from unittest.mock import patch
 
+import redis
 from rest_framework import status
 from rest_framework.authtoken.models import Token
-from rest_framework.test import APITestCase
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIRequestFactory, APITestCase
 
 from django_recipe_generator.recipe_generator.models import (
     Ingredient,
     Recipe,
     RecipeIngredient,
 )
+from django_recipe_generator.recipe_generator.api import (
+    parsers, renderers, throttling)
+from django_recipe_generator.recipe_generator.api.async_views import (
+    RecipeFilterSearchView,
+)
 from django_recipe_generator.recipe_generator.api.serializers import (
     IngredientSerializer,
     RecipeIngredientSerializer,
     RecipeSerializer,
+    RecipeValuesSerializer,
     UserSerializer,
 )
+from django_recipe_generator.recipe_generator.api.views import values_queryset
+from django_recipe_generator.services.ingredients import (
+    annotate_recipes, ingredient_catalogue)
 
 
 class RecipeAPITest(APITestCase):
@@ -83,6 +110,20 @@ class RecipeAPITest(APITestCase):
             [self.ingredient3.name]
         )
 
+    async def test_async_filter_search_matches_sync(self):
+        """Async filter_search returns the same payload as the sync action."""
+        url = reverse('recipe-filter-search')
+        data = {'query_ingredients': [self.ingredient1.id],
+                'exclude_ingredients': [self.ingredient2.id]}
+        expected = await sync_to_async(self.client.post)(url, data, format='json')
+
+        request = APIRequestFactory().post(url, data, format='json')
+        response = await RecipeFilterSearchView.as_view()(request)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, expected.data)
+        self.assertEqual(response.data['count'], 1)
+
     def test_list_recipes(self):
         """Test listing all available recipes via GET request."""
         url = reverse('recipe-list')
@@ -91,6 +132,521 @@ class RecipeAPITest(APITestCase):
         self.assertEqual(Recipe.objects.count(), 2)
         self.assertContains(response, self.recipe1.name)
 
+    def test_batch_retrieve(self):
+        """Batch returns the recipes in ID order, marking missing ones."""
+        url = reverse('recipe-batch')
+        ids = f'{self.recipe2.pk},999,{self.recipe1.pk},{self.recipe2.pk}'
+        response = self.client.get(url, {'ids': ids})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        results = response.data['results']
+        self.assertEqual(len(results), 3)
+        self.assertEqual(results[0], self.client.get(
+            reverse('recipe-detail', args=[self.recipe2.pk])).data)
+        self.assertEqual(results[1], {'id': 999, 'detail': 'Not found.'})
+        self.assertEqual(results[2]['name'], self.recipe1.name)
+
+        response = self.client.get(url, {'ids': ids, 'fields': 'name'})
+        self.assertEqual(response.data['results'][2],
+                         {'id': self.recipe1.pk, 'name': self.recipe1.name})
+
+    def test_batch_queries_independent_of_size(self):
+        """Recipes and their ingredients are fetched in one query each."""
+        url = reverse('recipe-batch')
+        with self.assertNumQueries(3):  # token and user, recipes, ingredients
+            self.client.get(url, {'ids': self.recipe1.pk})
+        with self.assertNumQueries(3):
+            self.client.get(url, {'ids': f'{self.recipe1.pk},{self.recipe2.pk}'})
+
+    def test_batch_invalid_ids(self):
+        """Missing, non-integer and too many IDs are rejected."""
+        url = reverse('recipe-batch')
+        for ids in ('', '1,x', ','.join(map(str, range(1, 60)))):
+            response = self.client.get(url, {'ids': ids})
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertIn('ids', response.data)
+
+
+class KeysetPaginationAPITest(APITestCase):
+    """Tests for cursor pagination of API lists and filter_search."""
+
+    @classmethod
+    def setUpTestData(cls):
+        """Set up 25 recipes, every other one with a missing ingredient."""
+        cls.mock_celery = patch(
+            "django_recipe_generator.recipe_generator.signals.generate_ai_twist.delay"
+        ).start()
+        cls.addClassCleanup(patch.stopall)
+
+        cls.user = User.objects.create_user(username='testuser',
+                                            password='testpass')
+        cls.salt = Ingredient.objects.create(name="Salt")
+        cls.pepper = Ingredient.objects.create(name="Pepper")
+        cls.recipes = []
+        for i in range(25):
+            recipe = Recipe.objects.create(name=f"recipe {i}", instructions="-",
+                                           cooking_time=10, owner=cls.user)
+            recipe.ingredients.set([cls.salt] if i % 2 else [cls.salt, cls.pepper])
+            cls.recipes.append(recipe)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_authenticate(self.user)
+
+    def test_list_cursor_links(self):
+        first = self.client.get(reverse('recipe-list'))
+        self.assertEqual(first.data['count'], 25)
+        self.assertIsNone(first.data['previous'])
+        self.assertIn('cursor=', first.data['next'])
+
+        second = self.client.get(first.data['next'])
+        results = first.data['results'] + second.data['results']
+        self.assertEqual([r['id'] for r in results], [r.pk for r in self.recipes])
+        self.assertIsNone(second.data['next'])
+
+        back = self.client.get(second.data['previous'])
+        self.assertEqual(back.data['results'], first.data['results'])
+
+    def test_filter_search_cursor_orders_by_missing(self):
+        url = reverse('recipe-filter-search')
+        data = {'query_ingredients': [self.salt.pk]}
+
+        first = self.client.post(url, data, format='json')
+        second = self.client.post(first.data['next'], data, format='json')
+
+        ids = [r['id'] for r in first.data['results'] + second.data['results']]
+        self.assertEqual(ids, [r.pk for r in self.recipes[1::2] + self.recipes[::2]])
+        self.assertEqual(second.data['count'], 25)
+
+    def test_count_mode_none(self):
+        with self.settings(SEARCH_COUNT_MODE='none'):
+            response = self.client.get(reverse('recipe-list'))
+        self.assertIsNone(response.data['count'])
+        self.assertEqual(len(response.data['results']), 20)
+
+    def test_invalid_cursor(self):
+        response = self.client.get(reverse('recipe-list'),
+                                   {'cursor': 'eyJ2IjpbInNxbCJdfQ'})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class ConditionalGetAPITest(APITestCase):
+    """Tests for ETag/Last-Modified validators and 304 responses."""
+
+    @classmethod
+    def setUpTestData(cls):
+        """Set up initial test data: user, ingredients, and a recipe."""
+        cls.mock_celery = patch(
+            "django_recipe_generator.recipe_generator.signals.generate_ai_twist.delay"
+        ).start()
+        cls.addClassCleanup(patch.stopall)
+
+        cls.user = User.objects.create_user(username='testuser',
+                                            password='testpass')
+        cls.ingredient1 = Ingredient.objects.create(name="Salt")
+        cls.ingredient2 = Ingredient.objects.create(name="Pepper")
+        cls.recipe = Recipe.objects.create(
+            name="test_pizza",
+            instructions="test instructions",
+            cooking_time=15,
+            owner=cls.user
+        )
+        cls.recipe.ingredients.set([cls.ingredient1])
+        cls.list_url = reverse('recipe-list')
+        cls.detail_url = reverse('recipe-detail', kwargs={'pk': cls.recipe.pk})
+
+    def setUp(self):
+        """Authenticate so the anonymous throttle does not kick in."""
+        cache.clear()
+        self.client.force_authenticate(self.user)
+
+    def test_detail_not_modified(self):
+        """Matching If-None-Match gets a 304 without serializing the recipe."""
+        response = self.client.get(self.detail_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('Last-Modified', response)
+
+        with self.assertNumQueries(1):
+            response = self.client.get(self.detail_url,
+                                       HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response.content, b'')
+
+    def test_detail_if_modified_since(self):
+        response = self.client.get(self.detail_url)
+        response = self.client.get(
+            self.detail_url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_detail_etag_changes_with_ingredients(self):
+        etag = self.client.get(self.detail_url)['ETag']
+
+        self.recipe.ingredients.add(self.ingredient2,
+                                    through_defaults={'quantity': '1'})
+
+        response = self.client.get(self.detail_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertContains(response, self.ingredient2.name)
+
+    def test_list_not_modified_without_loading_rows(self):
+        etag = self.client.get(self.list_url)['ETag']
+
+        with self.assertNumQueries(1):
+            response = self.client.get(self.list_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response['ETag'], etag)
+
+    def test_list_if_modified_since_after_delete(self):
+        """Lists only revalidate by ETag; a delete keeps max(updated_at)."""
+        older = Recipe.objects.create(name="soup", instructions="boil",
+                                      cooking_time=10, owner=self.user)
+        Recipe.objects.filter(pk=older.pk).update(
+            updated_at=self.recipe.updated_at - datetime.timedelta(days=1))
+        response = self.client.get(self.list_url)
+        self.assertNotIn('Last-Modified', response)
+        since = http_date(time.time() + 60)
+
+        older.delete()
+
+        response = self.client.get(self.list_url, HTTP_IF_MODIFIED_SINCE=since)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.json()['results']), 1)
+
+    def test_list_etag_changes_on_ingredient_rename_and_delete(self):
+        url = f"{self.list_url}?expand=ingredients"
+        etag = self.client.get(url)['ETag']
+
+        self.ingredient1.name = "Sea salt"
+        self.ingredient1.save()
+        renamed = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(renamed.status_code, status.HTTP_200_OK)
+        self.assertContains(renamed, "Sea salt")
+
+        Recipe.objects.filter(pk=self.recipe.pk).delete()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=renamed['ETag'])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['count'], 0)
+
+
+class SparseFieldsetAPITest(APITestCase):
+    """Tests for ?fields= / ?expand= and the slim list representation."""
+
+    @classmethod
+    def setUpTestData(cls):
+        """Set up a user and a recipe with one ingredient."""
+        cls.mock_celery = patch(
+            "django_recipe_generator.recipe_generator.signals.generate_ai_twist.delay"
+        ).start()
+        cls.addClassCleanup(patch.stopall)
+
+        cls.user = User.objects.create_user(username='testuser',
+                                            password='testpass')
+        cls.salt = Ingredient.objects.create(name="Salt")
+        cls.recipe = Recipe.objects.create(name="soup", instructions="boil",
+                                           cooking_time=10, owner=cls.user)
+        cls.recipe.ingredients.set([cls.salt])
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_authenticate(self.user)
+
+    def test_list_is_slim_by_default(self):
+        with self.assertNumQueries(3):  # aggregate, page and count
+            response = self.client.get(reverse('recipe-list'))
+        self.assertEqual(set(response.data['results'][0]),
+                         {'id', 'name', 'cooking_time', 'owner',
+                          'ai_generation_status'})
+
+    def test_list_expand_ingredients(self):
+        response = self.client.get(reverse('recipe-list'),
+                                   {'expand': 'ingredients'})
+        recipe = response.data['results'][0]
+        self.assertIn('name', recipe)
+        self.assertEqual(recipe['ingredients'][0]['ingredient']['name'], "Salt")
+
+    def test_fields_limit_output_and_columns(self):
+        url = reverse('recipe-detail', args=[self.recipe.pk])
+        with self.assertNumQueries(1):
+            response = self.client.get(url, {'fields': 'name'})
+        self.assertEqual(response.data, {'name': "soup"})
+
+        full = self.client.get(url)
+        self.assertEqual(full.data['ingredients'][0]['ingredient']['name'], "Salt")
+        self.assertEqual(full.data['instructions'], "boil")
+
+    def test_unknown_field_is_rejected(self):
+        response = self.client.get(reverse('recipe-list'),
+                                   {'fields': 'name,secret'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('secret', str(response.data['fields']))
+
+    def test_filter_search_fields(self):
+        """The ingredient analysis is always added to the selected fields."""
+        url = f"{reverse('recipe-filter-search')}?fields=id"
+        data = {'query_ingredients': [self.salt.id]}
+        response = self.client.post(url, data, format='json')
+        self.assertEqual(response.data['results'], [{
+            'id': self.recipe.pk,
+            'matching_ingredient_names': ["Salt"],
+            'missing_ingredient_names': [],
+        }])
+
+
+class ThrottleAPITest(APITestCase):
+    """Tests for the Redis sliding window throttles and their scopes."""
+
+    @classmethod
+    def setUpTestData(cls):
+        """Set up a user and a recipe."""
+        cls.mock_celery = patch(
+            "django_recipe_generator.recipe_generator.signals.generate_ai_twist.delay"
+        ).start()
+        cls.addClassCleanup(patch.stopall)
+
+        cls.user = User.objects.create_user(username='testuser',
+                                            password='testpass')
+        cls.recipe = Recipe.objects.create(name="soup", instructions="boil",
+                                           cooking_time=10, owner=cls.user)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_authenticate(self.user)
+        patch.object(throttling, 'get_redis').start()
+        patch.object(throttling, '_skip_until', 0).start()
+        self.script = patch.object(
+            throttling, 'sliding_window').start().return_value
+        self.script.return_value = [1, 0]
+        self.addCleanup(patch.stopall)
+
+    def counted_scopes(self):
+        """Scopes the requests so far were counted in, in order."""
+        return [call.kwargs['keys'][0].split('_')[1]
+                for call in self.script.call_args_list]
+
+    def test_scopes_per_endpoint(self):
+        self.client.get(reverse('recipe-detail', args=[self.recipe.pk]))
+        self.client.post(reverse('recipe-filter-search'), {}, format='json')
+        self.client.get(reverse('recipe-list'))
+        self.assertEqual(self.counted_scopes(),
+                         ['user', 'detail', 'user', 'search', 'user'])
+        user_key, previous_key = self.script.call_args.kwargs['keys']
+        self.assertTrue(user_key.startswith(f'throttle_user_{self.user.pk}:'))
+        self.assertEqual(int(user_key.rsplit(':')[1]) - 1,
+                         int(previous_key.rsplit(':')[1]))
+        # 1000/day
+        self.assertEqual(self.script.call_args.kwargs['args'][:2], [1000, 86400])
+
+    def test_batch_weighted_by_size(self):
+        self.client.get(reverse('recipe-batch'), {'ids': '1,2,3'})
+        self.assertEqual(self.counted_scopes(), ['user', 'detail'])
+        user_call, detail_call = self.script.call_args_list
+        self.assertEqual(user_call.kwargs['args'][3], 1)
+        self.assertEqual(detail_call.kwargs['args'][3], 3)
+
+    def test_anonymous_counted_by_ip(self):
+        self.client.force_authenticate(None)
+        self.client.get(reverse('recipe-list'))
+        self.assertEqual(self.counted_scopes(), ['anon', 'user'])
+        self.assertTrue(self.script.call_args_list[0].kwargs['keys'][0]
+                        .startswith('throttle_anon_127.0.0.1:'))
+
+    def test_rejected_with_retry_after(self):
+        self.script.return_value = [0, 2500]
+        response = self.client.post(reverse('recipe-filter-search'), {},
+                                    format='json')
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(response['Retry-After'], '3')
+
+    def test_redis_down_lets_requests_through(self):
+        self.script.side_effect = redis.ConnectionError("down")
+        with self.assertLogs(throttling.logger, 'WARNING'):
+            response = self.client.get(reverse('recipe-list'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        # no further attempts until the back-off is over
+        self.client.get(reverse('recipe-list'))
+        self.assertEqual(self.script.call_count, 1)
+
+    def test_redis_down_login_still_limited(self):
+        self.script.side_effect = redis.ConnectionError("down")
+        patch.object(throttling, 'fallback_cache', LocMemCache('test', {})).start()
+        patch.dict(throttling.ScopedRedisThrottle.THROTTLE_RATES,
+                   {'dj_rest_auth': '2/minute'}).start()
+        self.client.force_authenticate(None)
+        credentials = {'username': 'testuser', 'password': 'wrong'}
+        with self.assertLogs(throttling.logger, 'WARNING'):
+            responses = [self.client.post(reverse('rest_login'), credentials)
+                         for _ in range(3)]
+        self.assertEqual([r.status_code for r in responses], [
+            status.HTTP_400_BAD_REQUEST, status.HTTP_400_BAD_REQUEST,
+            status.HTTP_429_TOO_MANY_REQUESTS])
+        self.assertIn('Retry-After', responses[2])
+
+
+class BulkAPITest(APITestCase):
+    """Tests for the bulk create/update/delete endpoints."""
+
+    @classmethod
+    def setUpTestData(cls):
+        """Set up users, ingredients and a recipe."""
+        cls.user = User.objects.create_user(username='testuser',
+                                            password='testpass')
+        cls.other = User.objects.create_user(username='other', password='testpass')
+        cls.admin = User.objects.create_user(username='admin', password='testpass',
+                                             is_staff=True)
+        cls.salt, cls.pepper, cls.lime = [
+            Ingredient.objects.create(name=name, category='spice')
+            for name in ('Salt', 'Pepper', 'Lime')]
+        cls.recipe = Recipe.objects.create(name="soup", instructions="boil",
+                                           cooking_time=10, owner=cls.user)
+        RecipeIngredient.objects.create(recipe=cls.recipe, ingredient=cls.salt,
+                                        quantity='1 tsp')
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_authenticate(self.user)
+        self.twist = patch('django_recipe_generator.recipe_generator.signals.'
+                           'generate_ai_twist.delay').start()
+        self.signatures = patch('django_recipe_generator.recipe_generator.'
+                                'signals.refresh_signatures').start()
+        self.addCleanup(patch.stopall)
+
+    def recipe_data(self, n, ingredients=None):
+        ingredients = ingredients or [self.salt.pk, self.pepper.pk]
+        return {'name': f'recipe {n}', 'instructions': 'mix', 'cooking_time': n + 1,
+                'ingredients': [{'ingredient': pk, 'quantity': '1 g'}
+                                for pk in ingredients]}
+
+    def test_create_recipes(self):
+        url = reverse('recipe-bulk')
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                url, [self.recipe_data(n) for n in range(3)], format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        results = response.data['results']
+        self.assertEqual([r['name'] for r in results],
+                         ['recipe 0', 'recipe 1', 'recipe 2'])
+        created = Recipe.objects.filter(name__startswith='recipe ')
+        self.assertEqual(set(created.values_list('owner', flat=True)), {self.user.pk})
+        self.assertEqual(results[0], self.client.get(
+            reverse('recipe-detail', args=[results[0]['id']])).data)
+        self.assertEqual(sorted(c.args[0] for c in self.twist.call_args_list),
+                         [r['id'] for r in results])
+        self.signatures.apply_async.assert_called_once_with(
+            ([r['id'] for r in results],), retry=False)
+
+    def test_create_queries_independent_of_size(self):
+        url = reverse('recipe-bulk')
+        for size in (1, 10):
+            data = [self.recipe_data(n) for n in range(size)]
+            # savepoint, ingredients, recipes, links, stale signatures,
+            # response links, release
+            with self.assertNumQueries(7):
+                self.client.post(url, data, format='json')
+
+    def test_invalid_item_rejects_batch(self):
+        data = [self.recipe_data(0), self.recipe_data(1, [self.salt.pk, 999]),
+                {**self.recipe_data(2), 'name': 'ab'}]
+        response = self.client.post(reverse('recipe-bulk'), data, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data[0], {})
+        self.assertIn('999', str(response.data[1]['ingredients'][1]['ingredient']))
+        self.assertIn('name', response.data[2])
+        self.assertFalse(Recipe.objects.filter(name='recipe 0').exists())
+
+    def test_too_many_items(self):
+        with self.settings(API_BULK_MAX_ITEMS=2):
+            response = self.client.post(
+                reverse('recipe-bulk'), [self.recipe_data(n) for n in range(3)],
+                format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_update_recipes(self):
+        other = Recipe.objects.create(name="stew", instructions="simmer",
+                                      cooking_time=90, owner=self.user)
+        data = [{'id': other.pk, 'cooking_time': 80},
+                {'id': self.recipe.pk, 'name': 'lime soup',
+                 'ingredients': [{'ingredient': self.lime.pk, 'quantity': '1'}]}]
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(reverse('recipe-bulk'), data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        self.assertEqual([r['id'] for r in response.data['results']],
+                         [other.pk, self.recipe.pk])
+        other.refresh_from_db()
+        self.recipe.refresh_from_db()
+        self.assertEqual(other.cooking_time, 80)
+        self.assertEqual(self.recipe.name, 'lime soup')
+        self.assertEqual(list(self.recipe.ingredients.all()), [self.lime])
+        self.twist.assert_called_once_with(self.recipe.pk)
+
+    def test_update_missing_or_foreign_recipes(self):
+        url = reverse('recipe-bulk')
+        response = self.client.patch(
+            url, [{'id': self.recipe.pk, 'cooking_time': 5}, {'id': 999}],
+            format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data, [{}, {'id': ['Not found.']}])
+
+        self.client.force_authenticate(self.other)
+        response = self.client.patch(
+            url, [{'id': self.recipe.pk, 'cooking_time': 5}], format='json')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_delete_recipes(self):
+        url = reverse('recipe-bulk')
+        response = self.client.delete(url, {'ids': [self.recipe.pk, 999]},
+                                      format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['results'], [
+            {'id': self.recipe.pk, 'deleted': True},
+            {'id': 999, 'detail': 'Not found.'}])
+        self.assertFalse(Recipe.objects.filter(pk=self.recipe.pk).exists())
+
+        response = self.client.delete(url, {'ids': ['x']}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_anonymous_rejected(self):
+        self.client.force_authenticate(None)
+        response = self.client.post(reverse('recipe-bulk'), [self.recipe_data(0)],
+                                    format='json')
+        self.assertIn(response.status_code, (status.HTTP_401_UNAUTHORIZED,
+                                             status.HTTP_403_FORBIDDEN))
+
+    def test_ingredients(self):
+        url = reverse('ingredient-bulk')
+        response = self.client.post(url, [
+            {'name': 'Basil', 'category': 'herb'},
+            {'name': 'Basil', 'category': 'herb'},
+            {'name': 'Salt', 'category': 'spice'},
+            {'name': 'Salt', 'category': 'mineral'},
+        ], format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual([bool(errors) for errors in response.data],
+                         [False, True, True, False])
+
+        response = self.client.post(url, [{'name': 'Basil', 'category': 'herb'},
+                                          {'name': 'Thyme', 'category': 'herb'}],
+                                    format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual([i['name'] for i in response.data['results']],
+                         ['Basil', 'Thyme'])
+
+        update = [{'id': self.salt.pk, 'name': 'Sea salt'}]
+        self.assertEqual(self.client.patch(url, update, format='json').status_code,
+                         status.HTTP_403_FORBIDDEN)
+        self.client.force_authenticate(self.admin)
+        updated_at = self.recipe.updated_at
+        response = self.client.patch(url, update, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.salt.refresh_from_db()
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.salt.name, 'Sea salt')
+        self.assertGreater(self.recipe.updated_at, updated_at)
+
 
 class AuthAPITest(APITestCase):
     """Tests for authentication-related API endpoints."""
@@ -222,6 +778,50 @@ class RecipeIngredientSerializerTest(APITestCase):
         self.assertFalse(serializer.is_valid())
         self.assertIn('ingredient', serializer.errors)
 
+    def test_ingredients_resolved_at_once(self):
+        """A list of ingredients costs one query, none with the catalogue cached."""
+        cache.clear()
+        ingredients = [Ingredient.objects.create(name=f"Spice {n}", category='spice')
+                       for n in range(5)]
+        data = [{'ingredient': i.pk, 'quantity': '1 g'} for i in ingredients]
+
+        with self.assertNumQueries(1):
+            serializer = RecipeIngredientSerializer(data=data, many=True)
+            self.assertTrue(serializer.is_valid())
+        self.assertEqual([d['ingredient'] for d in serializer.validated_data],
+                         ingredients)
+
+        ingredient_catalogue()
+        with self.assertNumQueries(0):
+            serializer = RecipeIngredientSerializer(data=data, many=True)
+            self.assertTrue(serializer.is_valid())
+        self.assertEqual(serializer.validated_data[0]['ingredient'].name, 'Spice 0')
+
+    def test_missing_ingredients_reported_at_once(self):
+        """Every item referring to a missing ingredient gets its error."""
+        data = [{'ingredient': 998, 'quantity': '1'},
+                {'ingredient': self.ingredient.pk, 'quantity': '1'},
+                {'ingredient': 999, 'quantity': '1'},
+                {'ingredient': 'x', 'quantity': '1'}]
+        with self.assertNumQueries(1):
+            serializer = RecipeIngredientSerializer(data=data, many=True)
+            self.assertFalse(serializer.is_valid())
+        self.assertIn('998', str(serializer.errors[0]['ingredient']))
+        self.assertEqual(serializer.errors[1], {})
+        self.assertIn('999', str(serializer.errors[2]['ingredient']))
+        self.assertIn('ingredient', serializer.errors[3])
+
+    def test_catalogue_dropped_on_ingredient_change(self):
+        """A new ingredient is found although the catalogue was cached before."""
+        cache.clear()
+        ingredient_catalogue()
+        pepper = Ingredient.objects.create(name="Pepper", category='spice')
+        self.assertIn(pepper, ingredient_catalogue())
+
+        serializer = RecipeIngredientSerializer(
+            data=[{'ingredient': pepper.pk, 'quantity': '1'}], many=True)
+        self.assertTrue(serializer.is_valid())
+
 
 class RecipeSerializerTest(APITestCase):
     """Test suite for RecipeSerializer:create, update, validate, and context data."""
@@ -272,6 +872,7 @@ class RecipeSerializerTest(APITestCase):
             "instructions": self.recipe.instructions,
             "cooking_time": self.recipe.cooking_time,
             "elevating_twist": None,
+            "ai_generation_status": "pending",
             "owner": self.user.id
         }
         self.assertEqual(serializer.data, expected_data)
@@ -359,6 +960,148 @@ class RecipeSerializerTest(APITestCase):
         self.assertEqual(data["missing_ingredient_names"], ["Beef"])
 
 
+class RecipeValuesSerializerTest(APITestCase):
+    """RecipeValuesSerializer must produce exactly RecipeSerializer's output."""
+
+    @classmethod
+    def setUpTestData(cls):
+        """Set up recipes with shared ingredients, a twist and no ingredients."""
+        cls.mock_celery = patch(
+            "django_recipe_generator.recipe_generator.signals.generate_ai_twist.delay"
+        ).start()
+        cls.addClassCleanup(patch.stopall)
+
+        cls.user = User.objects.create_user(username='testuser',
+                                            password='testpass')
+        cls.ingredients = [Ingredient.objects.create(name=name, category="x")
+                           for name in ("Salt", "Pepper", "Rice", "Egg")]
+        for i in range(6):
+            recipe = Recipe.objects.create(
+                name=f"recipe {i}", instructions="-", cooking_time=5 + i,
+                owner=cls.user,
+                elevating_twist={'twist_ingredient': "Lime"} if i % 2 else None,
+                ai_generation_status='completed' if i % 2 else 'pending',
+            )
+            # added in reverse to differ from the ingredient id order
+            for ingredient in reversed(cls.ingredients[i % 3:]):
+                RecipeIngredient.objects.create(recipe=recipe, ingredient=ingredient,
+                                                quantity=f"{i} g")
+        Recipe.objects.create(name="empty", instructions="-", cooking_time=1,
+                              owner=cls.user)
+
+    def assertSameOutput(self, fields=None, query_ingredients=()):
+        context = {'include_ingredient_analysis': bool(query_ingredients),
+                   'query_ingredients': set(query_ingredients)}
+        recipes = list(Recipe.objects.prefetch_related(
+            'ingredients', 'recipeingredient_set__ingredient'))
+        if query_ingredients:
+            annotate_recipes(recipes, query_ingredients)
+        expected = RecipeSerializer(recipes, many=True, fields=fields,
+                                    context=context).data
+
+        rows = values_queryset(Recipe.objects.all(), fields)
+        actual = RecipeValuesSerializer(rows, many=True, fields=fields,
+                                        context=context).data
+        # compare key order too, it shows in the JSON
+        self.assertEqual([list(item.items()) for item in actual],
+                         [list(item.items()) for item in expected])
+
+    def test_full_output(self):
+        self.assertSameOutput()
+
+    def test_sparse_fields(self):
+        self.assertSameOutput(fields={'id', 'name', 'owner'})
+        self.assertSameOutput(fields={'ingredients', 'elevating_twist'})
+
+    def test_ingredient_analysis(self):
+        salt, pepper, rice, egg = self.ingredients
+        self.assertSameOutput(query_ingredients=[egg.id, salt.id])
+        self.assertSameOutput(fields={'id'}, query_ingredients=[rice.id])
+
+    def test_single_query_for_nested_ingredients(self):
+        rows = list(values_queryset(Recipe.objects.all(), None))
+        with self.assertNumQueries(1):
+            RecipeValuesSerializer(rows, many=True).data
+        with self.assertNumQueries(0):
+            RecipeValuesSerializer(rows, many=True, fields={'name'}).data
+
+
+class ORJSONTest(APITestCase):
+    """ORJSONRenderer/ORJSONParser must match the stdlib JSON classes."""
+
+    payload = {
+        'results': [{'id': 1, 'name': "Crème brûlée", 'twist': None,
+                     'flags': [True, False], 'score': 0.5}],
+        'price': Decimal('2.50'),
+        'label': gettext_lazy("Recipe"),
+        'created': datetime.datetime(2024, 5, 1, 12, 30, 15, 250,
+                                     tzinfo=datetime.timezone.utc),
+        'local': timezone.make_aware(datetime.datetime(2024, 5, 1, 12, 30),
+                                     datetime.timezone(datetime.timedelta(hours=2))),
+        'day': datetime.date(2024, 5, 1),
+        'took': datetime.timedelta(seconds=1.5),
+        'ids': (1, 2),
+        'separator': "a\u2028b\u2029c",
+        'big': 2 ** 70,
+    }
+
+    def assertSameRender(self, data, accepted_media_type=None, renderer_context=None):
+        self.assertEqual(
+            renderers.ORJSONRenderer().render(data, accepted_media_type,
+                                              renderer_context),
+            JSONRenderer().render(data, accepted_media_type, renderer_context))
+
+    def test_render_matches_stdlib(self):
+        self.assertSameRender(self.payload)
+        self.assertSameRender({k: v for k, v in self.payload.items() if k != 'big'})
+        self.assertSameRender({1: "int keys"})
+        self.assertSameRender(None)
+
+    def test_render_dates_and_times_like_stdlib(self):
+        amsterdam = zoneinfo.ZoneInfo('Europe/Amsterdam')
+        self.assertSameRender([
+            datetime.datetime(2024, 1, 5, 12, 0, 0, 123456, tzinfo=amsterdam),
+            datetime.datetime(1850, 1, 5, 12, 0, tzinfo=amsterdam),  # +00:19:32
+            datetime.datetime(2024, 1, 5, 12, 0, tzinfo=zoneinfo.ZoneInfo('UTC')),
+            datetime.datetime(2024, 1, 5, 12, 0, 0, 5),
+            datetime.time(12, 30, 15, 250),
+            datetime.date(1, 1, 1),
+        ])
+
+    def test_indented_render_matches_stdlib(self):
+        self.assertSameRender(self.payload, 'application/json; indent=4')
+        self.assertSameRender(self.payload, renderer_context={'indent': 2})
+
+    def test_render_without_orjson(self):
+        with patch.object(renderers, 'orjson', None):
+            self.assertSameRender(self.payload)
+
+    def test_parse_matches_stdlib(self):
+        body = '{"name": "Crème", "ids": [1, 2], "time": 1.5, "x": null}'.encode()
+        self.assertEqual(parsers.ORJSONParser().parse(io.BytesIO(body)),
+                         JSONParser().parse(io.BytesIO(body)))
+        with patch.object(parsers, 'orjson', None):
+            self.assertEqual(parsers.ORJSONParser().parse(io.BytesIO(body)),
+                             JSONParser().parse(io.BytesIO(body)))
+
+    def test_parse_errors(self):
+        for body in (b'{"name": ', b'{"score": NaN}'):
+            with self.assertRaises(ParseError):
+                parsers.ORJSONParser().parse(io.BytesIO(body))
+
+    @skipUnless(renderers.orjson, "orjson is not installed")
+    def test_api_uses_orjson(self):
+        user = User.objects.create_user(username='testuser', password='testpass')
+        self.client.force_authenticate(user)
+        with patch.object(renderers.orjson, 'dumps',
+                          wraps=renderers.orjson.dumps) as dumps:
+            response = self.client.post(reverse('recipe-filter-search'),
+                                        {'query_name': "soup"}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()['results'], [])
+        dumps.assert_called_once()
+
+
 class UserSerializerTest(APITestCase):
     """Test suite for UserSerializer: serialize and create users."""
 
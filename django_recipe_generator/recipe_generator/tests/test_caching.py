@@ -0,0 +1,223 @@
+"""Test module for the cache tiers and stampede protection."""
+import os
+from unittest import skipIf
+from unittest.mock import MagicMock, patch
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from django_recipe_generator.recipe_generator.models import Ingredient, Recipe
+from django_recipe_generator.services import caching, search_cache
+from django_recipe_generator.services.caching import (
+    CompressingSerializer, SharedConnectionPool, TieredRedisCache, get_or_compute)
+from django_recipe_generator.services.redis_client import get_redis
+from django_recipe_generator.test_runner import NO_REDIS_URL
+
+# nothing listens on port 1: connections are refused right away
+DOWN_URL = 'redis://127.0.0.1:1/0'
+
+
+class CacheBackendTests(SimpleTestCase):
+    """Serializer, connection pools and outages of the Redis backend."""
+
+    @override_settings(CACHE_COMPRESS_MIN_SIZE=100)
+    def test_compresses_large_values(self):
+        serializer = CompressingSerializer()
+        small, large = ['x'] * 3, 'x' * 1000
+
+        self.assertEqual(serializer.dumps(7), 7)  # incr() needs plain integers
+        self.assertFalse(serializer.dumps(small).startswith(caching.COMPRESSED))
+        compressed = serializer.dumps(large)
+        self.assertTrue(compressed.startswith(caching.COMPRESSED))
+        self.assertLess(len(compressed), 100)
+        for value in (small, large):
+            self.assertEqual(serializer.loads(serializer.dumps(value)), value)
+        self.assertEqual(serializer.loads(b'7'), 7)
+
+    @override_settings(CACHE_COMPRESS_MIN_SIZE=0)
+    def test_compression_off(self):
+        data = CompressingSerializer().dumps('x' * 10000)
+        self.assertFalse(data.startswith(caching.COMPRESSED))
+
+    def test_pool_shared_by_caches(self):
+        def cache(prefix, **options):
+            return TieredRedisCache(DOWN_URL, {
+                'KEY_PREFIX': prefix,
+                'OPTIONS': {'pool_class': SharedConnectionPool, **options}})
+
+        pool = cache('default')._cache._get_connection_pool(write=False)
+        self.assertIs(cache('search')._cache._get_connection_pool(write=True), pool)
+        self.assertIsNot(cache('llm', socket_timeout=5)._cache._get_connection_pool(
+            write=False), pool)
+
+    def test_fails_soft(self):
+        cache = TieredRedisCache(DOWN_URL, {'KEY_PREFIX': 'search'})
+        with self.assertLogs(caching.logger, 'WARNING') as logs:
+            self.assertEqual(cache.get('key', 'default'), 'default')
+            self.assertEqual(cache.get_many(['key']), {})
+            self.assertFalse(cache.add('key', 1))
+            cache.set('key', 1)
+            cache.delete('key')
+        self.assertIn("Cache 'search' unavailable", logs.output[0])
+
+    def test_clear_deletes_own_tier_only(self):
+        cache = TieredRedisCache(DOWN_URL, {'KEY_PREFIX': 'search:abc'})
+        client = MagicMock()
+        client.scan_iter.return_value = iter([b'search:abc:1:a', b'search:abc:1:b'])
+        with patch.object(cache._cache, 'get_client', return_value=client):
+            cache.clear()
+        client.scan_iter.assert_called_once_with(match='search:abc:*', count=1000)
+        client.unlink.assert_called_once_with(b'search:abc:1:a', b'search:abc:1:b')
+        client.flushdb.assert_not_called()
+
+    @skipIf(os.getenv('CACHE_BACKEND'), 'cache backend chosen explicitly')
+    def test_tests_run_on_locmem_tiers(self):
+        for alias in settings.CACHE_TIERS:
+            self.assertIsInstance(caches[alias], LocMemCache)
+
+    @skipIf(os.getenv('TEST_REDIS_URL'), 'test Redis chosen explicitly')
+    def test_tests_kept_off_live_redis(self):
+        self.assertEqual(settings.REDIS_URL, NO_REDIS_URL)
+        kwargs = get_redis().connection_pool.connection_kwargs
+        self.assertEqual((kwargs['host'], kwargs['port']), ('127.0.0.1', 1))
+
+
+class GetOrComputeTests(SimpleTestCase):
+    """Stale-while-revalidate with a lock per key."""
+
+    def setUp(self):
+        self.cache = caches['default']
+        self.cache.clear()
+        self.compute = MagicMock(return_value='new')
+
+    def store(self, value, fresh_for, generation=None, delta=0):
+        entry = (value, 1000 + fresh_for, delta, generation)
+        self.cache.set('key', entry, 70)
+
+    def get(self, **kwargs):
+        with patch.object(caching.time, 'time', return_value=1000):
+            return get_or_compute('key', self.compute, 10, 60, **kwargs)
+
+    def test_fresh_value(self):
+        self.store('old', fresh_for=5)
+        self.assertEqual(self.get(), 'old')
+        self.compute.assert_not_called()
+
+    def test_stale_value_recomputed_by_lock_holder(self):
+        self.store('old', fresh_for=-5)
+        self.assertEqual(self.get(), 'new')
+        self.assertEqual(self.get(), 'new')
+        self.compute.assert_called_once()
+        self.assertFalse(self.cache.has_key('key:lock'))
+
+    def test_stale_value_served_while_locked(self):
+        self.store('old', fresh_for=-5)
+        self.cache.add('key:lock', 1)
+        self.assertEqual(self.get(), 'old')
+        self.compute.assert_not_called()
+
+    def test_cold_miss_waits_for_lock_holder(self):
+        self.cache.add('key:lock', 1)
+
+        def other_process_done(seconds):
+            caching.recompute('key', lambda: 'theirs', 10, 60)
+
+        with patch.object(caching.time, 'sleep', side_effect=other_process_done):
+            self.assertEqual(get_or_compute('key', self.compute, 10), 'theirs')
+        self.compute.assert_not_called()
+
+    def test_cold_miss_lock_holder_gone(self):
+        self.cache.add('key:lock', 1)
+        with patch.object(caching.time, 'sleep',
+                          side_effect=lambda s: self.cache.delete('key:lock')):
+            self.assertEqual(get_or_compute('key', self.compute, 10), 'new')
+        self.compute.assert_called_once()
+
+    def test_other_generation_is_stale(self):
+        self.store('old', fresh_for=5, generation='a')
+        self.assertEqual(self.get(generation='a'), 'old')
+        self.assertEqual(self.get(generation='b'), 'new')
+        self.assertEqual(self.get(generation='b'), 'new')
+        self.compute.assert_called_once()
+
+    def test_recompute_stores_entry(self):
+        now = [1000]
+
+        def compute():
+            now[0] += 2
+            return 'new'
+
+        with patch.object(caching.time, 'time', side_effect=lambda: now[0]):
+            self.assertEqual(
+                caching.recompute('key', compute, 10, 60, generation='a'), 'new')
+            self.assertEqual(self.cache.get('key'), ('new', 1012, 2, 'a'))
+
+    def test_refreshed_early_near_expiry(self):
+        # 1 s to expiry, 2 s to compute: -log(1 - 0.9) * 2 > 1
+        self.store('old', fresh_for=1, delta=2)
+        # the lock stays taken until the refresh is done
+        refresh = MagicMock(side_effect=lambda: self.assertTrue(
+            self.cache.has_key('key:lock')))
+        with patch.object(caching.random, 'random', return_value=0.9):
+            self.assertEqual(self.get(refresh=refresh), 'old')
+            refresh.assert_called_once()
+            self.cache.delete('key:lock')
+            self.assertEqual(self.get(), 'new')  # no refresh: recomputed in place
+        self.compute.assert_called_once()
+
+    def test_not_refreshed_early_far_from_expiry(self):
+        self.store('old', fresh_for=60, delta=2)
+        refresh = MagicMock()
+        with patch.object(caching.random, 'random', return_value=0.9):
+            self.assertEqual(self.get(refresh=refresh), 'old')
+        refresh.assert_not_called()
+        self.compute.assert_not_called()
+
+
+class SearchCacheTests(TestCase):
+    """Cached search pages and their invalidation."""
+
+    @classmethod
+    def setUpTestData(cls):
+        patch(
+            "django_recipe_generator.recipe_generator.signals.generate_ai_twist.delay"
+        ).start()
+        cls.addClassCleanup(patch.stopall)
+        cls.user = User.objects.create_user(username='cook', password='pass')
+        cls.salt = Ingredient.objects.create(name="Salt")
+        cls.soup = Recipe.objects.create(name="Soup", instructions="Boil.",
+                                         cooking_time=20, owner=cls.user)
+        cls.soup.ingredients.add(cls.salt)
+
+    def setUp(self):
+        caches['search'].clear()
+        self.spec = search_cache.search_spec(query_ingredients=['%d' % self.salt.pk])
+
+    def names(self):
+        queryset = search_cache.search_queryset(self.spec)
+        page = search_cache.paginate(queryset, self.spec, '', 10)
+        return [recipe.name for recipe in page.object_list]
+
+    def test_equivalent_searches_share_a_page(self):
+        other = search_cache.search_spec(query_ingredients=[self.salt.pk] * 2)
+        self.assertEqual(search_cache.page_key(self.spec, '', 10, 'exact'),
+                         search_cache.page_key(other, '', 10, 'exact'))
+
+    def test_page_cached(self):
+        self.assertEqual(self.names(), ["Soup"])
+        with self.assertNumQueries(0):
+            search_cache.get_page(self.spec, '', 10)
+        with self.assertNumQueries(1):  # the page's rows only
+            self.assertEqual(self.names(), ["Soup"])
+
+    def test_recipe_changes_invalidate_pages(self):
+        self.assertEqual(self.names(), ["Soup"])
+        stew = Recipe.objects.create(name="Stew", instructions="Simmer.",
+                                     cooking_time=90, owner=self.user)
+        stew.ingredients.add(self.salt)
+        self.assertEqual(sorted(self.names()), ["Soup", "Stew"])
+        stew.delete()
+        self.assertEqual(self.names(), ["Soup"])
@@ -0,0 +1,99 @@
+"""Test module for the read replica router."""
+from unittest.mock import patch
+
+from django.contrib.auth.models import User
+from django.db import DatabaseError, transaction
+from django.test import RequestFactory, TransactionTestCase, override_settings
+from django.urls import resolve, reverse
+
+from django_recipe_generator import db_router
+from django_recipe_generator.db_router import ReplicaRouter
+from django_recipe_generator.recipe_generator.models import Recipe
+
+
+@override_settings(DATABASE_REPLICAS=['replica1'], REPLICA_MAX_LAG=5,
+                   REPLICA_CHECK_INTERVAL=5)
+class ReplicaRouterTests(TransactionTestCase):
+    """Reads of opted-in views go to healthy replicas, the rest to default.
+
+    Not a ``TestCase``: its transaction would keep every read on default.
+    """
+
+    def setUp(self):
+        db_router._health.clear()
+        self.addCleanup(db_router._health.clear)
+        self.router = ReplicaRouter()
+
+    def read_db(self, pinned=False, **state):
+        with db_router.routing(pinned) as routing_state:
+            routing_state.replica_reads = True
+            vars(routing_state).update(state)
+            return self.router.db_for_read(Recipe)
+
+    @patch.object(db_router, 'replication_lag', return_value=0)
+    def test_opted_in_reads_use_replica(self, lag):
+        self.assertEqual(self.read_db(), 'replica1')
+        self.assertIsNone(self.router.db_for_read(Recipe))  # outside requests
+        self.assertIsNone(self.read_db(replica_reads=False))
+
+    @patch.object(db_router, 'replication_lag', return_value=0)
+    def test_read_your_writes(self, lag):
+        self.assertIsNone(self.read_db(pinned=True))
+        with db_router.routing() as state:
+            state.replica_reads = True
+            self.assertEqual(self.router.db_for_write(Recipe), 'default')
+            self.assertTrue(state.wrote)
+            self.assertIsNone(self.router.db_for_read(Recipe))
+
+    @patch.object(db_router, 'replication_lag', return_value=0)
+    def test_transactions_stay_on_primary(self, lag):
+        with transaction.atomic():
+            self.assertIsNone(self.read_db())
+
+    def test_lagging_replica_skipped_until_next_check(self):
+        with patch.object(db_router, 'replication_lag', return_value=10) as lag, \
+                self.assertLogs(db_router.logger, 'WARNING'):
+            self.assertIsNone(self.read_db())
+            self.assertIsNone(self.read_db())
+        lag.assert_called_once_with('replica1')
+
+    def test_unavailable_replica_skipped(self):
+        with patch.object(db_router, 'replication_lag',
+                          side_effect=DatabaseError('down')), \
+                self.assertLogs(db_router.logger, 'WARNING') as logs:
+            self.assertIsNone(self.read_db())
+        self.assertIn("Replica 'replica1' unavailable", logs.output[0])
+
+    def test_views_opting_in(self):
+        factory = RequestFactory()
+        recipe_urls = [
+            reverse('recipe_list'),
+            reverse('recipe_detail', kwargs={'pk': 1}),
+            reverse('recipe-list'),
+            reverse('recipe-detail', kwargs={'pk': 1}),
+        ]
+        for url in recipe_urls:
+            view = resolve(url).func
+            self.assertTrue(db_router.reads_from_replica(factory.get(url), view))
+            self.assertFalse(db_router.reads_from_replica(factory.post(url), view))
+        search_url = reverse('recipe-filter-search')
+        self.assertTrue(db_router.reads_from_replica(
+            factory.post(search_url), resolve(search_url).func))
+        add_url = reverse('add_recipe')
+        self.assertFalse(db_router.reads_from_replica(
+            factory.get(add_url), resolve(add_url).func))
+
+    @patch.object(db_router, 'is_healthy', return_value=False)
+    def test_writes_pin_client_to_primary(self, is_healthy):
+        user = User.objects.create_user(username='cook', password='pass')
+        self.client.force_login(user)
+
+        response = self.client.get(reverse('recipe_list'))
+        self.assertNotIn(db_router.PIN_COOKIE, response.cookies)
+
+        response = self.client.post(reverse('add_ingredient'),
+                                    {'name': 'Salt', 'category': 'spice'})
+        self.assertEqual(response.status_code, 302)
+        cookie = response.cookies[db_router.PIN_COOKIE]
+        self.assertEqual(cookie['max-age'], 15)
+        self.assertTrue(cookie['httponly'])
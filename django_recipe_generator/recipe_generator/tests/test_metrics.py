@@ -0,0 +1,283 @@
+"""Test module for the Prometheus metrics."""
+import os
+import subprocess
+import sys
+import tempfile
+from unittest.mock import patch
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import DatabaseError
+from django.test import Client, SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from google.genai.errors import ServerError
+from rest_framework.test import APITestCase
+
+from django_recipe_generator import metrics
+from django_recipe_generator.recipe_generator.models import Ingredient, Recipe
+from django_recipe_generator.recipe_generator.tasks import generate_ai_twist
+from django_recipe_generator.services import db_pools, gemini_client
+
+# a second process, as a Celery worker would, writing to the shared directory
+CHILD_PROCESS = (
+    "from django_recipe_generator import metrics; "
+    "metrics.TWIST_STATUS.labels('completed').inc(7)"
+)
+
+
+TOKEN = 's3cret'
+
+
+def count(metric, **labels):
+    """Observations of a histogram or value of a counter in this process."""
+    for sample in metric.collect()[0].samples:
+        if sample.name.endswith(('_count', '_total')) and sample.labels == labels:
+            return sample.value
+    return 0
+
+
+@patch('django_recipe_generator.services.redis_client.get_redis')
+@override_settings(METRICS_TOKEN=TOKEN)
+class MetricsViewTests(SimpleTestCase):
+    """The /metrics exposition endpoint."""
+
+    def setUp(self):
+        self.client = Client(headers={'Authorization': f'Bearer {TOKEN}'})
+
+    def test_exposition(self, get_redis):
+        get_redis.return_value.llen.return_value = 3
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        self.assertIn(b'recipe_generator_celery_queue_length{queue="celery"} 3.0',
+                      response.content)
+        self.assertIn(b'# TYPE recipe_generator_search_duration_seconds histogram',
+                      response.content)
+
+    def test_broker_down(self, get_redis):
+        get_redis.return_value.llen.side_effect = ConnectionError
+        with self.assertLogs('django_recipe_generator.metrics', 'WARNING'):
+            response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn(b'queue_length{', response.content)
+
+    def test_token_required(self, get_redis):
+        self.assertEqual(Client().get(reverse('metrics')).status_code, 403)
+        response = Client().get(reverse('metrics'),
+                                headers={'Authorization': 'Bearer wrong'})
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 200)
+
+    @override_settings(METRICS_TOKEN='')
+    def test_no_token_denied_outside_debug(self, get_redis):
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+        with self.settings(DEBUG=True):
+            self.assertEqual(Client().get(reverse('metrics')).status_code, 200)
+
+    def test_merges_processes(self, get_redis):
+        get_redis.return_value.llen.return_value = 0
+        with tempfile.TemporaryDirectory() as directory:
+            subprocess.run([sys.executable, '-c', CHILD_PROCESS], check=True,
+                           env={**os.environ, 'PROMETHEUS_MULTIPROC_DIR': directory})
+            with patch.dict(os.environ, {'PROMETHEUS_MULTIPROC_DIR': directory}):
+                response = self.client.get(reverse('metrics'))
+        self.assertIn(b'recipe_generator_twist_status_total{status="completed"} 7.0',
+                      response.content)
+        self.assertIn(b'recipe_generator_celery_queue_length{queue="celery"} 0.0',
+                      response.content)
+
+
+class CeleryExporterTests(SimpleTestCase):
+    """The Celery worker's own metrics endpoint and pool process cleanup."""
+
+    @patch.object(metrics, 'start_http_server')
+    def test_exporter_started_on_port(self, start_http_server):
+        with tempfile.TemporaryDirectory() as directory, \
+                patch.dict(os.environ, {'PROMETHEUS_MULTIPROC_DIR': directory,
+                                        'CELERY_METRICS_PORT': '9808'}):
+            metrics.start_worker_exporter()
+        port, = start_http_server.call_args.args
+        self.assertEqual(port, 9808)
+        self.assertIsNot(start_http_server.call_args.kwargs['registry'],
+                         metrics.REGISTRY)
+
+    @patch.object(metrics, 'start_http_server')
+    def test_no_exporter_without_port(self, start_http_server):
+        with patch.dict(os.environ):
+            os.environ.pop('CELERY_METRICS_PORT', None)
+            metrics.start_worker_exporter()
+        start_http_server.assert_not_called()
+
+    def test_exited_pool_process_marked_dead(self):
+        with tempfile.TemporaryDirectory() as directory, \
+                patch.dict(os.environ, {'PROMETHEUS_MULTIPROC_DIR': directory}):
+            live = os.path.join(directory, 'gauge_livesum_4242.db')
+            total = os.path.join(directory, 'counter_4242.db')
+            for path in (live, total):
+                open(path, 'wb').close()
+            metrics.mark_worker_process_dead(pid=4242, exitcode=0)
+            self.assertFalse(os.path.exists(live))
+            self.assertTrue(os.path.exists(total))
+
+
+def value(metric, **labels):
+    """Return the value of a gauge in this process."""
+    for sample in metric.collect()[0].samples:
+        if sample.labels == labels:
+            return sample.value
+    return 0
+
+
+@override_settings(METRICS_TOKEN=TOKEN)
+class DbHealthViewTests(TestCase):
+    """The /health/db endpoint and the connection pool metrics."""
+
+    def setUp(self):
+        self.client = Client(headers={'Authorization': f'Bearer {TOKEN}'})
+
+    def test_healthy(self):
+        response = self.client.get(reverse('db_health'))
+        self.assertEqual(response.status_code, 200)
+        default = response.json()['databases']['default']
+        self.assertTrue(default['ok'])
+        self.assertIn('latency_ms', default)
+        self.assertNotIn('pool', default)  # SQLite: no pool
+
+    def test_primary_down(self):
+        with patch.object(db_pools, 'check',
+                          return_value={'ok': False}):
+            response = self.client.get(reverse('db_health'))
+        self.assertEqual(response.status_code, 503)
+
+    def test_error_not_exposed(self):
+        error = DatabaseError('connection to server at "db" failed: password '
+                              'authentication failed for user "recipes"')
+        with patch('django.db.backends.base.base.BaseDatabaseWrapper.cursor',
+                   side_effect=error), \
+                self.assertLogs(db_pools.logger, 'WARNING') as logs:
+            response = self.client.get(reverse('db_health'))
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.json()['databases']['default'], {'ok': False})
+        self.assertIn('password authentication failed', logs.output[0])
+
+    def test_token_required(self):
+        self.assertEqual(Client().get(reverse('db_health')).status_code, 403)
+
+    @override_settings(METRICS_TOKEN='')
+    def test_no_token_denied_outside_debug(self):
+        self.assertEqual(self.client.get(reverse('db_health')).status_code, 403)
+
+    def test_pool_metrics(self):
+        stats = {'pool_min': 1, 'pool_max': 4, 'pool_size': 3, 'pool_available': 1,
+                 'requests_waiting': 2, 'requests_num': 10, 'requests_queued': 4,
+                 'requests_errors': 1, 'requests_wait_ms': 1500,
+                 'connections_lost': 1}
+        before = {result: count(metrics.DB_POOL_REQUESTS, database='default',
+                                result=result)
+                  for result in ('served', 'queued', 'failed')}
+        waited = count(metrics.DB_POOL_WAIT, database='default')
+
+        with patch.object(db_pools, 'pool_stats',
+                          return_value={'default': stats}) as pool_stats:
+            self.client.get(reverse('db_health'))  # request_finished
+        pool_stats.assert_any_call(pop=True)
+
+        self.assertEqual(value(metrics.DB_POOL_CONNECTIONS, database='default',
+                               state='open'), 3)
+        self.assertEqual(value(metrics.DB_POOL_CONNECTIONS, database='default',
+                               state='idle'), 1)
+        self.assertEqual(value(metrics.DB_POOL_WAITING, database='default'), 2)
+        self.assertEqual(
+            {result: count(metrics.DB_POOL_REQUESTS, database='default',
+                           result=result) - n for result, n in before.items()},
+            {'served': 6, 'queued': 3, 'failed': 1})
+        self.assertEqual(count(metrics.DB_POOL_WAIT, database='default'),
+                         waited + 1.5)
+
+
+class InstrumentationTests(APITestCase):
+    """Metrics recorded around searches, rendering, Gemini and caches."""
+
+    @classmethod
+    def setUpTestData(cls):
+        """Set up a recipe with an ingredient."""
+        cls.mock_celery = patch(
+            "django_recipe_generator.recipe_generator.signals.generate_ai_twist.delay"
+        ).start()
+        cls.addClassCleanup(patch.stopall)
+
+        cls.user = User.objects.create_user(username='testuser', password='testpass')
+        cls.ingredient = Ingredient.objects.create(name="tomato")
+        cls.recipe = Recipe.objects.create(name="soup", instructions="Boil.",
+                                           cooking_time=10, owner=cls.user)
+        cls.recipe.ingredients.add(cls.ingredient)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def test_api_search(self):
+        request_labels = {'view': 'recipe-filter-search', 'method': 'POST',
+                          'status': '200'}
+        before = [count(metrics.SEARCH_DURATION, view='filter_search'),
+                  count(metrics.RENDER_DURATION, view='recipe-filter-search'),
+                  count(metrics.REQUEST_DURATION, **request_labels)]
+
+        self.client.post(reverse('recipe-filter-search'),
+                         {'query_ingredients': [self.ingredient.id]}, format='json')
+
+        self.assertEqual([count(metrics.SEARCH_DURATION, view='filter_search'),
+                          count(metrics.RENDER_DURATION, view='recipe-filter-search'),
+                          count(metrics.REQUEST_DURATION, **request_labels)],
+                         [n + 1 for n in before])
+
+    def test_html_search(self):
+        searches = count(metrics.SEARCH_DURATION, view='recipe_list')
+        annotations = count(metrics.ANNOTATE_DURATION)
+
+        self.client.get(reverse('recipe_list'),
+                        {'query_ingredients': self.ingredient.id})
+
+        self.assertEqual(count(metrics.SEARCH_DURATION, view='recipe_list'),
+                         searches + 1)
+        self.assertEqual(count(metrics.ANNOTATE_DURATION), annotations + 1)
+
+    def test_fragment_cache_lookups(self):
+        hits = count(metrics.CACHE_REQUESTS, cache='recipe_fragment', result='hit')
+        misses = count(metrics.CACHE_REQUESTS, cache='recipe_fragment', result='miss')
+
+        url = reverse('recipe_detail', kwargs={'pk': self.recipe.pk})
+        self.client.get(url)
+        self.client.get(url)
+
+        self.assertEqual(
+            count(metrics.CACHE_REQUESTS, cache='recipe_fragment', result='miss'),
+            misses + 1)
+        self.assertEqual(
+            count(metrics.CACHE_REQUESTS, cache='recipe_fragment', result='hit'),
+            hits + 1)
+
+    @patch("django_recipe_generator.recipe_generator.tasks.publish_status")
+    @patch("django_recipe_generator.recipe_generator.tasks.gemini_breaker")
+    @patch.object(gemini_client, 'get_client')
+    def test_twist_task(self, get_client, breaker, publish_status):
+        generate = get_client.return_value.models.generate_content
+        generate.return_value.parsed = {"twist_ingredient": "basil"}
+        # fails once, then succeeds on the retry
+        generate.side_effect = [
+            ServerError(503, {"error": {"message": "overloaded"}}),
+            generate.return_value,
+        ]
+        before = {status: count(metrics.TWIST_STATUS, status=status)
+                  for status in ('generating', 'pending', 'completed')}
+        errors = count(metrics.GEMINI_ERRORS, error='ServerError')
+        calls = count(metrics.GEMINI_DURATION)
+
+        generate_ai_twist.apply(args=(self.recipe.id,))
+
+        self.assertEqual(count(metrics.GEMINI_ERRORS, error='ServerError'), errors + 1)
+        self.assertEqual(count(metrics.GEMINI_DURATION), calls + 2)
+        after = {status: count(metrics.TWIST_STATUS, status=status)
+                 for status in before}
+        self.assertEqual({status: after[status] - before[status] for status in after},
+                         {'generating': 2, 'pending': 1, 'completed': 1})
@@ -0,0 +1,228 @@
+"""Test module for project-wide middleware."""
+import gzip
+import json
+from unittest import skipUnless
+from unittest.mock import patch
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.db import connection
+from django.urls import reverse
+from django.contrib.auth.models import User
+
+from django_recipe_generator import middleware
+from django_recipe_generator.middleware import (
+    CompressionMiddleware,
+    QueryProfile,
+    QueryProfilingMiddleware,
+    brotli,
+    negotiate_encoding,
+)
+from django_recipe_generator.recipe_generator.models import Recipe
+
+BODY = b'{"results": [%s{}]}' % (b'{"name": "tomato soup", "cooking_time": 20},' * 100)
+
+
+class NegotiateEncodingTests(SimpleTestCase):
+    """Accept-Encoding negotiation."""
+
+    @skipUnless(brotli, "brotli is not installed")
+    def test_prefers_brotli_on_tie(self):
+        self.assertEqual(negotiate_encoding('gzip, deflate, br'), 'br')
+        self.assertEqual(negotiate_encoding('*'), 'br')
+
+    @skipUnless(brotli, "brotli is not installed")
+    def test_follows_q_values(self):
+        self.assertEqual(negotiate_encoding('br;q=0.5, gzip'), 'gzip')
+        self.assertEqual(negotiate_encoding('gzip;q=0, br;q=0'), None)
+        self.assertEqual(negotiate_encoding('*;q=0, gzip;q=0.1'), 'gzip')
+        self.assertEqual(negotiate_encoding('identity'), None)
+        self.assertEqual(negotiate_encoding(''), None)
+
+    def test_gzip_without_brotli_package(self):
+        with patch.object(middleware, 'brotli', None):
+            self.assertEqual(negotiate_encoding('br, gzip'), 'gzip')
+            self.assertEqual(negotiate_encoding('br'), None)
+
+
+@override_settings(COMPRESSION_MIN_SIZE=200)
+class CompressionMiddlewareTests(SimpleTestCase):
+    """Compression of single responses by CompressionMiddleware."""
+
+    def setUp(self):
+        cache.clear()
+
+    def process(self, response, accept_encoding='gzip, br'):
+        request = RequestFactory().get('/',
+                                       headers={'Accept-Encoding': accept_encoding})
+        return CompressionMiddleware(lambda request: response)(request)
+
+    def json_response(self, body=BODY, **headers):
+        return HttpResponse(body, content_type='application/json', headers=headers)
+
+    @skipUnless(brotli, "brotli is not installed")
+    def test_brotli(self):
+        response = self.process(self.json_response(ETag='"v1"'))
+        self.assertEqual(response['Content-Encoding'], 'br')
+        self.assertEqual(brotli.decompress(response.content), BODY)
+        self.assertEqual(response['Content-Length'], str(len(response.content)))
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+        self.assertEqual(response['ETag'], 'W/"v1"')
+        self.assertRegex(response['Server-Timing'],
+                         r'^compress;dur=[0-9.]+;desc="br [0-9.]+x"$')
+
+    def test_gzip(self):
+        response = self.process(self.json_response(), 'gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(response.content), BODY)
+
+    def test_skipped_responses(self):
+        small = self.process(self.json_response(b'{"name": "soup"}'))
+        self.assertFalse(small.has_header('Content-Encoding'))
+        self.assertEqual(small['Vary'], 'Accept-Encoding')
+
+        image = self.process(HttpResponse(BODY, content_type='image/png'))
+        self.assertFalse(image.has_header('Content-Encoding'))
+
+        events = self.process(StreamingHttpResponse(iter([BODY]),
+                                                    content_type='text/event-stream'))
+        self.assertFalse(events.has_header('Content-Encoding'))
+        self.assertEqual(b''.join(events.streaming_content), BODY)
+
+        unaccepted = self.process(self.json_response(), 'identity')
+        self.assertFalse(unaccepted.has_header('Content-Encoding'))
+
+    @skipUnless(brotli, "brotli is not installed")
+    def test_shared_response_compressed_once(self):
+        with patch.object(brotli, 'compress',
+                          wraps=brotli.compress) as compress:
+            first = self.process(self.json_response(ETag='"v1"'))
+            second = self.process(self.json_response(ETag='"v1"'))
+        compress.assert_called_once()
+        self.assertEqual(second.content, first.content)
+        self.assertIn(' cached"', second['Server-Timing'])
+
+    @skipUnless(brotli, "brotli is not installed")
+    def test_private_response_not_cached(self):
+        with patch.object(brotli, 'compress',
+                          wraps=brotli.compress) as compress:
+            for _ in range(2):
+                self.process(self.json_response(ETag='"v1"', Vary='Cookie'))
+            for _ in range(2):
+                self.process(self.json_response(ETag='"v1"',
+                                                **{'Cache-Control': 'private'}))
+            for _ in range(2):
+                self.process(self.json_response())
+        self.assertEqual(compress.call_count, 6)
+
+
+@override_settings(COMPRESSION_MIN_SIZE=200)
+class CompressedAPITests(TestCase):
+    """Compression through the whole middleware stack."""
+
+    @classmethod
+    def setUpTestData(cls):
+        """Set up enough recipes for a list worth compressing."""
+        cls.mock_celery = patch(
+            "django_recipe_generator.recipe_generator.signals.generate_ai_twist.delay"
+        ).start()
+        cls.addClassCleanup(patch.stopall)
+
+        cls.user = User.objects.create_user(username='testuser', password='testpass')
+        for i in range(20):
+            Recipe.objects.create(name=f"recipe {i}", instructions="Boil. " * 20,
+                                  cooking_time=10, owner=cls.user)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def test_compressed_list_revalidates(self):
+        url = reverse('recipe-list') + '?fields=name,instructions'
+        plain = self.client.get(url)
+        response = self.client.get(url, headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(response.content), plain.content)
+
+        # the weak ETag of the compressed response still validates
+        self.assertTrue(response['ETag'].startswith('W/'))
+        not_modified = self.client.get(url, headers={
+            'Accept-Encoding': 'gzip', 'If-None-Match': response['ETag']})
+        self.assertEqual(not_modified.status_code, 304)
+
+
+@override_settings(QUERY_PROFILE_SAMPLE_RATE=1.0, QUERY_PROFILE_TOP_QUERIES=2)
+class QueryProfilingMiddlewareTests(TestCase):
+    """Sampled SQL profiling of requests."""
+
+    @classmethod
+    def setUpTestData(cls):
+        """Set up a user and a recipe."""
+        cls.mock_celery = patch(
+            "django_recipe_generator.recipe_generator.signals.generate_ai_twist.delay"
+        ).start()
+        cls.addClassCleanup(patch.stopall)
+
+        cls.user = User.objects.create_user(username='testuser', password='testpass')
+        Recipe.objects.create(name="soup", instructions="-", cooking_time=10,
+                              owner=cls.user)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def profile_of(self, logs):
+        return json.loads(logs.records[-1].getMessage())
+
+    def test_profiled_request(self):
+        with self.assertLogs('django_recipe_generator.middleware', 'INFO') as logs, \
+                CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('recipe-list'))
+
+        profile = self.profile_of(logs)
+        self.assertEqual(logs.records[-1].levelname, 'INFO')
+        self.assertEqual(profile['queries'], len(queries))
+        self.assertEqual(profile['status'], 200)
+        self.assertEqual(profile['path'], reverse('recipe-list'))
+        self.assertEqual(len(profile['slowest']), 2)
+        self.assertEqual(profile['flags'], [])
+        self.assertRegex(response['Server-Timing'],
+                         rf'db;dur=[0-9.]+;desc="{len(queries)} queries"')
+
+    @override_settings(QUERY_PROFILE_MAX_QUERIES=1, QUERY_PROFILE_SLOW_QUERY_MS=0,
+                       QUERY_PROFILE_SLOW_DB_MS=0)
+    def test_thresholds_flag_request(self):
+        with self.assertLogs('django_recipe_generator.middleware', 'INFO') as logs:
+            self.client.get(reverse('recipe-list'))
+        self.assertEqual(logs.records[-1].levelname, 'WARNING')
+        self.assertEqual(self.profile_of(logs)['flags'],
+                         ['slow_query', 'slow_db', 'too_many_queries'])
+
+    @override_settings(QUERY_PROFILE_SAMPLE_RATE=0)
+    def test_unsampled_request(self):
+        response = self.client.get(reverse('recipe-list'))
+        self.assertNotIn('db;', response.get('Server-Timing', ''))
+
+    async def test_async_view_queries_recorded(self):
+        async def view(request):
+            await sync_to_async(list)(Recipe.objects.all())
+            await Recipe.objects.acount()
+            return HttpResponse()
+
+        request = RequestFactory().get('/')
+        with self.assertLogs('django_recipe_generator.middleware', 'INFO') as logs:
+            response = await QueryProfilingMiddleware(view)(request)
+        self.assertEqual(self.profile_of(logs)['queries'], 2)
+        self.assertIn('desc="2 queries"', response['Server-Timing'])
+
+    def test_profile_keeps_slowest(self):
+        profile = QueryProfile()
+        for sql, duration in [('a', 0.3), ('b', 0.1), ('c', 0.5), ('d', 0.2)]:
+            profile.record(sql, duration)
+        self.assertEqual(profile.count, 4)
+        self.assertAlmostEqual(profile.duration, 1.1)
+        self.assertEqual(sorted(profile.slowest, reverse=True),
+                         [(0.5, 'c'), (0.3, 'a')])
@@ -1,14 +1,31 @@
 """Test module for models."""
+import random
+from importlib import import_module
+
+from django.apps import apps
 from django.core.exceptions import ValidationError
-from django.test import TestCase
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
 from django.contrib.auth.models import User
-from unittest.mock import patch
-
-from django_recipe_generator.recipe_generator.tasks import generate_ai_twist
+from io import StringIO
+from unittest import skipUnless
+from unittest.mock import ANY, MagicMock, call, patch
+
+import redis
+from google.genai.errors import ClientError, ServerError
+
+from django_recipe_generator.services import keyset
+from django_recipe_generator.services.circuit_breaker import (
+    CircuitBreaker, CircuitOpenError)
+from django_recipe_generator.recipe_generator.tasks import (
+    generate_ai_twist, refresh_signatures)
 from django_recipe_generator.recipe_generator.models import (
     Ingredient,
     Macro,
     Recipe,
+    RecipeIngredient,
+    RecipeSignature,
 )
 
 
@@ -113,6 +130,224 @@ class RecipeModelTests(TestCase):
         self.assertEqual(results.count(), 0)
 
 
+class RecipeSignatureTests(TestCase):
+    """Ingredient signatures kept in step with the recipes' ingredients."""
+
+    @classmethod
+    def setUpTestData(cls):
+        """Set up a recipe and the ingredients it gets in the tests."""
+        patch(
+            "django_recipe_generator.recipe_generator.signals.generate_ai_twist.delay"
+        ).start()
+        cls.addClassCleanup(patch.stopall)
+        cls.user = User.objects.create_user(username='cook', password='pass')
+        cls.salt, cls.pepper, cls.leek = [
+            Ingredient.objects.create(name=name) for name in ("Salt", "Pepper", "Leek")]
+        cls.recipe = Recipe.objects.create(name="Soup", instructions="Boil.",
+                                           cooking_time=20, owner=cls.user)
+
+    def setUp(self):
+        # run the queued task right away
+        patcher = patch(
+            "django_recipe_generator.recipe_generator.signals."
+            "refresh_signatures.apply_async",
+            side_effect=lambda args, **kwargs: refresh_signatures(*args))
+        self.apply_async = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def signature(self):
+        signature = RecipeSignature.objects.filter(recipe=self.recipe).first()
+        return signature and (signature.ingredient_count, signature.ingredient_ids)
+
+    def test_refreshed_on_ingredient_list_changes(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.recipe.ingredients.add(self.pepper, self.salt,
+                                        through_defaults={'quantity': '1'})
+        self.assertEqual(self.signature(), (2, sorted([self.salt.pk, self.pepper.pk])))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.recipe.ingredients.remove(self.pepper)
+        self.assertEqual(self.signature(), (1, [self.salt.pk]))
+        self.apply_async.assert_called_with(([self.recipe.pk],), retry=False)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.recipe.ingredients.clear()
+        self.assertIsNone(self.signature())
+
+    def test_refreshed_on_single_links_and_ingredient_deletion(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            RecipeIngredient.objects.create(recipe=self.recipe, ingredient=self.salt,
+                                            quantity='1')
+            link = RecipeIngredient.objects.create(recipe=self.recipe,
+                                                   ingredient=self.leek, quantity='2')
+        self.assertEqual(self.signature(), (2, sorted([self.salt.pk, self.leek.pk])))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            link.delete()
+        self.assertEqual(self.signature(), (1, [self.salt.pk]))
+
+        self.apply_async.reset_mock()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.salt.delete()
+        # once for the ingredient, not once per link
+        self.apply_async.assert_called_once_with(([self.recipe.pk],), retry=False)
+        self.assertIsNone(self.signature())
+
+    def test_stale_until_refreshed(self):
+        """Ingredient changes flag the signature until the task has run."""
+        self.apply_async.side_effect = ConnectionError("broker down")
+        with self.assertLogs('django_recipe_generator.recipe_generator.signals',
+                             'WARNING'), \
+                self.captureOnCommitCallbacks(execute=True):
+            self.recipe.ingredients.add(self.salt, through_defaults={'quantity': '1'})
+        self.assertTrue(RecipeSignature.objects.get(recipe=self.recipe).stale)
+
+        call_command('rebuild_signatures', stdout=StringIO())
+        signature = RecipeSignature.objects.get(recipe=self.recipe)
+        self.assertEqual((signature.stale, signature.ingredient_ids),
+                         (False, [self.salt.pk]))
+
+    def test_rebuild_command(self):
+        RecipeIngredient.objects.bulk_create([
+            RecipeIngredient(recipe=self.recipe, ingredient=ingredient, quantity='1')
+            for ingredient in (self.leek, self.salt, self.leek)])
+        self.assertIsNone(self.signature())  # bulk_create sends no signals
+
+        call_command('rebuild_signatures', stdout=StringIO())
+        self.assertEqual(self.signature(), (2, sorted([self.salt.pk, self.leek.pk])))
+
+    def test_search_results_unchanged(self):
+        self.recipe.ingredients.add(self.salt, self.leek,
+                                    through_defaults={'quantity': '1'})
+        RecipeSignature.objects.refresh()
+        results = Recipe.objects.search(query_ingredients=[self.salt.pk])
+        self.assertEqual([(recipe.pk, recipe.missing) for recipe in results],
+                         [(self.recipe.pk, 1)])
+
+
+@skipUnless(connection.vendor == 'postgresql', 'signature searches need PostgreSQL')
+class SignatureSearchPostgresTests(TestCase):
+    """Signature (int array overlap) searches match the JOIN-based ones."""
+
+    @classmethod
+    def setUpTestData(cls):
+        """Set up recipes with random ingredients, cooking times and signatures."""
+        rng = random.Random(0)
+        user = User.objects.create_user(username='cook', password='pass')
+        cls.ingredients = Ingredient.objects.bulk_create([
+            Ingredient(name=f"Ingredient {number}") for number in range(30)])
+        recipes = Recipe.objects.bulk_create([
+            Recipe(name=f"Recipe {number}", instructions="Cook.",
+                   cooking_time=rng.choice([10, 20, 30, 45, 60]), owner=user)
+            for number in range(120)])
+        RecipeIngredient.objects.bulk_create([
+            RecipeIngredient(recipe=recipe, ingredient=ingredient, quantity='1')
+            for recipe in recipes
+            for ingredient in rng.sample(cls.ingredients, rng.randint(1, 8))])
+        RecipeSignature.objects.refresh()
+        cls.ids = [ingredient.pk for ingredient in cls.ingredients]
+
+    def search(self, signatures, query_ingredients, time_filter=None,
+               exclude_ingredients=None):
+        with override_settings(SEARCH_USE_SIGNATURES=signatures):
+            queryset = Recipe.objects.search(
+                query_ingredients=query_ingredients
+            ).filter_recipes(time_filter=time_filter,
+                             exclude_ingredients=exclude_ingredients)
+            self.assertEqual(queryset.uses_signatures(), signatures)
+            return list(queryset.values_list('id', 'total', 'matching', 'missing'))
+
+    def test_same_results(self):
+        rng = random.Random(1)
+        searches = [
+            {'query_ingredients': self.ids[:1]},
+            {'query_ingredients': self.ids[:5] + self.ids[:2]},  # duplicates
+            {'query_ingredients': rng.sample(self.ids, 8), 'time_filter': 'quick'},
+            {'query_ingredients': rng.sample(self.ids, 8), 'time_filter': 'standard'},
+            {'query_ingredients': rng.sample(self.ids, 8), 'time_filter': 'long'},
+            {'query_ingredients': rng.sample(self.ids, 6),
+             'exclude_ingredients': rng.sample(self.ids, 3)},
+            {'query_ingredients': rng.sample(self.ids, 10), 'time_filter': 'quick',
+             'exclude_ingredients': rng.sample(self.ids, 2)},
+            {'query_ingredients': [0]},  # matches nothing
+        ]
+        for search in searches:
+            with self.subTest(**search):
+                self.assertCountEqual(self.search(True, **search),
+                                      self.search(False, **search))
+
+    def test_same_keyset_pages(self):
+        query_ingredients = self.ids[::3]
+
+        def pages(signatures):
+            with override_settings(SEARCH_USE_SIGNATURES=signatures):
+                queryset = Recipe.objects.search(
+                    query_ingredients=query_ingredients
+                ).filter_recipes(exclude_ingredients=self.ids[1:2])
+                keys = keyset.keyset_keys(queryset)
+                rows, cursor = [], None
+                while True:
+                    page = keyset.paginate(queryset.values(*keys), cursor, 7)
+                    rows.extend((row['missing'], row['id']) for row in page)
+                    cursor = page.next_cursor
+                    if cursor is None:
+                        return rows
+
+        rows = pages(True)
+        self.assertEqual(rows, pages(False))
+        self.assertEqual(rows, sorted(rows))
+        self.assertEqual(len(rows), len(set(rows)))
+
+    def test_stale_signatures_searched_on_ingredients(self):
+        """Recipes changed while the refresh task is queued are still found."""
+        user = User.objects.get(username='cook')
+        with patch("django_recipe_generator.recipe_generator.signals."
+                   "generate_ai_twist.delay"):
+            # the refresh task has not run (worker down), nothing commits here
+            for recipe in Recipe.objects.order_by('pk')[:10]:
+                recipe.ingredients.set(self.ingredients[:3],
+                                       through_defaults={'quantity': '1'})
+            Recipe.objects.create(name="New", instructions="Cook.", cooking_time=10,
+                                  owner=user).ingredients.add(
+                self.ingredients[0], through_defaults={'quantity': '1'})
+        self.assertEqual(RecipeSignature.objects.filter(stale=True).count(), 11)
+
+        for search in ({'query_ingredients': self.ids[:1]},
+                       {'query_ingredients': self.ids[:4], 'time_filter': 'quick'},
+                       {'query_ingredients': self.ids[2:9],
+                        'exclude_ingredients': self.ids[9:10]}):
+            with self.subTest(**search):
+                self.assertCountEqual(self.search(True, **search),
+                                      self.search(False, **search))
+
+    def test_overlap_uses_gin_index(self):
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(
+                cursor, RecipeSignature._meta.db_table)
+        index = constraints['recipe_signature_ingredient_ids_gin']
+        self.assertEqual(index['type'], 'gin')
+        self.assertEqual(index['columns'], ['ingredient_ids'])
+
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+            queryset = Recipe.objects.search(query_ingredients=self.ids[:3])
+            plan = queryset.explain()
+        self.assertIn('recipe_signature_ingredient_ids_gin', plan)
+
+    def test_migration_backfill(self):
+        expected = list(RecipeSignature.objects.order_by('recipe_id').values_list(
+            'recipe_id', 'ingredient_count', 'ingredient_ids'))
+        RecipeSignature.objects.all().delete()
+
+        migration = import_module('django_recipe_generator.recipe_generator.'
+                                  'migrations.0006_recipesignature')
+        migration.build_signatures(apps, None)
+
+        self.assertEqual(list(RecipeSignature.objects.order_by(
+            'recipe_id').values_list('recipe_id', 'ingredient_count',
+                                     'ingredient_ids')), expected)
+
+
 class AITwistTests(TestCase):
     """Test of getting ai twist behavior."""
     def setUp(self):
@@ -124,6 +359,12 @@ class AITwistTests(TestCase):
         self.mock_celery = patch(
             "django_recipe_generator.recipe_generator.signals.generate_ai_twist.delay"
         ).start()
+        self.mock_breaker = patch(
+            "django_recipe_generator.recipe_generator.tasks.gemini_breaker"
+        ).start()
+        self.mock_publish = patch(
+            "django_recipe_generator.recipe_generator.tasks.publish_status"
+        ).start()
         self.addCleanup(patch.stopall)  # automatic cleanup after all tests
 
     @classmethod
@@ -197,6 +438,26 @@ class AITwistTests(TestCase):
             "how_to_use": "how_to_use"
         })
 
+    def test_generate_ai_twist_publishes_status_transitions(self):
+        recipe = Recipe.objects.create(name="test_pizza",
+                                       instructions="test instructions",
+                                       cooking_time=15,
+                                       owner=self.user)
+        self.mock_twist.side_effect = [
+            ServerError(503, {"error": {"message": "overloaded"}}),
+            {"twist_ingredient": "ingredient"},
+        ]
+
+        generate_ai_twist.apply(args=(recipe.id,))
+
+        self.assertEqual(self.mock_publish.call_args_list, [
+            call(recipe.id, self.user.id, 'generating', None),
+            call(recipe.id, self.user.id, 'pending', None),
+            call(recipe.id, self.user.id, 'generating', None),
+            call(recipe.id, self.user.id, 'completed',
+                 {"twist_ingredient": "ingredient"}),
+        ])
+
     def test_generate_ai_twist_logic_failure(self):
         recipe = Recipe.objects.create(name="test_pizza",
                                        instructions="test instructions",
@@ -210,5 +471,143 @@ class AITwistTests(TestCase):
         recipe.refresh_from_db()
 
         self.assertEqual(recipe.ai_generation_status, "failed")
-        self.assertEqual(recipe.elevating_twist,
-                         "Generation error: AI service unavailable")
+        self.assertIsNone(recipe.elevating_twist)
+        self.assertEqual(recipe.ai_generation_error,
+                         "Exception: AI service unavailable")
+        self.assertEqual(recipe.ai_generation_attempts, 1)
+        self.assertIsNotNone(recipe.ai_generation_failed_at)
+        self.mock_breaker.record_failure.assert_not_called()
+
+    def test_generate_ai_twist_failed_probe_releases_circuit(self):
+        recipe = Recipe.objects.create(name="test_pizza",
+                                       instructions="test instructions",
+                                       cooking_time=15,
+                                       owner=self.user)
+        self.mock_breaker.before_call.return_value = True
+        self.mock_twist.side_effect = ClientError(
+            400, {"error": {"message": "bad request"}})
+
+        generate_ai_twist(recipe.id)
+
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.ai_generation_status, "failed")
+        self.mock_breaker.release_probe.assert_called_once()
+        self.mock_breaker.record_failure.assert_not_called()
+
+    def test_generate_ai_twist_retries_transient_errors(self):
+        recipe = Recipe.objects.create(name="test_pizza",
+                                       instructions="test instructions",
+                                       cooking_time=15,
+                                       owner=self.user)
+        self.mock_twist.side_effect = [
+            ServerError(503, {"error": {"message": "overloaded"}}),
+            {"twist_ingredient": "ingredient",
+             "reason": "reason",
+             "how_to_use": "how_to_use"},
+        ]
+
+        generate_ai_twist.apply(args=(recipe.id,))
+        recipe.refresh_from_db()
+
+        self.assertEqual(self.mock_twist.call_count, 2)
+        self.assertEqual(recipe.ai_generation_status, "completed")
+        self.assertEqual(recipe.ai_generation_attempts, 2)
+        self.mock_breaker.record_failure.assert_called_once()
+        self.mock_breaker.record_success.assert_called_once()
+
+    def test_generate_ai_twist_gives_up_after_max_retries(self):
+        recipe = Recipe.objects.create(name="test_pizza",
+                                       instructions="test instructions",
+                                       cooking_time=15,
+                                       owner=self.user)
+        self.mock_twist.side_effect = ServerError(
+            429, {"error": {"message": "rate limited"}})
+
+        generate_ai_twist.apply(args=(recipe.id,))
+        recipe.refresh_from_db()
+
+        self.assertEqual(self.mock_twist.call_count,
+                         generate_ai_twist.max_retries + 1)
+        self.assertEqual(recipe.ai_generation_status, "failed")
+        self.assertIn("rate limited", recipe.ai_generation_error)
+        self.assertIsNone(recipe.elevating_twist)
+
+    def test_generate_ai_twist_deferred_while_circuit_open(self):
+        """Deferrals are re-sent without using up the retries, even the last."""
+        recipe = Recipe.objects.create(name="test_pizza",
+                                       instructions="test instructions",
+                                       cooking_time=15,
+                                       owner=self.user)
+        self.mock_breaker.before_call.side_effect = CircuitOpenError("gemini", 30)
+        max_retries = generate_ai_twist.max_retries
+
+        with patch.object(generate_ai_twist, 'apply_async') as apply_async:
+            result = generate_ai_twist.apply(args=(recipe.id,),
+                                             retries=max_retries)
+        recipe.refresh_from_db()
+
+        self.mock_twist.assert_not_called()
+        self.assertEqual(result.state, 'RETRY')
+        self.assertEqual(recipe.ai_generation_status, "pending")
+        apply_async.assert_called_once()
+        (args, kwargs), options = apply_async.call_args
+        self.assertEqual(args, (recipe.id,))
+        self.assertEqual(options['retries'], max_retries)
+        self.assertGreaterEqual(options['countdown'], 30)
+
+
+class CircuitBreakerTests(TestCase):
+    """Test of the Redis-backed circuit breaker."""
+
+    def test_fails_open_when_redis_unavailable(self):
+        client = MagicMock()
+        client.exists.side_effect = redis.ConnectionError("down")
+        client.pipeline.side_effect = redis.ConnectionError("down")
+        breaker = CircuitBreaker("test", failure_threshold=1, failure_window=60,
+                                 recovery_timeout=60, client=client)
+
+        breaker.before_call()
+        breaker.record_failure()
+
+    def test_open_circuit_rejects_calls(self):
+        client = MagicMock()
+        client.exists.return_value = 1
+        client.ttl.return_value = 42
+        breaker = CircuitBreaker("test", failure_threshold=1, failure_window=60,
+                                 recovery_timeout=60, client=client)
+
+        with self.assertRaises(CircuitOpenError) as ctx:
+            breaker.before_call()
+        self.assertEqual(ctx.exception.retry_after, 42)
+
+    def test_threshold_opens_circuit(self):
+        client = MagicMock()
+        client.pipeline.return_value.execute.return_value = [3, True, 0]
+        breaker = CircuitBreaker("test", failure_threshold=3, failure_window=60,
+                                 recovery_timeout=60, client=client)
+
+        breaker.record_failure()
+
+        client.pipeline.return_value.set.assert_any_call(
+            "circuit:test:open", ANY, ex=60)
+
+    def test_released_probe_lets_next_call_probe(self):
+        keys = {}
+        client = MagicMock()
+        client.exists.side_effect = lambda key: key in keys
+        client.set.side_effect = lambda key, value, nx, ex: (
+            key not in keys and not keys.update({key: value}))
+        client.delete.side_effect = lambda *names: [keys.pop(n, None)
+                                                    for n in names]
+        keys["circuit:test:tripped"] = 1
+        breaker = CircuitBreaker("test", failure_threshold=1, failure_window=60,
+                                 recovery_timeout=60, client=client)
+
+        self.assertTrue(breaker.before_call())
+        with self.assertRaises(CircuitOpenError):
+            breaker.before_call()  # the probe is in flight
+
+        breaker.release_probe()
+
+        self.assertTrue(breaker.before_call())
+        self.assertIn("circuit:test:tripped", keys)
@@ -0,0 +1,67 @@
+"""Test module for web worker startup (import-time) cost."""
+import os
+from unittest.mock import patch
+
+from django.test import RequestFactory, SimpleTestCase
+
+from django_recipe_generator.startup import (
+    lazy_api_view,
+    parse_importtime,
+    profile_startup,
+)
+
+# Only the Celery worker talks to Gemini; a web worker must boot without them.
+WORKER_ONLY_MODULES = ('google.genai',)
+
+LAZY_MODULES = (
+    'drf_spectacular.views',
+    'django_recipe_generator.admin_urls',
+    'django_recipe_generator.recipe_generator.api.social_views',
+)
+
+
+class WebWorkerStartupTests(SimpleTestCase):
+    """Web workers must not import worker-only dependencies at startup."""
+
+    def test_gemini_sdk_not_imported_by_web_worker(self):
+        profile = profile_startup(env={'GEMINI_API_KEY': ''},
+                                  watch=WORKER_ONLY_MODULES)
+        imported = [row[0] for row in profile['imports']]
+        self.assertEqual(profile['modules'], [])
+        self.assertIn('django_recipe_generator.recipe_generator.tasks', imported)
+        self.assertFalse(
+            [name for name in imported if name.startswith(WORKER_ONLY_MODULES)]
+        )
+
+    def test_gemini_client_created_lazily_and_cached(self):
+        from django_recipe_generator.services import gemini_client
+
+        gemini_client.get_client.cache_clear()
+        self.addCleanup(gemini_client.get_client.cache_clear)
+        with patch.dict(os.environ, {'GEMINI_API_KEY': 'test-key'}):
+            client = gemini_client.get_client()
+            self.assertIs(gemini_client.get_client(), client)
+
+    def test_lazy_subsystems_not_imported_until_used(self):
+        eager = profile_startup(env={'LAZY_SUBSYSTEMS': ''}, watch=LAZY_MODULES)
+        lazy = profile_startup(env={'LAZY_SUBSYSTEMS': 'admin,docs,social'},
+                               watch=LAZY_MODULES)
+        self.assertEqual(eager['modules'], sorted(LAZY_MODULES))
+        self.assertEqual(lazy['modules'], [])
+
+    def test_lazy_api_view_imports_on_first_request(self):
+        view = lazy_api_view('drf_spectacular.views.SpectacularAPIView')
+        self.assertTrue(view.csrf_exempt)
+        response = view(RequestFactory().get('/recipe_generator/api/schema/'))
+        self.assertEqual(response.status_code, 200)
+
+    def test_parse_importtime(self):
+        stderr = (
+            "import time: self [us] | cumulative | imported package\n"
+            "import time:       120 |        120 |   json.decoder\n"
+            "import time:       300 |        420 | json\n"
+        )
+        self.assertEqual(parse_importtime(stderr), [
+            ('json.decoder', 120, 120, 1),
+            ('json', 300, 420, 0),
+        ])
@@ -0,0 +1,140 @@
+"""Test module for tracing across requests, Celery tasks and Gemini calls."""
+import tempfile
+from io import StringIO
+from unittest import SkipTest, skipUnless
+from unittest.mock import patch
+
+from celery import Task
+from celery.signals import before_task_publish
+from django.contrib.auth.models import User
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.test import SimpleTestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APITestCase
+
+from django_recipe_generator import tracing
+from django_recipe_generator.recipe_generator.models import Ingredient
+from django_recipe_generator.recipe_generator.tasks import generate_ai_twist
+
+try:
+    from opentelemetry.sdk.trace.export.in_memory_span_exporter import (
+        InMemorySpanExporter)
+except ImportError:
+    InMemorySpanExporter = None
+
+TASK = 'django_recipe_generator.recipe_generator.tasks.generate_ai_twist'
+
+
+@skipUnless(tracing.trace, "opentelemetry is not installed")
+class TracingTests(APITestCase):
+    """One trace from the request through the Celery task to Gemini."""
+
+    @classmethod
+    def setUpClass(cls):
+        if tracing.enabled():
+            raise SkipTest("tracing is configured with another exporter")
+        super().setUpClass()
+        cls.exporter = InMemorySpanExporter()
+        tracing.configure(cls.exporter)
+
+    @classmethod
+    def setUpTestData(cls):
+        """Set up a user and an ingredient."""
+        cls.user = User.objects.create_user(username='testuser', password='testpass')
+        cls.ingredient = Ingredient.objects.create(name="tomato")
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+        for target in ('gemini_breaker', 'publish_status'):
+            patch(f"django_recipe_generator.recipe_generator.tasks.{target}").start()
+        generate = patch(
+            "django_recipe_generator.services.gemini_client.get_client"
+        ).start().return_value.models.generate_content
+        generate.return_value.parsed = {"twist_ingredient": "basil"}
+        self.addCleanup(patch.stopall)
+        self.exporter.clear()
+
+    def finished_spans(self):
+        tracing.flush()
+        return self.exporter.get_finished_spans()
+
+    def test_trace_propagates_to_task(self):
+        published = []
+
+        def publish(task, args=None, kwargs=None, **options):
+            """Stand-in for the broker: keep the message headers."""
+            headers = {'id': 'task-id', 'task': task.name}
+            before_task_publish.send(sender=task.name, headers=headers)
+            published.append((args, headers))
+
+        with patch.object(Task, 'apply_async', publish):
+            response = self.client.post(reverse('recipe-list'), {
+                'name': 'soup', 'instructions': 'Boil.', 'cooking_time': 10,
+                'ingredients': [{'ingredient': self.ingredient.id, 'quantity': '1'}],
+            }, format='json')
+        self.assertEqual(response.status_code, 201)
+        [(args, headers)] = published
+        self.assertIn('traceparent', headers)
+
+        # what the worker does with the message
+        generate_ai_twist.apply(args=args, headers=headers)
+
+        spans = {span.name.replace(TASK, 'TASK'): span
+                 for span in self.finished_spans()}
+        request, run = spans['POST recipe-list'], spans['celery.run TASK']
+        self.assertEqual({span.context.trace_id for span in spans.values()},
+                         {request.context.trace_id})
+        for child, parent in [
+            ('trigger_ai_twist_on_ingredients_change', 'POST recipe-list'),
+            ('celery.publish TASK', 'trigger_ai_twist_on_ingredients_change'),
+            ('celery.run TASK', 'celery.publish TASK'),
+            ('twist.load_ingredients', 'celery.run TASK'),
+            ('gemini.generate_content', 'celery.run TASK'),
+            ('twist.set_status', 'celery.run TASK'),
+        ]:
+            self.assertEqual(spans[child].parent.span_id,
+                             spans[parent].context.span_id, child)
+
+        self.assertEqual(request.attributes['http.response.status_code'], 201)
+        self.assertGreater(request.attributes['db.query_count'], 0)
+        self.assertEqual(
+            spans['twist.load_ingredients'].attributes['db.query_count'], 1)
+        self.assertEqual(run.attributes['celery.state'], 'SUCCESS')
+
+    def test_untraced_task_starts_a_trace(self):
+        generate_ai_twist.apply(args=(0,))
+        [run] = self.finished_spans()
+        self.assertEqual(run.name, f'celery.run {TASK}')
+        self.assertIsNone(run.parent)
+
+    def test_file_exporter_and_show_traces(self):
+        with tracing.span('outer'):
+            with tracing.span('inner'):
+                pass
+        with tempfile.NamedTemporaryFile(suffix='.jsonl') as f:
+            with override_settings(TRACING_EXPORTER='file', TRACING_FILE=f.name):
+                exporter = tracing.build_exporter()
+            exporter.export(self.finished_spans())
+            exporter.out.close()
+
+            out = StringIO()
+            call_command('show_traces', file=f.name, name='inner', stdout=out)
+        lines = out.getvalue().splitlines()
+        self.assertRegex(lines[1], r'^=== trace 0x[0-9a-f]+ .* 2 spans ===$')
+        self.assertRegex(lines[3], r' ms  outer  \[recipe-generator\]$')
+        self.assertRegex(lines[4], r' ms    inner  \[recipe-generator\]$')
+
+
+@skipUnless(tracing.trace, "opentelemetry is not installed")
+class BuildExporterTests(SimpleTestCase):
+    """Exporter selection with ``TRACING_EXPORTER``."""
+
+    @override_settings(TRACING_EXPORTER='')
+    def test_off(self):
+        self.assertIsNone(tracing.build_exporter())
+
+    @override_settings(TRACING_EXPORTER='jaeger')
+    def test_unknown(self):
+        with self.assertRaises(ImproperlyConfigured):
+            tracing.build_exporter()
@@ -1,11 +1,22 @@
 """Test module for Traditional Django views."""
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
 from django.db import connection
-from django.test import TestCase
+from django.http import Http404
+from django.test import AsyncRequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.contrib.auth.models import User
-from unittest.mock import patch
+import json
+from unittest.mock import ANY, AsyncMock, MagicMock, patch
+
+import redis
 
 from django_recipe_generator.recipe_generator import views
+from django_recipe_generator.services import keyset, navigation, recipe_cache
+from django_recipe_generator.recipe_generator.tasks import _set_status
 from django_recipe_generator.recipe_generator.forms import (
     RecipeForm,
     RecipeIngredientFormSet,
@@ -22,8 +33,9 @@ class RecipeDetailViewTests(TestCase):
     """Tests for the  retrieving a recipe view."""
 
     def setUp(self):
-        """Clear queries log before each test."""
+        """Clear queries log and cached fragments before each test."""
         connection.queries_log.clear()
+        cache.clear()
         self.client.login(username='testuser', password='testpass')
 
     @classmethod
@@ -66,6 +78,16 @@ class RecipeDetailViewTests(TestCase):
         )
         self.assertEqual(response.status_code, 404)
 
+    def test_version_stamps_only_for_recipes(self):
+        """Unknown ids leave no stamp; stamps expire with the fragments."""
+        self.client.get(reverse('recipe_detail', kwargs={'pk': 999}))
+        self.assertIsNone(recipe_cache.get_version(999))
+
+        with patch.object(cache, 'add', wraps=cache.add) as add:
+            self.client.get(self.detail_url)
+        add.assert_called_once_with(recipe_cache.version_key(self.recipe.pk), ANY,
+                                    settings.RECIPE_FRAGMENT_CACHE_TIMEOUT)
+
     def test_context_contains_recipe(self):
         """Ensure the recipe is in the context."""
         response = self.client.get(self.detail_url)
@@ -74,79 +96,147 @@ class RecipeDetailViewTests(TestCase):
     def test_queryset_prefetch_related(self):
         """Check the number of queries with prefetching.
 
-        4 = 1 recipe fetch + 2 prefetching queries + 1 django session query
+        3 = 1 recipe fetch + 2 prefetching queries (the session is not loaded)
         """
-        with self.assertNumQueries(4):
+        with self.assertNumQueries(3):
             response = self.client.get(self.detail_url)
             list(response.context['recipe'].ingredients.all())
 
+    def test_cached_fragment_served_without_recipe_queries(self):
+        """A hot recipe renders from cache without any query."""
+        first = self.client.get(self.detail_url)
+        with self.assertNumQueries(0):
+            second = self.client.get(self.detail_url)
+        self.assertEqual(second.content, first.content)
+        self.assertContains(second, self.ingredient2.name)
+
+    def test_cached_fragment_invalidated_on_change(self):
+        """Recipe, ingredient and twist changes bump the version stamp."""
+        self.client.get(self.detail_url)
+
+        self.recipe.name = "new_pizza"
+        self.recipe.save()
+        self.assertContains(self.client.get(self.detail_url), "new_pizza")
+
+        self.recipe.ingredients.remove(self.ingredient2)
+        self.assertNotContains(self.client.get(self.detail_url), "Pepper")
+
+        self.ingredient1.name = "Sea salt"
+        self.ingredient1.save()
+        self.assertContains(self.client.get(self.detail_url), "Sea salt")
+
+        with patch("django_recipe_generator.recipe_generator.tasks.publish_status"):
+            _set_status(self.recipe.pk, self.user.pk, 'completed',
+                        elevating_twist={'twist_ingredient': 'Lime zest'})
+        self.assertContains(self.client.get(self.detail_url), "Lime zest")
+
+    def test_twist_status_polled_under_wsgi(self):
+        """Sync workers serve no status stream to the page: it polls instead."""
+        response = self.client.get(self.detail_url)
+
+        self.assertNotContains(response, 'EventSource')
+        self.assertContains(response, reverse('recipe_status',
+                                              kwargs={'pk': self.recipe.pk}))
+
+    @override_settings(ASYNC_VIEWS=True)
+    def test_twist_status_streamed_under_asgi(self):
+        """With the async views the page subscribes to the status stream."""
+        response = self.client.get(self.detail_url)
+
+        self.assertContains(response, 'new EventSource("{}")'.format(
+            reverse('recipe_status_stream', kwargs={'pk': self.recipe.pk})))
+
+    def test_not_modified(self):
+        """Revalidating an unchanged page gets a 304."""
+        etag = self.client.get(self.detail_url)['ETag']
+
+        response = self.client.get(self.detail_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        self.recipe.name = "new_pizza"
+        self.recipe.save()
+        response = self.client.get(self.detail_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_back_url_not_cached(self):
+        """The cookie dependent back URL stays outside the fragment."""
+        self.client.get(self.detail_url)
+        self.client.get(self.list_url)
+
+        response = self.client.get(self.detail_url)
+        self.assertContains(response, f'href="{self.list_url}"')
+
     def test_back_url_defaults_to_index(self):
-        """Check default back_url is index if no session flags."""
+        """Check default back_url is index if no search was made."""
         response = self.client.get(self.detail_url)
         self.assertEqual(response.context['back_url'], self.index_url)
 
     def test_back_url_from_search_with_referer(self):
-        """Check back_url when session has came_from_search and referer."""
-        session = self.client.session
-        session['came_from_search'] = True
-        session.save()
+        """Check back_url is the referring results page after a search."""
+        self.client.get(self.list_url, {'q': 'test'})
 
-        referer = f"{self.list_url}?q=test"
+        referer = f"http://testserver{self.list_url}?q=test&cursor=abc"
         response = self.client.get(self.detail_url, HTTP_REFERER=referer)
         self.assertEqual(response.context['back_url'], referer)
 
     def test_back_url_from_search_without_referer(self):
         """Check back_url fallback.
 
-        Back_url fallback to list if came_from_search is set but no referer.
+        Back_url fallback to list if a search was made but no referer.
         """
-        session = self.client.session
-        session['came_from_search'] = True
-        session.save()
+        self.client.get(self.list_url)
 
         response = self.client.get(self.detail_url)
         self.assertEqual(response.context['back_url'], self.list_url)
 
     def test_back_url_after_editing(self):
         """Ensure back_url respects saved search query after editing."""
-        session = self.client.session
-        session['came_from_search'] = True
-        session['was_editing'] = True
-        session['search_params'] = {
-            'q': 'test',
-            'time_filter': 'quick',
-        }
-        session.save()
+        self.client.get(self.list_url, {'q': 'test', 'time_filter': 'quick'})
 
-        response = self.client.get(self.detail_url)
+        edit_url = reverse('recipe_edit', kwargs={'pk': self.recipe.pk})
+        response = self.client.get(
+            self.detail_url, HTTP_REFERER=f"http://testserver{edit_url}")
         self.assertEqual(
             response.context['back_url'],
             f"{self.list_url}?q=test&time_filter=quick"
         )
 
-        self.assertNotIn('was_editing', self.client.session)
+    def test_back_url_ignores_foreign_referer(self):
+        """A results page on another host is not used as back link."""
+        self.client.get(self.list_url, {'q': 'test'})
+
+        response = self.client.get(
+            self.detail_url, HTTP_REFERER=f"https://example.com{self.list_url}")
+        self.assertEqual(response.context['back_url'], f"{self.list_url}?q=test")
 
-    def test_session_flags_cleaned_up(self):
-        """Test cleanup of session flags like was_editing."""
-        session = self.client.session
-        session['came_from_search'] = True
-        session['was_editing'] = True
-        session.save()
+    def test_index_forgets_search(self):
+        """Visiting the home page clears the search tracking."""
+        self.client.get(self.list_url, {'q': 'test'})
+        self.client.get(self.index_url)
 
-        self.client.get(self.detail_url)
-        self.assertIn('came_from_search', self.client.session)
-        self.assertNotIn('was_editing', self.client.session)
+        self.assertEqual(self.client.cookies[navigation.COOKIE_NAME].value, '')
+        response = self.client.get(self.detail_url)
+        self.assertEqual(response.context['back_url'], self.index_url)
 
-    def test_malformed_search_query_handled(self):
-        """Verify malformed search queries do not break view."""
-        session = self.client.session
-        session['came_from_search'] = True
-        session['was_editing'] = True
-        session['search_query'] = "invalid=test&="
-        session.save()
+    def test_tampered_cookie_ignored(self):
+        """Verify a cookie with a bad signature does not break view."""
+        self.client.cookies[navigation.COOKIE_NAME] = '{"q":["x"]}:forged'
 
         response = self.client.get(self.detail_url)
-        self.assertEqual(response.context['back_url'], self.list_url)
+        self.assertEqual(response.context['back_url'], self.index_url)
+
+    def test_browsing_writes_nothing(self):
+        """Anonymous searching and viewing recipes runs no write queries."""
+        self.client.logout()
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(self.list_url, {'q': 'pizza'})
+            self.client.get(self.detail_url)
+            self.client.get(self.index_url)
+
+        writes = [q['sql'] for q in queries
+                  if not q['sql'].lstrip().upper().startswith('SELECT')]
+        self.assertEqual(writes, [])
+        self.assertNotIn(settings.SESSION_COOKIE_NAME, self.client.cookies)
 
 
 class RecipeDeleteViewTests(TestCase):
@@ -300,6 +390,29 @@ class RecipeCreateViewTests(TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertFalse(response.context['formset'].is_valid())
 
+    def test_ingredients_validated_and_rendered_at_once(self):
+        """The formset resolves all chosen ingredients in one query."""
+        cache.clear()
+        data = {**self.valid_data, 'recipeingredient_set-TOTAL_FORMS': '4',
+                'recipeingredient_set-2-ingredient': 999,
+                'recipeingredient_set-2-quantity': '1',
+                'recipeingredient_set-3-ingredient': 998,
+                'recipeingredient_set-3-quantity': '1'}
+        formset = self.formset(data)
+        with self.assertNumQueries(1):
+            self.assertFalse(formset.is_valid())
+        self.assertEqual([bool(errors) for errors in formset.errors],
+                         [False, False, True, True])
+        self.assertEqual(formset.forms[0].cleaned_data['ingredient'],
+                         self.ingredient1)
+
+        # choices of every form come from the ingredient catalogue
+        with self.assertNumQueries(1):
+            html = str(self.formset())
+        self.assertEqual(html.count(f'>{self.ingredient2.name}</option>'), 5)
+        with self.assertNumQueries(0):
+            str(self.formset())
+
 
 class RecipeEditViewTests(TestCase):
     """Tests for editing recipe view."""
@@ -521,6 +634,315 @@ class RecipeListViewTests(TestCase):
         self.assertIn(self.recipe1, response.context['recipes'])
 
 
+class RecipeListPaginationTests(TestCase):
+    """Tests for keyset pagination of the recipe list."""
+
+    @classmethod
+    def setUpTestData(cls):
+        """Set up 40 recipes with 0-3 missing ingredients each."""
+        cls.mock_celery = patch(
+            "django_recipe_generator.recipe_generator.signals.generate_ai_twist.delay"
+        ).start()
+        cls.addClassCleanup(patch.stopall)
+
+        cls.salt, cls.pepper, cls.banana, cls.lime = [
+            Ingredient.objects.create(name=name)
+            for name in ("Salt", "Pepper", "Banana", "Lime")
+        ]
+        cls.user = User.objects.create_user(username='testuser',
+                                            password='testpass')
+        extras = [[], [cls.pepper], [cls.pepper, cls.banana],
+                  [cls.pepper, cls.banana, cls.lime]]
+        cls.missing = {}
+        for i in range(40):
+            recipe = Recipe.objects.create(name=f"recipe {i}", instructions="-",
+                                           cooking_time=10, owner=cls.user)
+            recipe.ingredients.set([cls.salt] + extras[i * 7 % 4])
+            cls.missing[recipe.pk] = i * 7 % 4
+        cls.list_url = reverse('recipe_list')
+
+    def setUp(self):
+        cache.clear()
+
+    def walk(self, data):
+        """Follow the next links, then the previous links back."""
+        pages = []
+        response = self.client.get(self.list_url, data)
+        while True:
+            pages.append([r.pk for r in response.context['recipes']])
+            if 'next_page_url' not in response.context:
+                break
+            next_url = response.context['next_page_url']
+            response = self.client.get(self.list_url + next_url)
+        backwards = []
+        while 'previous_page_url' in response.context:
+            previous_url = response.context['previous_page_url']
+            response = self.client.get(self.list_url + previous_url)
+            backwards.append([r.pk for r in response.context['recipes']])
+        return pages, backwards
+
+    def test_ingredient_search_ordered_by_missing_then_id(self):
+        pages, backwards = self.walk({'query_ingredients': [self.salt.pk]})
+
+        expected = sorted(self.missing, key=lambda pk: (self.missing[pk], pk))
+        self.assertEqual([len(page) for page in pages], [15, 15, 10])
+        self.assertEqual(sum(pages, []), expected)
+        self.assertEqual(backwards, pages[-2::-1])
+
+    def test_listing_ordered_by_id(self):
+        pages, _ = self.walk({})
+        self.assertEqual(sum(pages, []), sorted(self.missing))
+
+    def test_next_page_keeps_search_and_skips_offset(self):
+        data = {'query_ingredients': [self.salt.pk], 'query_name': 'recipe'}
+        response = self.client.get(self.list_url, data)
+        next_url = response.context['next_page_url']
+        self.assertIn('query_name=recipe', next_url)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(self.list_url + next_url)
+        self.assertFalse([q for q in queries if 'OFFSET' in q['sql']])
+
+    def test_count_modes(self):
+        data = {'query_ingredients': [self.salt.pk]}
+        response = self.client.get(self.list_url, data)
+        self.assertEqual(response.context['page_obj'].count, 40)
+        self.assertContains(response, "40 recipes")
+
+        with self.settings(SEARCH_COUNT_MODE='approx'):
+            response = self.client.get(self.list_url, data)
+            self.assertTrue(response.context['page_obj'].count_is_estimate)
+            self.assertContains(response, "About 40 recipes")
+
+        with self.settings(SEARCH_COUNT_MODE='none'):
+            response = self.client.get(self.list_url, data)
+            self.assertIsNone(response.context['page_obj'].count)
+
+    def test_invalid_cursor_404(self):
+        response = self.client.get(self.list_url, {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_pk_batches(self):
+        queryset = Recipe.objects.filter(ingredients=self.pepper)
+        with self.assertNumQueries(3):
+            batches = list(keyset.pk_batches(queryset, 15))
+        self.assertEqual([len(batch) for batch in batches], [15, 15])
+        self.assertEqual(sum(batches, []),
+                         sorted(pk for pk, n in self.missing.items() if n))
+
+
+class AsyncRecipeViewsTests(TestCase):
+    """Tests for the async list/detail views used in ASGI mode."""
+
+    @classmethod
+    def setUpTestData(cls):
+        """Set up initial test data: ingredients, recipes, urls."""
+        cls.mock_celery = patch(
+            "django_recipe_generator.recipe_generator.signals.generate_ai_twist.delay"
+        ).start()
+        cls.addClassCleanup(patch.stopall)
+
+        cls.ingredient1 = Ingredient.objects.create(name="Salt")
+        cls.ingredient2 = Ingredient.objects.create(name="Pepper")
+        cls.user = User.objects.create_user(username='testuser',
+                                            password='testpass')
+        cls.recipe = Recipe.objects.create(
+            name="test_pizza",
+            instructions="test instructions",
+            cooking_time=15,
+            owner=cls.user
+        )
+        cls.recipe.ingredients.set([cls.ingredient1, cls.ingredient2])
+        cls.list_url = reverse('recipe_list')
+        cls.detail_url = reverse('recipe_detail', kwargs={'pk': cls.recipe.pk})
+
+    def setUp(self):
+        cache.clear()
+
+    def make_request(self, url, data=None):
+        request = AsyncRequestFactory().get(url, data)
+        request.user = AnonymousUser()
+        return request
+
+    async def test_async_list_matches_sync_list(self):
+        data = {'query_ingredients': [str(self.ingredient1.id)]}
+        request = self.make_request(self.list_url, data)
+
+        response = await views.AsyncRecipeList.as_view()(request)
+        await sync_to_async(response.render)()
+
+        self.assertEqual(response.status_code, 200)
+        recipe = response.context_data['recipes'][0]
+        self.assertEqual(recipe, self.recipe)
+        self.assertEqual(recipe.matching_ingredient_names, [self.ingredient1.name])
+        self.assertEqual(recipe.missing_ingredient_names, [self.ingredient2.name])
+        self.assertEqual(response.context_data['page_obj'].count, 1)
+        follow_up = self.make_request(self.detail_url)
+        follow_up.COOKIES = {navigation.COOKIE_NAME:
+                             response.cookies[navigation.COOKIE_NAME].value}
+        self.assertEqual(navigation.saved_search(follow_up), data)
+
+    async def test_async_list_invalid_cursor(self):
+        request = self.make_request(self.list_url, {'cursor': 'bogus'})
+        with self.assertRaises(Http404):
+            await views.AsyncRecipeList.as_view()(request)
+
+    async def test_async_detail(self):
+        request = self.make_request(self.detail_url)
+
+        response = await views.AsyncRecipeDetailView.as_view()(
+            request, pk=self.recipe.pk)
+        await sync_to_async(response.render)()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context_data['recipe'], self.recipe)
+        self.assertEqual(response.context_data['back_url'], reverse('index'))
+        self.assertContains(response, self.ingredient2.name)
+
+    async def test_async_detail_cached(self):
+        view = views.AsyncRecipeDetailView.as_view()
+        first = await view(self.make_request(self.detail_url), pk=self.recipe.pk)
+        await sync_to_async(first.render)()
+
+        response = await view(self.make_request(self.detail_url), pk=self.recipe.pk)
+        await sync_to_async(response.render)()
+
+        self.assertIsNone(response.context_data['view'].object)
+        self.assertEqual(response.content, first.content)
+
+    async def test_async_detail_404(self):
+        request = self.make_request(self.detail_url)
+        with self.assertRaises(Http404):
+            await views.AsyncRecipeDetailView.as_view()(request, pk=999)
+
+
+@override_settings(ASYNC_VIEWS=True)
+class RecipeStatusStreamTests(TestCase):
+    """Tests for the AI twist status server-sent events (ASGI mode)."""
+
+    @classmethod
+    def setUpTestData(cls):
+        """Set up initial test data: user, recipe, urls."""
+        cls.mock_celery = patch(
+            "django_recipe_generator.recipe_generator.signals.generate_ai_twist.delay"
+        ).start()
+        cls.addClassCleanup(patch.stopall)
+
+        cls.user = User.objects.create_user(username='testuser',
+                                            password='testpass')
+        cls.recipe = Recipe.objects.create(
+            name="test_pizza",
+            instructions="test instructions",
+            cooking_time=15,
+            owner=cls.user
+        )
+        cls.url = reverse('recipe_status_stream', kwargs={'pk': cls.recipe.pk})
+
+    def setUp(self):
+        self.redis = MagicMock()
+        self.redis.aclose = AsyncMock()
+        self.pubsub = self.redis.pubsub.return_value
+        self.pubsub.subscribe = AsyncMock()
+        self.pubsub.aclose = AsyncMock()
+        self.pubsub.get_message = AsyncMock()
+        patcher = patch("redis.asyncio.Redis.from_url", return_value=self.redis)
+        self.from_url = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def read_events(self, response):
+        body = b''.join([chunk async for chunk in response.streaming_content])
+        return [json.loads(line[len('data: '):])
+                for line in body.decode().splitlines()
+                if line.startswith('data: ')]
+
+    async def test_streams_until_terminal_status(self):
+        completed = {'recipe_id': self.recipe.pk, 'status': 'completed',
+                     'elevating_twist': {'twist_ingredient': 'ingredient'}}
+        self.pubsub.get_message.side_effect = [
+            None,
+            {'data': json.dumps({'recipe_id': self.recipe.pk,
+                                 'status': 'generating'}).encode()},
+            {'data': json.dumps(completed).encode()},
+        ]
+
+        response = await self.async_client.get(self.url)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        self.assertEqual(await self.read_events(response), [
+            {'recipe_id': self.recipe.pk, 'status': 'pending'},
+            {'recipe_id': self.recipe.pk, 'status': 'generating'},
+            completed,
+        ])
+        self.pubsub.subscribe.assert_awaited_once_with(
+            f"twist-status:recipe:{self.recipe.pk}")
+        self.pubsub.aclose.assert_awaited_once()
+        self.redis.aclose.assert_awaited_once()
+
+    async def test_terminal_status_closes_after_current_state(self):
+        await Recipe.objects.filter(pk=self.recipe.pk).aupdate(
+            ai_generation_status='failed')
+
+        response = await self.async_client.get(self.url)
+
+        self.assertEqual(await self.read_events(response), [
+            {'recipe_id': self.recipe.pk, 'status': 'failed'},
+        ])
+        self.pubsub.get_message.assert_not_called()
+
+    async def test_redis_unavailable_sends_current_state(self):
+        self.pubsub.subscribe.side_effect = redis.ConnectionError("down")
+
+        with self.assertLogs('django_recipe_generator.services.twist_status',
+                             'WARNING'):
+            response = await self.async_client.get(self.url)
+            events = await self.read_events(response)
+
+        self.assertEqual(events, [
+            {'recipe_id': self.recipe.pk, 'status': 'pending'},
+        ])
+
+    def test_missing_recipe_404(self):
+        response = self.client.get(
+            reverse('recipe_status_stream', kwargs={'pk': 999}))
+        self.assertEqual(response.status_code, 404)
+
+    @override_settings(ASYNC_VIEWS=False)
+    def test_no_streams_under_wsgi(self):
+        """Sync workers must not be held by streams: 404, nothing subscribed."""
+        self.client.login(username='testuser', password='testpass')
+
+        for url in (self.url, reverse('user_status_stream')):
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 404)
+        self.from_url.assert_not_called()
+
+    @override_settings(ASYNC_VIEWS=False)
+    def test_current_status(self):
+        url = reverse('recipe_status', kwargs={'pk': self.recipe.pk})
+
+        with self.assertNumQueries(1):
+            response = self.client.get(url)
+
+        self.assertEqual(response.json(),
+                         {'recipe_id': self.recipe.pk, 'status': 'pending'})
+        self.assertEqual(response['Cache-Control'], 'no-cache')
+        self.from_url.assert_not_called()
+        response = self.client.get(reverse('recipe_status', kwargs={'pk': 999}))
+        self.assertEqual(response.status_code, 404)
+
+    async def test_user_stream_requires_login(self):
+        response = await self.async_client.get(reverse('user_status_stream'))
+        self.assertEqual(response.status_code, 302)
+
+        await self.async_client.alogin(username='testuser', password='testpass')
+        with self.settings(SSE_STREAM_TIMEOUT=0):
+            response = await self.async_client.get(reverse('user_status_stream'))
+            self.assertEqual(await self.read_events(response), [])
+        self.pubsub.subscribe.assert_awaited_once_with(
+            f"twist-status:user:{self.user.pk}")
+
+
 class IngredientDetailViewTests(TestCase):
     """Tests for the  retrieving an ingredient view."""
 
@@ -3,6 +3,7 @@ URL configuration for the recipe_generator app.
 
 Includes:
 - HTML views for recipe management (list, create, edit, delete, detail).
+- Server-sent events (and a polled JSON status) with AI twist status changes.
 - API endpoints.
 - Debug toolbar (only in DEBUG mode).
 """
@@ -10,6 +11,12 @@ from django.urls import path, include
 from django.conf import settings
 from django_recipe_generator.recipe_generator import views
 
+if settings.ASYNC_VIEWS:
+    RecipeDetailView = views.AsyncRecipeDetailView
+    RecipeList = views.AsyncRecipeList
+else:
+    RecipeDetailView = views.RecipeDetailView
+    RecipeList = views.RecipeList
 
 recipe_patterns = [
     path('new/', views.RecipeCreateView.as_view(), name='add_recipe'),
@@ -25,12 +32,23 @@ recipe_patterns = [
     ),
     path(
         '<int:pk>/',
-        views.RecipeDetailView.as_view(),
+        RecipeDetailView.as_view(),
         name='recipe_detail'
     ),
+    path(
+        '<int:pk>/status/',
+        views.recipe_status_stream,
+        name='recipe_status_stream'
+    ),
+    path(
+        '<int:pk>/status/current/',
+        views.recipe_status,
+        name='recipe_status'
+    ),
+    path('status/', views.user_status_stream, name='user_status_stream'),
     path(
         '',
-        views.RecipeList.as_view(),
+        RecipeList.as_view(),
         name='recipe_list'),  # Search page/all recipes by default
 ]
 
@@ -3,16 +3,30 @@
 Views for recipe creation, editing, deletion,
 listing, and detail display.
 
-Handles form processing, session tracking, and filtering logic.
+Handles form processing, search navigation, and filtering logic.
 """
 
+from functools import wraps
+
 from django.shortcuts import render, redirect
-from urllib.parse import urlencode
 
-from django_recipe_generator.services.ingredients import annotate_recipes
-from django_recipe_generator.services.gemini_client import get_unexpected_twist
+from asgiref.sync import sync_to_async
+from django_recipe_generator import metrics, tracing
+from django_recipe_generator.services import (
+    keyset, navigation, recipe_cache, search_cache)
+from django_recipe_generator.services.conditional import (
+    make_etag, not_modified, set_validators)
+from django_recipe_generator.services.ingredients import (
+    aannotate_recipes, annotate_recipes)
+from django_recipe_generator.services.twist_status import (
+    astatus_events, current_status, recipe_channel, user_channel)
+from django.conf import settings
+from django.contrib.auth.decorators import login_required
 from django.db.models import Prefetch
+from django.http import Http404, JsonResponse, StreamingHttpResponse
+from django.template.loader import render_to_string
 from django.urls import reverse, reverse_lazy
+from django.utils.functional import SimpleLazyObject
 from django.views.generic import DeleteView, DetailView, ListView
 from django.views.generic.edit import CreateView, UpdateView
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
@@ -93,11 +107,19 @@ class RecipeCreateView(LoginRequiredMixin, CreateView):
 
 
 class RecipeDetailView(DetailView):
-    """Display full details of a recipe with its ingredients."""
+    """Display full details of a recipe with its ingredients.
+
+    The recipe itself is rendered as a fragment cached per recipe version,
+    so hot recipes are served without ORM queries; only the back URL (from
+    the search navigation cookie) is computed per request. The ETag
+    combines both, so clients revalidating an unchanged page get a 304.
+    """
 
     model = Recipe
     template_name = 'recipe_generator/recipe_detail.html'
+    content_template_name = 'recipe_generator/recipe_detail_content.html'
     context_object_name = 'recipe'
+    replica_methods = ('GET', 'HEAD')  # see db_router
 
     def get_queryset(self):
         """Optimize ingredient fetching with prefetch."""
@@ -108,30 +130,146 @@ class RecipeDetailView(DetailView):
             )
         )
 
+    def get(self, request, *args, **kwargs):
+        """Render the recipe from its cached fragment when possible."""
+        pk = self.kwargs['pk']
+        self.object = None
+        version = recipe_cache.get_version(pk)
+        if version is None:
+            # look the recipe up before stamping it: no stamps for unknown ids
+            self.object = self.get_object()
+            version = recipe_cache.create_version(pk)
+        self.back_url = navigation.back_url(request)
+        etag = make_etag(pk, version, self.back_url, settings.ASYNC_VIEWS)
+        response = not_modified(request, etag)
+        if response is not None:
+            return response
+
+        content = recipe_cache.get_fragment(pk, version)
+        if content is None:
+            self.object = self.object or self.get_object()
+            content = self.render_content()
+            recipe_cache.set_fragment(pk, version, content)
+        return set_validators(
+            self.render_to_response(self.get_cached_context_data(content)), etag)
+
+    def get_cached_context_data(self, content):
+        """Context around the rendered fragment.
+
+        On a cache hit ``recipe`` is only fetched if something reads it,
+        e.g. tests or debug tooling; the page template itself does not.
+        """
+        context = self.get_context_data(recipe_content=content)
+        if self.object is None:
+            context['recipe'] = SimpleLazyObject(self.get_object)
+        return context
+
+    def render_content(self):
+        """Render the cacheable (request independent) part of the page."""
+        return render_to_string(self.content_template_name,
+                                {'recipe': self.object})
+
     def get_context_data(self, **kwargs):
-        """Inject back URL logic (depend on the prev page) for navigation context."""
+        """Inject the back URL and how the page follows the twist status.
+
+        The status is streamed only when the async views serve the stream;
+        sync workers would each be held by one open page, so pages poll
+        ``recipe_status`` instead.
+        """
         context = super().get_context_data(**kwargs)
-        request = self.request
-
-        if request.session.get('came_from_search'):
-            if request.session.get('was_editing'):
-                search_params = request.session.get('search_params', {})
-
-                back_url = (
-                    reverse('recipe_list') + f"?{urlencode(search_params, doseq=True)}"
-                    if search_params else reverse('recipe_list')
-                )
-                context['back_url'] = back_url
-                request.session.pop('was_editing', None)
-            else:
-                context['back_url'] = (
-                    request.META.get('HTTP_REFERER') or reverse('recipe_list')
-                )
-        else:
-            context['back_url'] = reverse('index')
+        context['recipe_id'] = self.kwargs['pk']
+        context['back_url'] = self.back_url
+        context['status_stream'] = settings.ASYNC_VIEWS
+        context['status_poll_interval'] = settings.TWIST_STATUS_POLL_INTERVAL * 1000
         return context
 
 
+class AsyncRecipeDetailView(RecipeDetailView):
+    """Async RecipeDetailView for ASGI deployments (``ASYNC_VIEWS``)."""
+
+    async def get(self, request, *args, **kwargs):
+        """Fetch the recipe with the async ORM (on a cache miss) and render it."""
+        pk = kwargs['pk']
+        self.object = None
+        version = await sync_to_async(recipe_cache.get_version)(pk)
+        if version is None:
+            self.object = await self.aget_object()
+            version = await sync_to_async(recipe_cache.create_version)(pk)
+        self.back_url = navigation.back_url(request)
+        etag = make_etag(pk, version, self.back_url, settings.ASYNC_VIEWS)
+        response = not_modified(request, etag)
+        if response is not None:
+            return response
+
+        content = await sync_to_async(recipe_cache.get_fragment)(pk, version)
+        if content is None:
+            self.object = self.object or await self.aget_object()
+            content = self.render_content()
+            await sync_to_async(recipe_cache.set_fragment)(pk, version, content)
+        return set_validators(
+            self.render_to_response(self.get_cached_context_data(content)), etag)
+
+    async def aget_object(self):
+        """``get_object`` with the async ORM."""
+        try:
+            return await self.get_queryset().aget(pk=self.kwargs['pk'])
+        except Recipe.DoesNotExist:
+            raise Http404("No recipe found matching the query")
+
+
+def asgi_only(view):
+    """404 unless served by the async workers (``ASYNC_VIEWS``).
+
+    An open stream would hold a sync worker for up to ``SSE_STREAM_TIMEOUT``
+    seconds; under WSGI recipe pages poll ``recipe_status`` instead.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not settings.ASYNC_VIEWS:
+            raise Http404("Status streams are only served in ASGI mode")
+        return view(request, *args, **kwargs)
+    return wrapper
+
+
+def _event_stream(channel, **kwargs):
+    """SSE response, async so that idle clients hold no worker thread."""
+    response = StreamingHttpResponse(astatus_events(channel, **kwargs),
+                                     content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # let nginx pass events through
+    return response
+
+
+@asgi_only
+def recipe_status_stream(request, pk):
+    """Stream AI twist status changes of one recipe as server-sent events.
+
+    Sends the current status first and closes once it is completed/failed.
+    """
+    if not Recipe.objects.filter(pk=pk).exists():
+        raise Http404("No recipe found matching the query")
+    return _event_stream(recipe_channel(pk),
+                         initial=lambda: current_status(pk),
+                         until_terminal=True)
+
+
+def recipe_status(request, pk):
+    """Return the current AI twist status of one recipe as JSON, for polling."""
+    status = current_status(pk)
+    if status is None:
+        raise Http404("No recipe found matching the query")
+    response = JsonResponse(status)
+    response['Cache-Control'] = 'no-cache'
+    return response
+
+
+@asgi_only
+@login_required
+def user_status_stream(request):
+    """Stream AI twist status changes of all recipes of the current user."""
+    return _event_stream(user_channel(request.user.pk))
+
+
 class RecipeEditView(LoginRequiredMixin, OwnerOrAdminRequiredMixin, UpdateView):
     """View for editing an existing recipe and its ingredients."""
 
@@ -168,7 +306,6 @@ class RecipeEditView(LoginRequiredMixin, OwnerOrAdminRequiredMixin, UpdateView):
                         self.object.ingredients.add(ing, through_defaults={'quantity': qty})
                     self.object.ingredients.add(ing, through_defaults={'quantity': qty})
 
-            self.request.session['was_editing'] = True
             return redirect(reverse(
                 'recipe_detail',
                 kwargs={'pk': self.object.pk}
@@ -196,49 +333,84 @@ class RecipeList(ListView):
     paginate_by = 15
     template_name = "recipe_generator/recipe_list.html"
     context_object_name = 'recipes'
+    replica_methods = ('GET', 'HEAD')  # see db_router
 
     def get(self, request, *args, **kwargs):
-        """Track session origin and store query params."""
-        request.session['came_from_search'] = True
-        allowed_params = {
-            k: request.GET.getlist(k) for k in ALLOWED_SEARCH_PARAMS
-            if k in request.GET and any(request.GET.getlist(k))
+        """Render the results and remember the search for the back link."""
+        return navigation.remember_search(
+            super().get(request, *args, **kwargs), self.get_search_params())
+
+    def get_search_params(self):
+        """Return the search's query params, kept for the detail page back link."""
+        return {
+            k: self.request.GET.getlist(k) for k in ALLOWED_SEARCH_PARAMS
+            if k in self.request.GET and any(self.request.GET.getlist(k))
         }
-        request.session['search_params'] = allowed_params
-        return super().get(request, *args, **kwargs)
 
-    def get_queryset(self):
-        """Apply filters and search for name, ingredients, time, and exclusions."""
-        query_ingredients = [
+    def get_query_ingredients(self):
+        """Ingredient IDs the user has (the search pantry)."""
+        return [
             int(i) for i in self.request.GET.getlist('query_ingredients')
             if i.isdigit()
         ]
-        exclude_ingredients = [
-            int(i) for i in self.request.GET.getlist('exclude_ingredients')
-            if i.isdigit()
-        ]
-        query_name = self.request.GET.get('query_name', '')
-        time_filter = self.request.GET.get('cooking_time')
 
+    def get_search_spec(self):
+        """Return the normalized search of the request (`search_cache.search_spec`)."""
+        return search_cache.search_spec(
+            query_name=self.request.GET.get('query_name', ''),
+            query_ingredients=self.get_query_ingredients(),
+            time_filter=self.request.GET.get('cooking_time'),
+            exclude_ingredients=[
+                i for i in self.request.GET.getlist('exclude_ingredients')
+                if i.isdigit()
+            ],
+        )
+
+    def get_search_queryset(self):
+        """Apply filters and search for name, ingredients, time, and exclusions."""
         ingredient_qs = Ingredient.objects.only('id', 'name')
 
-        qs = Recipe.objects.search(
-            query_name=query_name,
-            query_ingredients=query_ingredients
-        ).filter_recipes(
-            time_filter=time_filter,
-            exclude_ingredients=exclude_ingredients
-        ).prefetch_related(
+        qs = search_cache.search_queryset(self.get_search_spec()).prefetch_related(
             Prefetch("ingredients", queryset=ingredient_qs))
 
-        if query_ingredients:
-            qs = annotate_recipes(qs, query_ingredients)
-
         return qs
 
+    def get_queryset(self):
+        """Search queryset; ingredient analysis is added to the page only."""
+        return self.get_search_queryset()
+
+    def paginate_queryset(self, queryset, page_size):
+        """Keyset page at ``?cursor=`` instead of an OFFSET page."""
+        with (metrics.SEARCH_DURATION.labels('recipe_list').time(),
+              tracing.span('search.fetch_page')):
+            try:
+                page = search_cache.paginate(queryset, self.get_search_spec(),
+                                             self.request.GET.get('cursor', ''),
+                                             page_size)
+            except keyset.InvalidCursor:
+                raise Http404("Invalid cursor")
+
+        query_ingredients = self.get_query_ingredients()
+        if query_ingredients:
+            annotate_recipes(page.object_list, query_ingredients)
+        return (None, page, page.object_list, page.has_other_pages())
+
+    def get_page_urls(self, page):
+        """Links to the first, previous and next page keeping the search."""
+        params = self.request.GET.copy()
+        params.pop('cursor', None)
+        urls = {'first_page_url': f"?{params.urlencode()}"}
+        for name, cursor in (('previous_page_url', page.previous_cursor),
+                             ('next_page_url', page.next_cursor)):
+            if cursor:
+                params['cursor'] = cursor
+                urls[name] = f"?{params.urlencode()}"
+        return urls
+
     def get_context_data(self, **kwargs):
         """Add filter- and search- related data to context."""
         context = super().get_context_data(**kwargs)
+        context.update(self.get_page_urls(context['page_obj']))
 
         context['current_cooking_time'] = self.request.GET.get(
             'cooking_time', ''
@@ -255,6 +427,44 @@ class RecipeList(ListView):
         return context
 
 
+class AsyncRecipeList(RecipeList):
+    """Async RecipeList for ASGI deployments (``ASYNC_VIEWS``).
+
+    Only the requested page is fetched and annotated, with the async ORM.
+    """
+
+    async def get(self, request, *args, **kwargs):
+        """Render one page of search results and remember the search."""
+        self.object_list = self.get_search_queryset()
+        self.page_context = await self.apaginate_queryset(
+            self.object_list, self.get_paginate_by(self.object_list)
+        )
+
+        context = self.get_context_data()
+        return navigation.remember_search(self.render_to_response(context),
+                                          self.get_search_params())
+
+    async def apaginate_queryset(self, queryset, page_size):
+        """Async counterpart of ``RecipeList.paginate_queryset``."""
+        with (metrics.SEARCH_DURATION.labels('recipe_list').time(),
+              tracing.span('search.fetch_page')):
+            try:
+                page = await search_cache.apaginate(
+                    queryset, self.get_search_spec(),
+                    self.request.GET.get('cursor', ''), page_size)
+            except keyset.InvalidCursor:
+                raise Http404("Invalid cursor")
+
+        query_ingredients = self.get_query_ingredients()
+        if query_ingredients:
+            await aannotate_recipes(page.object_list, query_ingredients)
+        return (None, page, page.object_list, page.has_other_pages())
+
+    def paginate_queryset(self, queryset, page_size):
+        """Return the page already fetched in ``get``."""
+        return self.page_context
+
+
 class IngredientCreateView(LoginRequiredMixin, CreateView):
     """View for creating a new ingredient."""
 
@@ -337,10 +547,10 @@ class IngredientListView(ListView):
 
 def index_view(request):
     """Render homepage and clear search tracking."""
-    if 'came_from_search' in request.session:
-        request.session.pop('came_from_search', None)
-        request.session.pop('search_params', None)
-    return render(request, 'recipe_generator/index.html')
+    response = render(request, 'recipe_generator/index.html')
+    if navigation.COOKIE_NAME in request.COOKIES:
+        navigation.forget_search(response)
+    return response
 
 
 def register(request):
@@ -0,0 +1,217 @@
+"""Redis cache backend of the cache tiers, and stampede protection.
+
+``CACHES`` (see settings) has one alias per tier (``default``, ``search``,
+``llm``, ``sessions``), all in the same Redis database and told apart by
+their key prefix, which includes ``DEPLOY_ID`` for the tiers whose values
+depend on the code. The backend adds to Django's ``RedisCache``:
+
+- one connection pool per process and server, shared by all aliases and
+  threads (Django creates cache objects, and pools, per thread),
+- zlib compression of pickled values above ``CACHE_COMPRESS_MIN_SIZE``,
+- failing soft: with Redis down reads miss and writes are dropped, so
+  pages are computed instead of failing,
+- ``clear()`` deletes the keys of its own tier only, not the whole
+  database (which also holds the Celery queue).
+
+``get_or_compute`` caches an expensive value so that only one process
+recomputes it when it expires or is invalidated, while the others keep
+serving the stale one, and refreshes popular values before they expire.
+"""
+import logging
+import math
+import pickle
+import random
+import time
+import zlib
+
+import redis
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django.core.cache.backends.redis import RedisCache, RedisSerializer
+
+logger = logging.getLogger(__name__)
+
+COMPRESSED = b'z'  # marker of compressed values; pickles start with b'\x80'
+
+LOCK_POLL_INTERVAL = 0.05
+
+
+class CompressingSerializer(RedisSerializer):
+    """Pickle values, zlib compressing those above ``CACHE_COMPRESS_MIN_SIZE``."""
+
+    def __init__(self, protocol=None):
+        """Read the compression threshold from the settings."""
+        super().__init__(protocol)
+        self.min_size = settings.CACHE_COMPRESS_MIN_SIZE
+
+    def dumps(self, obj):
+        data = super().dumps(obj)
+        if self.min_size and isinstance(data, bytes) and len(data) >= self.min_size:
+            return COMPRESSED + zlib.compress(data)
+        return data
+
+    def loads(self, data):
+        if data[:1] == COMPRESSED:
+            return pickle.loads(zlib.decompress(data[1:]))
+        return super().loads(data)
+
+
+class SharedConnectionPool(redis.ConnectionPool):
+    """Connection pool shared by every cache using the same server and options."""
+
+    _pools = {}
+
+    @classmethod
+    def from_url(cls, url, **kwargs):
+        """Return the process' pool for ``url``, created on first use."""
+        key = (url, tuple(sorted(kwargs.items())))
+        if key not in cls._pools:
+            cls._pools[key] = super().from_url(url, **kwargs)
+        return cls._pools[key]
+
+
+class TieredRedisCache(RedisCache):
+    """``RedisCache`` failing soft and clearing its own keys only."""
+
+    def get(self, key, default=None, version=None):
+        try:
+            return super().get(key, default, version)
+        except redis.RedisError as exc:
+            self.unavailable(exc)
+            return default
+
+    def get_many(self, keys, version=None):
+        try:
+            return super().get_many(keys, version)
+        except redis.RedisError as exc:
+            self.unavailable(exc)
+            return {}
+
+    def has_key(self, key, version=None):
+        try:
+            return super().has_key(key, version)
+        except redis.RedisError as exc:
+            self.unavailable(exc)
+            return False
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        try:
+            return super().add(key, value, timeout, version)
+        except redis.RedisError as exc:
+            self.unavailable(exc)
+            return False
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        try:
+            super().set(key, value, timeout, version)
+        except redis.RedisError as exc:
+            self.unavailable(exc)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        try:
+            return super().set_many(data, timeout, version)
+        except redis.RedisError as exc:
+            self.unavailable(exc)
+            return list(data)
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        try:
+            return super().touch(key, timeout, version)
+        except redis.RedisError as exc:
+            self.unavailable(exc)
+            return False
+
+    def delete(self, key, version=None):
+        try:
+            return super().delete(key, version)
+        except redis.RedisError as exc:
+            self.unavailable(exc)
+            return False
+
+    def delete_many(self, keys, version=None):
+        try:
+            super().delete_many(keys, version)
+        except redis.RedisError as exc:
+            self.unavailable(exc)
+
+    def clear(self):
+        """Delete the keys of this cache's tier (its key prefix)."""
+        client = self._cache.get_client(write=True)
+        keys = list(client.scan_iter(match=f'{self.key_prefix}:*', count=1000))
+        for start in range(0, len(keys), 1000):
+            client.unlink(*keys[start:start + 1000])
+        return True
+
+    def unavailable(self, exc):
+        logger.warning("Cache '%s' unavailable: %s", self.key_prefix, exc)
+
+
+def get_or_compute(key, compute, timeout, stale_timeout=None, alias='default',
+                   lock_timeout=30, generation=None, refresh=None, beta=1.0):
+    """Return the value of ``key`` in cache ``alias``, computing it if needed.
+
+    Values are fresh for ``timeout`` seconds and kept ``stale_timeout``
+    seconds longer (default: ``timeout``); values stored under another
+    ``generation`` are stale too, which invalidates them without losing
+    them. The first caller to find a value stale or missing takes a lock on
+    the key and recomputes it; meanwhile the others get the stale value
+    (stale-while-revalidate) or, on a cold miss, wait up to ``lock_timeout``
+    seconds for the lock holder's value.
+
+    Fresh values are also refreshed early, with a probability growing as
+    their expiry nears and with the time they took to compute (XFetch,
+    ``beta`` > 1 favours earlier refreshes). The lock holder calls
+    ``refresh()`` for that, e.g. to queue a task running ``recompute``, or
+    recomputes the value itself if there is no ``refresh``.
+    """
+    cache = caches[alias]
+    lock_key = f'{key}:lock'
+    entry = cache.get(key)
+    if entry is not None:
+        value, fresh_until, delta, entry_generation = entry
+        now = time.time()
+        stale = now >= fresh_until or entry_generation != generation
+        # XFetch: -log(u) is exponentially distributed, mean 1
+        early = not stale and now - delta * beta * math.log(
+            1 - random.random()) >= fresh_until
+        if not (stale or early):
+            return value
+        if not cache.add(lock_key, 1, lock_timeout):
+            return value  # another process is recomputing it
+        if early and refresh is not None:
+            refresh()
+            return value
+        return recompute(key, compute, timeout, stale_timeout, alias, generation)
+
+    if cache.add(lock_key, 1, lock_timeout):
+        return recompute(key, compute, timeout, stale_timeout, alias, generation)
+    deadline = time.monotonic() + lock_timeout
+    while time.monotonic() < deadline:
+        time.sleep(LOCK_POLL_INTERVAL)
+        entry = cache.get(key)
+        if entry is not None:
+            return entry[0]
+        if not cache.has_key(lock_key):
+            break
+    entry = cache.get(key)
+    if entry is not None:
+        return entry[0]
+    # the lock holder failed or took too long
+    return recompute(key, compute, timeout, stale_timeout, alias, generation)
+
+
+def recompute(key, compute, timeout, stale_timeout=None, alias='default',
+              generation=None):
+    """Compute and cache the value of ``key``, then release the key's lock."""
+    cache = caches[alias]
+    stale_timeout = timeout if stale_timeout is None else stale_timeout
+    try:
+        started = time.time()
+        value = compute()
+        delta = time.time() - started
+        cache.set(key, (value, started + delta + timeout, delta, generation),
+                  timeout + stale_timeout)
+        return value
+    finally:
+        cache.delete(f'{key}:lock')
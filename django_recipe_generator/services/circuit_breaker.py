@@ -0,0 +1,126 @@
+"""Circuit breaker with state shared between processes through Redis.
+
+Closed: calls go through, retryable failures are counted in a sliding
+window. Once the threshold is reached the circuit opens and every worker
+fast-fails until the recovery timeout expires. Afterwards a single probe
+call is let through (half-open); its success closes the circuit, its
+failure opens it again. A probe ending any other way (an error that says
+nothing about the upstream's health) must release the probe so that the
+next call can probe instead.
+
+If Redis itself is unreachable the breaker fails open so that a broker
+hiccup never blocks generation completely.
+"""
+import logging
+import time
+
+import redis
+from django.conf import settings
+
+from django_recipe_generator.services.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitOpenError(Exception):
+    """Raised when a call is rejected because the circuit is open."""
+
+    def __init__(self, name, retry_after):
+        """Store the circuit name and seconds until the next probe."""
+        self.name = name
+        self.retry_after = retry_after
+        super().__init__(f"Circuit '{name}' is open, retry in {retry_after}s")
+
+
+class CircuitBreaker:
+    """Redis-backed circuit breaker identified by ``name``."""
+
+    def __init__(self, name, failure_threshold, failure_window,
+                 recovery_timeout, client=None):
+        """Configure thresholds (seconds); ``client`` defaults to shared Redis."""
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.failure_window = failure_window
+        self.recovery_timeout = recovery_timeout
+        self._client = client
+
+    @property
+    def client(self):
+        return self._client or get_redis()
+
+    def _key(self, suffix):
+        return f"circuit:{self.name}:{suffix}"
+
+    def retry_after(self):
+        """Seconds until the open circuit allows a probe call (0 if closed)."""
+        try:
+            ttl = self.client.ttl(self._key('open'))
+        except redis.RedisError:
+            return 0
+        return max(ttl, 0)
+
+    def before_call(self):
+        """Raise ``CircuitOpenError`` unless a call may go upstream now.
+
+        Return True if the call is the half-open probe.
+        """
+        try:
+            if self.client.exists(self._key('open')):
+                raise CircuitOpenError(self.name, self.retry_after() or 1)
+            if self.client.exists(self._key('tripped')):
+                # half-open: only one worker gets to probe the upstream
+                if not self.client.set(self._key('probe'), 1, nx=True,
+                                       ex=self.recovery_timeout):
+                    raise CircuitOpenError(self.name, self.recovery_timeout)
+                return True
+        except redis.RedisError as exc:
+            logger.warning("Circuit breaker '%s' unavailable: %s", self.name, exc)
+        return False
+
+    def release_probe(self):
+        """Let another call probe, without changing the circuit's state."""
+        try:
+            self.client.delete(self._key('probe'))
+        except redis.RedisError as exc:
+            logger.warning("Circuit breaker '%s' unavailable: %s", self.name, exc)
+
+    def record_success(self):
+        """Close the circuit and reset the failure counter."""
+        try:
+            self.client.delete(self._key('failures'), self._key('open'),
+                               self._key('tripped'), self._key('probe'))
+        except redis.RedisError as exc:
+            logger.warning("Circuit breaker '%s' unavailable: %s", self.name, exc)
+
+    def record_failure(self):
+        """Count a failure and open the circuit once the threshold is hit."""
+        try:
+            pipe = self.client.pipeline()
+            pipe.incr(self._key('failures'))
+            pipe.expire(self._key('failures'), self.failure_window, nx=True)
+            pipe.exists(self._key('tripped'))
+            failures, _, tripped = pipe.execute()
+
+            if tripped or failures >= self.failure_threshold:
+                self.open()
+        except redis.RedisError as exc:
+            logger.warning("Circuit breaker '%s' unavailable: %s", self.name, exc)
+
+    def open(self):
+        """Open the circuit for ``recovery_timeout`` seconds."""
+        logger.warning("Circuit '%s' opened for %ss", self.name,
+                       self.recovery_timeout)
+        pipe = self.client.pipeline()
+        pipe.set(self._key('open'), int(time.time()), ex=self.recovery_timeout)
+        # remembers the trip after 'open' expires, until a probe succeeds
+        pipe.set(self._key('tripped'), 1)
+        pipe.delete(self._key('probe'), self._key('failures'))
+        pipe.execute()
+
+
+gemini_breaker = CircuitBreaker(
+    'gemini',
+    failure_threshold=settings.GEMINI_CIRCUIT_FAILURE_THRESHOLD,
+    failure_window=settings.GEMINI_CIRCUIT_FAILURE_WINDOW,
+    recovery_timeout=settings.GEMINI_CIRCUIT_RECOVERY_TIMEOUT,
+)
@@ -0,0 +1,31 @@
+"""HTTP validators (ETag/Last-Modified) and 304 Not Modified responses."""
+import hashlib
+
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+
+def make_etag(*parts):
+    """Strong ETag from the parts that determine a representation."""
+    key = ':'.join(str(part) for part in parts)
+    return quote_etag(hashlib.md5(key.encode(), usedforsecurity=False).hexdigest())
+
+
+def not_modified(request, etag, last_modified=None):
+    """Return a 304 (or 412) response if the client's copy is current, else None.
+
+    ``last_modified`` is a datetime, e.g. the object's ``updated_at``.
+    """
+    timestamp = int(last_modified.timestamp()) if last_modified else None
+    response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+    if response is not None:
+        set_validators(response, etag, last_modified)
+    return response
+
+
+def set_validators(response, etag, last_modified=None):
+    """Add ETag/Last-Modified headers to ``response``."""
+    response['ETag'] = etag
+    if last_modified:
+        response['Last-Modified'] = http_date(last_modified.timestamp())
+    return response
@@ -0,0 +1,72 @@
+"""Connection pools of the databases, and their health.
+
+With ``DB_POOL=psycopg`` (see settings) every database alias of a
+PostgreSQL database has a psycopg pool per process, created by Django
+on first use: requests borrow a connection for their duration instead of
+keeping one per thread. ``pool_stats`` reports what the pools hold and
+``health`` checks every database, pooled or not, for ``/health/db``.
+"""
+import logging
+import time
+
+from django.conf import settings
+from django.db import DatabaseError, connections
+
+logger = logging.getLogger(__name__)
+
+
+def pools():
+    """Yield ``(alias, pool)`` for the databases using a psycopg pool."""
+    for alias in settings.DATABASES:
+        connection = connections[alias]
+        if connection.vendor == 'postgresql' and \
+                connection.settings_dict['OPTIONS'].get('pool'):
+            yield alias, connection.pool
+
+
+def close_pools():
+    """Close the pools of this process, e.g. before forking workers from it.
+
+    A pool's connections and worker threads do not survive a fork; Django
+    creates new pools on the next use.
+    """
+    for alias, _pool in list(pools()):
+        connections[alias].close_pool()
+
+
+def pool_stats(pop=False):
+    """Return ``{alias: stats}`` of the pools, see ``ConnectionPool.get_stats``.
+
+    ``pop=True`` resets the counters (``requests_num``, ``usage_ms``...)
+    so they are only counted once.
+    """
+    return {alias: pool.pop_stats() if pop else pool.get_stats()
+            for alias, pool in pools()}
+
+
+def check(alias):
+    """Run ``SELECT 1`` on ``alias``: ``{ok, latency_ms}``, or ``{ok}`` if it fails.
+
+    The error is only logged, the response must not reveal driver or DSN
+    details.
+    """
+    started = time.monotonic()
+    try:
+        with connections[alias].cursor() as cursor:
+            cursor.execute('SELECT 1')
+            cursor.fetchone()
+    except DatabaseError as exc:
+        logger.warning("Database '%s' unavailable: %s", alias, exc)
+        return {'ok': False}
+    return {'ok': True, 'latency_ms': round((time.monotonic() - started) * 1000, 1)}
+
+
+def health():
+    """Check every database, with the pool statistics of the pooled ones."""
+    stats = pool_stats()
+    databases = {}
+    for alias in settings.DATABASES:
+        databases[alias] = check(alias)
+        if alias in stats:
+            databases[alias]['pool'] = stats[alias]
+    return databases
@@ -1,8 +1,34 @@
-from google import genai
+from functools import cache
 
+from django_recipe_generator import metrics, tracing
 
-# The client gets the API key from the environment variable `GEMINI_API_KEY`.
-client = genai.Client()
+# Rate limiting, upstream overload and gateway errors are worth retrying;
+# other 4xx (bad request, auth, quota config) will fail the same way again.
+RETRYABLE_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+
+
+@cache
+def get_client():
+    """Return the Gemini client, created on first use and cached per process.
+
+    The google-genai SDK is imported here rather than at module level so
+    web workers and management commands that never call Gemini don't pay
+    for it (nor need `GEMINI_API_KEY`).
+    """
+    from google import genai
+
+    # The client gets the API key from the environment variable `GEMINI_API_KEY`.
+    return genai.Client()
+
+
+def is_retryable_error(exc):
+    """Return True if a failed Gemini call may succeed when repeated."""
+    import httpx
+    from google.genai import errors
+
+    if isinstance(exc, errors.APIError):
+        return exc.code in RETRYABLE_STATUS_CODES
+    return isinstance(exc, (httpx.TimeoutException, httpx.TransportError))
 
 
 def get_unexpected_twist(title, ingredients):
@@ -51,12 +77,21 @@ def get_unexpected_twist(title, ingredients):
     for "twist_ingredient".
 
     """
-    response = client.models.generate_content(
-        model="gemini-2.5-flash",
-        contents=prompt,
-        config={
-            "response_mime_type": "application/json",
-            "response_schema": schema,
-        }
-    )
+    model = "gemini-2.5-flash"
+    with (tracing.span('gemini.generate_content', kind='client',
+                       attributes={'gen_ai.system': 'gemini',
+                                   'gen_ai.request.model': model}),
+          metrics.GEMINI_DURATION.time()):
+        try:
+            response = get_client().models.generate_content(
+                model=model,
+                contents=prompt,
+                config={
+                    "response_mime_type": "application/json",
+                    "response_schema": schema,
+                }
+            )
+        except Exception as exc:
+            metrics.GEMINI_ERRORS.labels(type(exc).__name__).inc()
+            raise
     return response.parsed
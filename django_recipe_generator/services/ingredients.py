@@ -1,6 +1,16 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+from django_recipe_generator import metrics, tracing
 from django_recipe_generator.recipe_generator.models import Ingredient
 
+CATALOGUE_KEY = 'ingredient-catalogue'
+CATALOGUE_FIELDS = ('id', 'name', 'category')
+
 
+@metrics.ANNOTATE_DURATION.time()
+@tracing.traced()
 def annotate_recipes(recipes, query_ingredient_ids):
     query_ingredients = set(query_ingredient_ids)
 
@@ -10,12 +20,40 @@ def annotate_recipes(recipes, query_ingredient_ids):
         i.id: i.name
         for i in ingredient_qs.filter(id__in=query_ingredients)
     }
+    return _annotate(recipes, query_ingredients, ingredient_lookup_query)
+
+
+async def aannotate_recipes(recipes, query_ingredient_ids):
+    """Async variant of ``annotate_recipes`` for already fetched recipes.
+
+    ``recipes`` must be a list whose ingredients were prefetched.
+    """
+    with metrics.ANNOTATE_DURATION.time(), tracing.span('aannotate_recipes'):
+        query_ingredients = set(query_ingredient_ids)
+
+        ingredient_qs = Ingredient.objects.only('id', 'name')
+
+        ingredient_lookup_query = {
+            i.id: i.name
+            async for i in ingredient_qs.filter(id__in=query_ingredients)
+        }
+        return _annotate(recipes, query_ingredients, ingredient_lookup_query)
+
+
+def match_ingredients(ingredient_ids, query_ingredients):
+    """Split a recipe's ingredient ids into those in the query and the rest.
+
+    ``ingredient_ids`` must be in id order so results match between callers.
+    """
+    ingredient_ids = set(ingredient_ids)
+    return (list(ingredient_ids & query_ingredients),
+            list(ingredient_ids - query_ingredients))
 
-    for r in recipes:
-        ingredients_ids = {i.id for i in r.ingredients.all()}
 
-        r.matching_ids = list(ingredients_ids & query_ingredients)
-        r.missing_ids = list(ingredients_ids - query_ingredients)
+def _annotate(recipes, query_ingredients, ingredient_lookup_query):
+    for r in recipes:
+        r.matching_ids, r.missing_ids = match_ingredients(
+            [i.id for i in r.ingredients.all()], query_ingredients)
 
         r.matching_ingredient_names = [
             ingredient_lookup_query[i]
@@ -27,3 +65,47 @@ def annotate_recipes(recipes, query_ingredient_ids):
             if ing.id in r.missing_ids
         ]
     return recipes
+
+
+def _from_row(row):
+    # like a queryset row; updated_at is deferred
+    return Ingredient.from_db(DEFAULT_DB_ALIAS, CATALOGUE_FIELDS, row)
+
+
+def ingredient_catalogue():
+    """Return all ingredients in id order, cached for ``INGREDIENT_CATALOGUE_TIMEOUT``.
+
+    Cached as ``(id, name, category)`` rows, dropped whenever an
+    ingredient changes (see ``invalidate_catalogue``).
+    """
+    rows = metrics.record_cache_lookup('ingredient_catalogue',
+                                       cache.get(CATALOGUE_KEY))
+    if rows is None:
+        rows = list(Ingredient.objects.order_by('id')
+                    .values_list(*CATALOGUE_FIELDS))
+        cache.set(CATALOGUE_KEY, rows, settings.INGREDIENT_CATALOGUE_TIMEOUT)
+    return [_from_row(row) for row in rows]
+
+
+def invalidate_catalogue():
+    """Drop the cached catalogue, now and after the transaction commits."""
+    cache.delete(CATALOGUE_KEY)
+    transaction.on_commit(lambda: cache.delete(CATALOGUE_KEY))
+
+
+def resolve_ingredients(ids):
+    """Return ``{id: Ingredient}`` for ``ids``, None for those that do not exist.
+
+    Taken from the cached catalogue if it is cached; the IDs it does not
+    have are fetched with one query (never one query per ID).
+    """
+    resolved = dict.fromkeys(ids)
+    rows = metrics.record_cache_lookup('ingredient_catalogue',
+                                       cache.get(CATALOGUE_KEY))
+    for row in rows or ():
+        if row[0] in resolved:
+            resolved[row[0]] = _from_row(row)
+    unresolved = [pk for pk, ingredient in resolved.items() if ingredient is None]
+    if unresolved:
+        resolved.update(Ingredient.objects.in_bulk(unresolved))
+    return resolved
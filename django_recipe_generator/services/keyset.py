@@ -0,0 +1,215 @@
+"""Keyset (cursor) pagination for recipe searches and listings.
+
+Pages are fetched with ``WHERE (keys) > (last row's keys)`` instead of
+``OFFSET``, so deep pages cost the same as the first one. Ingredient
+searches are ordered by ``(missing, id)``, everything else by ``id``.
+
+Counting the full search result is optional (``SEARCH_COUNT_MODE``):
+
+- ``exact``: ``COUNT(*)`` of the search query on every page,
+- ``approx``: the PostgreSQL planner estimate, or a cached exact count on
+  other databases,
+- ``none``: no count at all.
+
+``pk_batches`` walks a whole table the same way, in place of
+``.iterator()`` for batch jobs: without server-side cursors
+(``DB_POOL=pgbouncer``) ``.iterator()`` fetches the full result at once.
+"""
+import base64
+import binascii
+import hashlib
+import json
+from functools import reduce
+from operator import or_
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connections
+from django.db.models import Q
+
+from django_recipe_generator import metrics
+
+
+class InvalidCursor(ValueError):
+    """Raised for a cursor that was not produced by ``KeysetPage``."""
+
+
+def keyset_keys(queryset):
+    """Ordering keys: ``(missing, id)`` for ingredient searches, else ``id``."""
+    if 'missing' in queryset.query.annotations:
+        return ('missing', 'id')
+    return ('id',)
+
+
+def encode_cursor(values, reverse=False):
+    """Opaque cursor for the rows after (or, with ``reverse``, before) ``values``."""
+    payload = json.dumps({'v': list(values), 'r': reverse}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor, keys):
+    """Return ``(values, reverse)`` of a cursor; raises ``InvalidCursor``."""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        values, reverse = payload['v'], payload['r']
+    except (binascii.Error, ValueError, TypeError, KeyError):
+        raise InvalidCursor(cursor)
+    if not all([isinstance(values, list), isinstance(reverse, bool),
+                len(values) == len(keys),
+                all(type(v) is int for v in values)]):
+        raise InvalidCursor(cursor)
+    return values, reverse
+
+
+class KeysetPage:
+    """One page of rows with cursors to its neighbours.
+
+    Mirrors the parts of Django's ``Page`` used by templates
+    (``object_list``, ``has_next()``, ``has_previous()``).
+    """
+
+    def __init__(self, object_list, keys, has_next, has_previous):
+        """Wrap fetched rows; ``count`` is filled in by the caller if wanted."""
+        self.object_list = object_list
+        self.keys = keys
+        self._has_next = has_next
+        self._has_previous = has_previous
+        self.count = None
+        self.count_is_estimate = False
+
+    def __iter__(self):  # noqa: D105
+        return iter(self.object_list)
+
+    def __len__(self):  # noqa: D105
+        return len(self.object_list)
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_next or self._has_previous
+
+    def _cursor(self, obj, reverse):
+        if isinstance(obj, dict):  # .values() rows
+            return encode_cursor([obj[key] for key in self.keys], reverse)
+        return encode_cursor([getattr(obj, key) for key in self.keys], reverse)
+
+    @property
+    def next_cursor(self):
+        if self._has_next and self.object_list:
+            return self._cursor(self.object_list[-1], reverse=False)
+        return None
+
+    @property
+    def previous_cursor(self):
+        if self._has_previous and self.object_list:
+            return self._cursor(self.object_list[0], reverse=True)
+        return None
+
+
+def _after(keys, values, reverse):
+    """Row-value comparison ``(keys) > (values)`` (``<`` with ``reverse``)."""
+    lookup = 'lt' if reverse else 'gt'
+    return reduce(or_, (
+        Q(**dict(zip(keys[:i], values[:i])),
+          **{f'{keys[i]}__{lookup}': values[i]})
+        for i in range(len(keys))
+    ))
+
+
+def _page_queryset(queryset, cursor, page_size):
+    keys = keyset_keys(queryset)
+    values, reverse = decode_cursor(cursor, keys) if cursor else (None, False)
+    queryset = queryset.order_by(*(f'-{k}' if reverse else k for k in keys))
+    if values is not None:
+        queryset = queryset.filter(_after(keys, values, reverse))
+    # one extra row tells whether there is a page beyond this one
+    return keys, values, reverse, queryset[:page_size + 1]
+
+
+def _make_page(rows, keys, values, reverse, page_size):
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+    if reverse:
+        rows.reverse()
+        return KeysetPage(rows, keys, has_next=True, has_previous=has_more)
+    return KeysetPage(rows, keys, has_next=has_more,
+                      has_previous=values is not None)
+
+
+def paginate(queryset, cursor, page_size):
+    """Return the ``KeysetPage`` at ``cursor`` (the first page if empty)."""
+    keys, values, reverse, page_qs = _page_queryset(queryset, cursor, page_size)
+    return _make_page(list(page_qs), keys, values, reverse, page_size)
+
+
+async def apaginate(queryset, cursor, page_size):
+    """Async ``paginate``, fetching the rows with the async ORM."""
+    keys, values, reverse, page_qs = _page_queryset(queryset, cursor, page_size)
+    rows = [obj async for obj in page_qs]
+    return _make_page(rows, keys, values, reverse, page_size)
+
+
+def pk_batches(queryset, batch_size):
+    """Yield the primary keys of ``queryset`` in ascending lists of ``batch_size``.
+
+    Each batch is a query of its own, so no cursor or transaction is held
+    between batches.
+    """
+    queryset = queryset.order_by('pk').values_list('pk', flat=True)
+    last = None
+    while True:
+        page = queryset if last is None else queryset.filter(pk__gt=last)
+        batch = list(page[:batch_size])
+        if not batch:
+            return
+        yield batch
+        last = batch[-1]
+
+
+def planner_estimate(queryset):
+    """Row estimate of the PostgreSQL planner, or None on other databases."""
+    if connections[queryset.db].vendor != 'postgresql':
+        return None
+    plan = json.loads(queryset.order_by().explain(format='json'))
+    if isinstance(plan, list):
+        plan = plan[0]
+    return int(plan['Plan']['Plan Rows'])
+
+
+def _cached_count(queryset):
+    sql, params = queryset.order_by().query.sql_with_params()
+    digest = hashlib.md5(f"{sql}{params}".encode(), usedforsecurity=False)
+    key = f"search-count:{digest.hexdigest()}"
+    cache = caches['search']
+    count = metrics.record_cache_lookup('search_count', cache.get(key))
+    if count is None:
+        count = queryset.count()
+        cache.set(key, count, settings.SEARCH_COUNT_CACHE_TIMEOUT)
+    return count
+
+
+def count_results(queryset, mode=None):
+    """Return ``(count, is_estimate)`` of ``queryset`` per ``SEARCH_COUNT_MODE``."""
+    mode = mode or settings.SEARCH_COUNT_MODE
+    if mode == 'none':
+        return None, False
+    if mode == 'approx':
+        estimate = planner_estimate(queryset)
+        if estimate is not None:
+            return estimate, True
+        return _cached_count(queryset), True
+    return queryset.count(), False
+
+
+async def acount_results(queryset, mode=None):
+    """Async ``count_results``."""
+    mode = mode or settings.SEARCH_COUNT_MODE
+    if mode == 'exact':
+        return await queryset.acount(), False
+    return await sync_to_async(count_results)(queryset, mode)
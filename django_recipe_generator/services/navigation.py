@@ -0,0 +1,62 @@
+"""Search navigation state kept in a signed cookie instead of the session.
+
+The recipe list remembers the last search so the detail page can link back
+to it. Keeping that in the (database) session made every search page view
+a session write, usually an insert for anonymous visitors; a signed cookie
+carries the same state with no server-side storage at all.
+"""
+import json
+from urllib.parse import urlencode, urlsplit
+
+from django.conf import settings
+from django.urls import reverse
+from django.utils.http import url_has_allowed_host_and_scheme
+
+COOKIE_NAME = 'search_nav'
+COOKIE_SALT = 'recipe_generator.search_nav'
+
+
+def remember_search(response, params):
+    """Store the search ``params`` (lists per name) on ``response``."""
+    response.set_signed_cookie(
+        COOKIE_NAME, json.dumps(params, separators=(',', ':')), salt=COOKIE_SALT,
+        max_age=settings.SESSION_COOKIE_AGE, secure=settings.SESSION_COOKIE_SECURE,
+        httponly=True, samesite='Lax')
+    return response
+
+
+def saved_search(request):
+    """Return the params of the last search, or None if there was none."""
+    value = request.get_signed_cookie(COOKIE_NAME, default=None, salt=COOKIE_SALT)
+    if value is None:
+        return None
+    try:
+        params = json.loads(value)
+    except ValueError:
+        return None
+    return params if isinstance(params, dict) else None
+
+
+def forget_search(response):
+    """Drop the remembered search from the client."""
+    response.delete_cookie(COOKIE_NAME, samesite='Lax')
+    return response
+
+
+def back_url(request):
+    """Return the URL of the detail page's back link.
+
+    The referring search results page (it keeps the cursor) when the user
+    came from one, else the remembered search, e.g. after editing, else the
+    home page.
+    """
+    params = saved_search(request)
+    if params is None:
+        return reverse('index')
+    list_url = reverse('recipe_list')
+    referer = request.META.get('HTTP_REFERER', '')
+    if (urlsplit(referer).path == list_url and url_has_allowed_host_and_scheme(
+            referer, {request.get_host()}, request.is_secure())):
+        return referer
+    query = urlencode(params, doseq=True)
+    return f"{list_url}?{query}" if query else list_url
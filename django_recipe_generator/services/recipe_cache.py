@@ -0,0 +1,71 @@
+"""Versioned cache of rendered recipe detail fragments.
+
+Each recipe has a version stamp in the cache; changing the recipe, its
+ingredients or its AI twist drops the stamp, so the next read gets a new
+one and stale fragments are simply never looked up again (they expire).
+Stamps are random rather than counters: an evicted stamp must not come
+back as a value some old fragment was stored under. Stamps are only
+created for recipes that exist and expire with the fragments, so
+requests for unknown ids do not fill the cache.
+"""
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from django_recipe_generator import metrics
+
+
+def version_key(recipe_id):
+    """Cache key of the recipe's version stamp."""
+    return f"recipe-version:{recipe_id}"
+
+
+def fragment_key(recipe_id, version):
+    """Cache key of the detail fragment rendered at ``version``."""
+    return f"recipe-detail:{recipe_id}:{version}"
+
+
+def get_version(recipe_id):
+    """Return the recipe's version stamp, or None if it has none (yet)."""
+    return cache.get(version_key(recipe_id))
+
+
+def create_version(recipe_id):
+    """Stamp an existing recipe and return its version.
+
+    The stamp lives as long as a fragment (``RECIPE_FRAGMENT_CACHE_TIMEOUT``);
+    the recipe then simply gets a new one.
+    """
+    key = version_key(recipe_id)
+    version = uuid4().hex
+    if not cache.add(key, version, settings.RECIPE_FRAGMENT_CACHE_TIMEOUT):
+        version = cache.get(key, version)  # another worker won the race
+    return version
+
+
+def bump_version(*recipe_ids):
+    """Invalidate the cached fragments of ``recipe_ids``.
+
+    The stamp is dropped right away and again after the transaction
+    commits, so a concurrent read cannot re-cache pre-commit data under
+    a stamp created in between.
+    """
+    keys = [version_key(recipe_id) for recipe_id in recipe_ids]
+    if not keys:
+        return
+    cache.delete_many(keys)
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def get_fragment(recipe_id, version):
+    """Return the fragment rendered at ``version``, or None on a cache miss."""
+    return metrics.record_cache_lookup('recipe_fragment',
+                                       cache.get(fragment_key(recipe_id, version)))
+
+
+def set_fragment(recipe_id, version, html):
+    """Store the fragment rendered at ``version``."""
+    cache.set(fragment_key(recipe_id, version), html,
+              settings.RECIPE_FRAGMENT_CACHE_TIMEOUT)
@@ -0,0 +1,29 @@
+"""Shared Redis client used by services outside of Celery (breaker, pub/sub)."""
+import redis
+from django.conf import settings
+
+_client = None
+
+
+def get_redis():
+    """Return a process-wide Redis client, created on first use."""
+    global _client
+    if _client is None:
+        _client = redis.Redis.from_url(
+            settings.REDIS_URL,
+            socket_connect_timeout=1,
+            socket_timeout=1,
+        )
+    return _client
+
+
+def reset(disconnect=True):
+    """Forget the cached client, e.g. before/after a gunicorn fork.
+
+    With ``disconnect`` the pooled sockets are closed as well; a forked
+    child must not do that since the sockets still belong to its parent.
+    """
+    global _client
+    if _client is not None and disconnect:
+        _client.connection_pool.disconnect()
+    _client = None
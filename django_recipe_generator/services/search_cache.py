@@ -0,0 +1,176 @@
+"""Cached pages of recipe search results, safe from cache stampedes.
+
+A search page costs the ``search()`` aggregation over all recipes plus a
+count; what it yields is small: the ordering keys of the page's rows,
+whether there are neighbouring pages and the count. That is what gets
+cached (``search`` cache tier), per search, cursor and page size, and
+shared by the HTML list and the API ``filter_search``. Views then fetch
+their rows by primary key and annotate them as before.
+
+Recipe and ingredient changes bump a generation stamp that makes every
+cached page stale. ``caching.get_or_compute`` lets a single process
+recompute a stale page while the others keep serving the stale one, and
+refreshes popular pages shortly before they expire through the
+``refresh_search_page`` Celery task, so the database sees at most one
+recomputation per page and invalidation.
+"""
+import hashlib
+import json
+import logging
+from uuid import uuid4
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+from django_recipe_generator import metrics
+from django_recipe_generator.recipe_generator.models import Recipe
+from django_recipe_generator.services import caching, keyset
+
+logger = logging.getLogger(__name__)
+
+GENERATION_KEY = 'search-generation'
+
+
+def get_generation():
+    """Return the current generation stamp, creating it on first use."""
+    cache = caches['search']
+    generation = cache.get(GENERATION_KEY)
+    if generation is None:
+        generation = uuid4().hex
+        if not cache.add(GENERATION_KEY, generation, timeout=None):
+            generation = cache.get(GENERATION_KEY, generation)
+    return generation
+
+
+def invalidate():
+    """Make all cached search pages stale, now and after the transaction commits."""
+    cache = caches['search']
+    cache.delete(GENERATION_KEY)
+    transaction.on_commit(lambda: cache.delete(GENERATION_KEY))
+
+
+def search_spec(query_name='', query_ingredients=(), time_filter='',
+                exclude_ingredients=()):
+    """Return normalized search parameters, the same for equivalent searches."""
+    return {
+        'query_name': query_name or '',
+        'query_ingredients': sorted({int(i) for i in query_ingredients}),
+        'time_filter': time_filter or '',
+        'exclude_ingredients': sorted({int(i) for i in exclude_ingredients}),
+    }
+
+
+def search_queryset(spec):
+    """Return the recipes found by the search ``spec``, in no particular order."""
+    return Recipe.objects.search(
+        query_name=spec['query_name'],
+        query_ingredients=spec['query_ingredients']
+    ).filter_recipes(
+        time_filter=spec['time_filter'],
+        exclude_ingredients=spec['exclude_ingredients']
+    )
+
+
+def page_key(spec, cursor, page_size, count_mode):
+    """Cache key of one page of a search."""
+    payload = json.dumps([spec, cursor, page_size, count_mode], sort_keys=True)
+    digest = hashlib.md5(payload.encode(), usedforsecurity=False).hexdigest()
+    return f"search-page:{digest}"
+
+
+def compute_page(spec, cursor, page_size, count_mode):
+    """Run the search: ordering keys of the page rows, neighbours and count."""
+    # on the primary: a page computed on a lagging replica right after an
+    # invalidation would be cached without the change
+    queryset = search_queryset(spec).using(DEFAULT_DB_ALIAS)
+    keys = keyset.keyset_keys(queryset)
+    page = keyset.paginate(queryset.values(*keys), cursor, page_size)
+    count, count_is_estimate = keyset.count_results(queryset, count_mode)
+    return {
+        'rows': [[row[key] for key in keys] for row in page.object_list],
+        'has_next': page.has_next(),
+        'has_previous': page.has_previous(),
+        'count': count,
+        'count_is_estimate': count_is_estimate,
+    }
+
+
+def get_page(spec, cursor, page_size):
+    """Return the cached (or just computed) page of ``compute_page``.
+
+    Raises ``keyset.InvalidCursor`` for a bad cursor.
+    """
+    if cursor:
+        keyset.decode_cursor(cursor, keyset.keyset_keys(search_queryset(spec)))
+    count_mode = settings.SEARCH_COUNT_MODE
+    args = (spec, cursor, page_size, count_mode)
+    key = page_key(*args)
+    computed = False
+
+    def compute():
+        nonlocal computed
+        computed = True
+        return compute_page(*args)
+
+    page = caching.get_or_compute(
+        key, compute, settings.SEARCH_CACHE_TIMEOUT,
+        settings.SEARCH_CACHE_STALE_TIMEOUT, alias='search',
+        generation=get_generation(), refresh=lambda: queue_refresh(key, *args),
+        beta=settings.SEARCH_CACHE_XFETCH_BETA)
+    metrics.CACHE_REQUESTS.labels('search_page', 'miss' if computed else 'hit').inc()
+    return page
+
+
+def queue_refresh(key, *args):
+    """Recompute a page in the Celery worker (``refresh_search_page``)."""
+    from django_recipe_generator.recipe_generator.tasks import refresh_search_page
+
+    try:
+        refresh_search_page.apply_async(args, retry=False)
+    except Exception:
+        logger.warning("Cannot queue the refresh of %s", key, exc_info=True)
+        caches['search'].delete(f'{key}:lock')
+
+
+def refresh_page(spec, cursor, page_size, count_mode):
+    """Recompute and cache a page; called with its lock held."""
+    args = (spec, cursor, page_size, count_mode)
+    caching.recompute(page_key(*args), lambda: compute_page(*args),
+                      settings.SEARCH_CACHE_TIMEOUT,
+                      settings.SEARCH_CACHE_STALE_TIMEOUT, alias='search',
+                      generation=get_generation())
+
+
+def _page_of(page, rows_by_pk, queryset):
+    keys = keyset.keyset_keys(queryset)
+    rows = [rows_by_pk[values[-1]] for values in page['rows']
+            if values[-1] in rows_by_pk]  # minus rows deleted since
+    result = keyset.KeysetPage(rows, keys, page['has_next'], page['has_previous'])
+    result.count, result.count_is_estimate = page['count'], page['count_is_estimate']
+    return result
+
+
+def _pk(row):
+    return row['id'] if isinstance(row, dict) else row.pk
+
+
+def paginate(queryset, spec, cursor, page_size):
+    """``keyset.paginate`` and ``count_results`` of the search ``spec``.
+
+    ``queryset`` is the view's version of the search (``.values()`` rows,
+    prefetches); only the page's rows are fetched from it, by primary key.
+    """
+    page = get_page(spec, cursor, page_size)
+    ids = [values[-1] for values in page['rows']]
+    rows = {_pk(row): row for row in queryset.filter(pk__in=ids)}
+    return _page_of(page, rows, queryset)
+
+
+async def apaginate(queryset, spec, cursor, page_size):
+    """Async ``paginate``, fetching the rows with the async ORM."""
+    page = await sync_to_async(get_page)(spec, cursor, page_size)
+    ids = [values[-1] for values in page['rows']]
+    rows = {_pk(row): row async for row in queryset.filter(pk__in=ids)}
+    return _page_of(page, rows, queryset)
@@ -0,0 +1,128 @@
+"""AI twist status notifications: Redis pub/sub fanned out as server-sent events.
+
+``generate_ai_twist`` publishes every ``ai_generation_status`` transition to
+a per-recipe and a per-owner channel; in ASGI mode the SSE views stream
+those messages so clients no longer poll the recipe detail page (WSGI
+deployments poll ``current_status``, a stream would hold a sync worker).
+"""
+import json
+import logging
+import time
+
+import redis
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from django_recipe_generator.recipe_generator.models import Recipe
+from django_recipe_generator.services.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+TERMINAL_STATUSES = ('completed', 'failed')
+
+# EventSource reconnect delay (ms) after a stream ends or drops
+RETRY_MS = 3000
+
+
+def recipe_channel(recipe_id):
+    """Pub/sub channel with status changes of a single recipe."""
+    return f"twist-status:recipe:{recipe_id}"
+
+
+def user_channel(user_id):
+    """Pub/sub channel with status changes of all recipes of a user."""
+    return f"twist-status:user:{user_id}"
+
+
+def status_message(recipe_id, status, elevating_twist=None):
+    """Payload of a status event; the twist is only sent once completed."""
+    message = {'recipe_id': recipe_id, 'status': status}
+    if status == 'completed':
+        message['elevating_twist'] = elevating_twist
+    return message
+
+
+def current_status(recipe_id):
+    """Status payload read from the database, or None if the recipe is gone."""
+    row = Recipe.objects.filter(pk=recipe_id).values_list(
+        'ai_generation_status', 'elevating_twist').first()
+    return status_message(recipe_id, *row) if row else None
+
+
+def publish_status(recipe_id, owner_id, status, elevating_twist=None):
+    """Announce a status transition to the recipe's and its owner's channels.
+
+    Notifications are best effort: the database stays the source of truth
+    and a Redis outage must not fail the Celery task.
+    """
+    data = json.dumps(status_message(recipe_id, status, elevating_twist))
+    try:
+        pipe = get_redis().pipeline(transaction=False)
+        pipe.publish(recipe_channel(recipe_id), data)
+        if owner_id is not None:
+            pipe.publish(user_channel(owner_id), data)
+        pipe.execute()
+    except redis.RedisError as e:
+        logger.warning("Could not publish twist status of recipe %s: %s",
+                       recipe_id, e)
+
+
+def format_event(data, event='status'):
+    """Serialize one SSE frame; ``data`` is an already JSON-encoded string."""
+    return f"event: {event}\ndata: {data}\n\n"
+
+
+def _is_terminal(data):
+    return json.loads(data).get('status') in TERMINAL_STATUSES
+
+
+async def astatus_events(channel, initial=None, until_terminal=False):
+    """Yield SSE frames for messages published on ``channel``.
+
+    ``initial`` returns the current state and is called after subscribing,
+    so no transition is lost in between. The stream ends on a terminal
+    status (with ``until_terminal``) or after ``SSE_STREAM_TIMEOUT``
+    seconds; EventSource then reconnects by itself. Async, for the ASGI
+    workers: waiting clients hold no thread.
+    """
+    import redis.asyncio
+
+    yield f"retry: {RETRY_MS}\n\n"
+    client = redis.asyncio.Redis.from_url(settings.REDIS_URL,
+                                          socket_connect_timeout=1)
+    pubsub = client.pubsub(ignore_subscribe_messages=True)
+    try:
+        try:
+            await pubsub.subscribe(channel)
+        except redis.RedisError as e:
+            logger.warning("Twist status stream unavailable: %s", e)
+            pubsub = None
+
+        if initial is not None:
+            state = await sync_to_async(initial)()
+            if state is None:
+                return
+            data = json.dumps(state)
+            yield format_event(data)
+            if until_terminal and _is_terminal(data):
+                return
+        if pubsub is None:
+            return
+
+        deadline = time.monotonic() + settings.SSE_STREAM_TIMEOUT
+        while time.monotonic() < deadline:
+            message = await pubsub.get_message(
+                timeout=settings.SSE_KEEPALIVE_INTERVAL)
+            if message is None:
+                yield ": keepalive\n\n"
+                continue
+            data = message['data'].decode()
+            yield format_event(data)
+            if until_terminal and _is_terminal(data):
+                return
+    except redis.RedisError as e:
+        logger.warning("Twist status stream interrupted: %s", e)
+    finally:
+        if pubsub is not None:
+            await pubsub.aclose()
+        await client.aclose()
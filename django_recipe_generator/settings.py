@@ -34,8 +34,17 @@ ALLOWED_HOSTS = os.getenv('DJANGO_ALLOWED_HOSTS', '').split(',')
 # Application definition
 DEBUG = os.getenv("DEBUG", "False") == "True"
 
+# "asgi" serves the search/detail views with their async versions (uvicorn workers)
+SERVER_MODE = os.getenv('SERVER_MODE', 'wsgi')
+ASYNC_VIEWS = SERVER_MODE == 'asgi'
+
+# Rarely used subsystems imported on first use instead of at worker boot,
+# comma separated: "admin", "docs" (schema/swagger), "social" (Google login)
+LAZY_SUBSYSTEMS = [s for s in os.getenv('LAZY_SUBSYSTEMS', '').split(',') if s]
+
 INSTALLED_APPS = [
-    'django.contrib.admin',
+    'django.contrib.admin.apps.SimpleAdminConfig' if 'admin' in LAZY_SUBSYSTEMS
+    else 'django.contrib.admin',
     'django.contrib.auth',
     'django.contrib.contenttypes',
     'django.contrib.sessions',
@@ -65,6 +74,12 @@ INSTALLED_APPS = [
 SITE_ID = 1
 
 MIDDLEWARE = [
+    # outermost, so request spans and times include every other middleware
+    'django_recipe_generator.middleware.TracingMiddleware',
+    'django_recipe_generator.middleware.MetricsMiddleware',
+    # so it compresses what every other middleware produced
+    'django_recipe_generator.middleware.CompressionMiddleware',
+    'django_recipe_generator.middleware.QueryProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -73,47 +88,59 @@ MIDDLEWARE = [
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     "allauth.account.middleware.AccountMiddleware",
+    # innermost, so only the views' own queries are routed
+    'django_recipe_generator.middleware.ReplicaRoutingMiddleware',
 ]
 if DEBUG:
     INSTALLED_APPS += ["debug_toolbar"]
-    MIDDLEWARE = ["debug_toolbar.middleware.DebugToolbarMiddleware"] + MIDDLEWARE
+    # inside the compression, the toolbar edits the HTML
+    MIDDLEWARE.insert(4, "debug_toolbar.middleware.DebugToolbarMiddleware")
 
-    LOGGING = {
-        'version': 1,
-        'disable_existing_loggers': False,
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
 
-        'formatters': {
-            'verbose': {
-                'format': '{asctime} {levelname} {name} {message}',
-                'style': '{',
-            },
+    'formatters': {
+        'verbose': {
+            'format': '{asctime} {levelname} {name} {message}',
+            'style': '{',
         },
+    },
 
-        'handlers': {
-            'console': {
-                'class': 'logging.StreamHandler',
-                'formatter': 'verbose',
-            },
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+            'formatter': 'verbose',
         },
+    },
 
-        'loggers': {
-            'django': {
-                'handlers': ['console'],
-                'level': 'ERROR',
-                'propagate': True,
-            },
-            'django.server': {
-                'handlers': ['console'],
-                'level': 'ERROR',
-                'propagate': False,
-            },
-            'django.request': {
-                'handlers': ['console'],
-                'level': 'ERROR',
-                'propagate': False,
-            },
+    'loggers': {
+        # request query profiles, circuit breaker, compression, ...
+        'django_recipe_generator': {
+            'handlers': ['console'],
+            'level': os.getenv('LOG_LEVEL', 'INFO'),
+            'propagate': False,
         },
-    }
+    },
+}
+if DEBUG:
+    LOGGING['loggers'].update({
+        'django': {
+            'handlers': ['console'],
+            'level': 'ERROR',
+            'propagate': True,
+        },
+        'django.server': {
+            'handlers': ['console'],
+            'level': 'ERROR',
+            'propagate': False,
+        },
+        'django.request': {
+            'handlers': ['console'],
+            'level': 'ERROR',
+            'propagate': False,
+        },
+    })
 
 
 ROOT_URLCONF = 'django_recipe_generator.urls'
@@ -141,19 +168,65 @@ CSRF_COOKIE_SECURE = False            # set True in production
 SESSION_COOKIE_AGE = 1209600          # 2 weeks (default)
 
 WSGI_APPLICATION = 'django_recipe_generator.wsgi.application'
+ASGI_APPLICATION = 'django_recipe_generator.asgi.application'
 
 
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# Connections to the database (DB_POOL):
+# - none: a persistent connection per process (thread), kept for 10 minutes,
+# - psycopg: a psycopg 3 pool per process (pip install .[pool]) of DB_POOL_MIN_SIZE
+#   to DB_POOL_MAX_SIZE connections; requests wait up to DB_POOL_TIMEOUT seconds
+#   for one, connections above the minimum close after DB_POOL_MAX_IDLE idle seconds,
+# - pgbouncer: DATABASE_URL points at a transaction-mode pooler such as PgBouncer,
+#   so no server-side cursors (they need a session of their own).
+DB_POOL = os.getenv('DB_POOL', 'none')
+DB_POOL_MIN_SIZE = int(os.getenv('DB_POOL_MIN_SIZE', 1))
+DB_POOL_MAX_SIZE = int(os.getenv('DB_POOL_MAX_SIZE', 4))
+DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', 10))
+DB_POOL_MAX_IDLE = float(os.getenv('DB_POOL_MAX_IDLE', 300))
+
+
+def database(url):
+    """Return the ``DATABASES`` entry of ``url`` for the ``DB_POOL`` mode."""
+    pooled = DB_POOL == 'psycopg' and url.startswith(('postgres', 'postgis'))
+    config = dj_database_url.parse(url, conn_max_age=0 if pooled else 600,
+                                   conn_health_checks=True)
+    if pooled:
+        config.setdefault('OPTIONS', {})['pool'] = {
+            'min_size': DB_POOL_MIN_SIZE,
+            'max_size': DB_POOL_MAX_SIZE,
+            'timeout': DB_POOL_TIMEOUT,
+            'max_idle': DB_POOL_MAX_IDLE,
+        }
+    if DB_POOL == 'pgbouncer':
+        config['DISABLE_SERVER_SIDE_CURSORS'] = True
+    return config
+
+
 DATABASES = {
-    'default': dj_database_url.config(
-        default=f"postgres://{os.getenv('DB_USER')}:{os.getenv('DB_PASSWORD')}@{os.getenv('DB_HOST')}:{os.getenv('DB_PORT')}/{os.getenv('DB_NAME')}",
-        conn_max_age=600,
-        conn_health_checks=True,
-    )
+    'default': database(os.getenv(
+        'DATABASE_URL',
+        f"postgres://{os.getenv('DB_USER')}:{os.getenv('DB_PASSWORD')}@{os.getenv('DB_HOST')}:{os.getenv('DB_PORT')}/{os.getenv('DB_NAME')}")),
 }
 
+# Read replicas, comma separated database URLs (aliases replica1, replica2, ...):
+# the search, list and detail views read from them (db_router.py). Tests use the
+# test database of default for them.
+DATABASE_REPLICA_URLS = [
+    url for url in os.getenv('DATABASE_REPLICA_URLS', '').split(',') if url]
+DATABASE_REPLICAS = [
+    f'replica{number}' for number in range(1, len(DATABASE_REPLICA_URLS) + 1)]
+for alias, url in zip(DATABASE_REPLICAS, DATABASE_REPLICA_URLS):
+    DATABASES[alias] = {**database(url), 'TEST': {'MIRROR': 'default'}}
+DATABASE_ROUTERS = ['django_recipe_generator.db_router.ReplicaRouter']
+# replicas lagging more than REPLICA_MAX_LAG seconds are skipped until the next
+# check; clients that wrote read from the primary for REPLICA_PIN_SECONDS
+REPLICA_MAX_LAG = float(os.getenv('REPLICA_MAX_LAG', 5))
+REPLICA_CHECK_INTERVAL = int(os.getenv('REPLICA_CHECK_INTERVAL', 5))
+REPLICA_PIN_SECONDS = int(os.getenv('REPLICA_PIN_SECONDS', 15))
+
 
 # DATABASES = {
 #    'default': {
@@ -214,16 +287,33 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticatedOrReadOnly',
     ],
-    'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
+    # orjson-backed, stdlib json when orjson is not installed
+    'DEFAULT_RENDERER_CLASSES': [
+        'django_recipe_generator.recipe_generator.api.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'django_recipe_generator.recipe_generator.api.parsers.ORJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
+    'DEFAULT_PAGINATION_CLASS':
+        'django_recipe_generator.recipe_generator.api.pagination.KeysetPagination',
     'PAGE_SIZE': 20,
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
+    # counted in Redis, shared by all workers (api/throttling.py)
     'DEFAULT_THROTTLE_CLASSES': [
-        'rest_framework.throttling.AnonRateThrottle',
-        'rest_framework.throttling.UserRateThrottle',
+        'django_recipe_generator.recipe_generator.api.throttling.AnonRedisThrottle',
+        'django_recipe_generator.recipe_generator.api.throttling.UserRedisThrottle',
+        'django_recipe_generator.recipe_generator.api.throttling.ScopedRedisThrottle',
     ],
     'DEFAULT_THROTTLE_RATES': {
         'anon': '10/minute',
         'user': '1000/day',
+        # per endpoint scopes (throttle_scopes of the views)
+        'search': '30/minute',
+        'detail': '300/minute',
+        'dj_rest_auth': '20/minute',
     }
 }
 SPECTACULAR_SETTINGS = {
@@ -275,6 +365,128 @@ SOCIALACCOUNT_PROVIDERS = {
 }
 
 REDIS_PASSWORD = os.getenv('REDIS_PASSWORD', '')
+REDIS_URL = os.getenv('REDIS_URL', f'redis://:{REDIS_PASSWORD}@redis:6379/0')
+
+CELERY_BROKER_URL = REDIS_URL
+CELERY_RESULT_BACKEND = REDIS_URL
+
+# Cache tiers, one alias each, in Redis at CACHE_URL (services/caching.py), or
+# in process memory with CACHE_BACKEND=locmem (what the test runner uses, see
+# test_runner.py). Keys are prefixed with the alias and, except for sessions,
+# with DEPLOY_ID (the Render commit by default), so each deploy starts with its
+# own entries. Pickled values from CACHE_COMPRESS_MIN_SIZE bytes on are zlib
+# compressed (0: never).
+CACHE_BACKEND = os.getenv('CACHE_BACKEND', 'redis')
+CACHE_URL = os.getenv('CACHE_URL', REDIS_URL)
+DEPLOY_ID = os.getenv('DEPLOY_ID', os.getenv('RENDER_GIT_COMMIT', ''))[:12]
+CACHE_COMPRESS_MIN_SIZE = int(os.getenv('CACHE_COMPRESS_MIN_SIZE', 1024))
+CACHE_TIERS = {  # alias: (default timeout in seconds, prefixed with DEPLOY_ID)
+    'default': (300, True),
+    'search': (60, True),
+    'llm': (7 * 86400, True),
+    'sessions': (SESSION_COOKIE_AGE, False),
+}
+CACHING = 'django_recipe_generator.services.caching'
+
+
+def cache_tiers(backend):
+    """Return the CACHES setting of the tiers on ``backend``, redis or locmem."""
+    return {
+        alias: {
+            'BACKEND': f'{CACHING}.TieredRedisCache',
+            'LOCATION': CACHE_URL,
+            'TIMEOUT': timeout,
+            'KEY_PREFIX': f'{alias}:{DEPLOY_ID}' if per_deploy and DEPLOY_ID else alias,
+            'OPTIONS': {
+                'pool_class': f'{CACHING}.SharedConnectionPool',
+                'serializer': f'{CACHING}.CompressingSerializer',
+                'socket_connect_timeout': 1,
+                'socket_timeout': 1,
+                'health_check_interval': 30,
+            },
+        } if backend == 'redis' else {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': alias,
+            'TIMEOUT': timeout,
+        }
+        for alias, (timeout, per_deploy) in CACHE_TIERS.items()
+    }
+
 
-CELERY_BROKER_URL = f'redis://:{REDIS_PASSWORD}@redis:6379/0'
-CELERY_RESULT_BACKEND = f'redis://:{REDIS_PASSWORD}@redis:6379/0'
+CACHES = cache_tiers(CACHE_BACKEND)
+TEST_RUNNER = 'django_recipe_generator.test_runner.TestRunner'
+# sessions are read from the cache and written through to the database
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+SESSION_CACHE_ALIAS = 'sessions'
+
+# AI twist status server-sent events (seconds); clients reconnect after the timeout
+SSE_STREAM_TIMEOUT = int(os.getenv('SSE_STREAM_TIMEOUT', 60))
+SSE_KEEPALIVE_INTERVAL = int(os.getenv('SSE_KEEPALIVE_INTERVAL', 15))
+# without ASYNC_VIEWS recipe pages poll the status instead (a stream would hold
+# a sync worker), every TWIST_STATUS_POLL_INTERVAL seconds
+TWIST_STATUS_POLL_INTERVAL = int(os.getenv('TWIST_STATUS_POLL_INTERVAL', 3))
+
+# Result counts of paginated searches/lists: exact | approx | none
+# (approx: PostgreSQL planner estimate, else an exact count cached for a while)
+SEARCH_COUNT_MODE = os.getenv('SEARCH_COUNT_MODE', 'exact')
+SEARCH_COUNT_CACHE_TIMEOUT = int(os.getenv('SEARCH_COUNT_CACHE_TIMEOUT', 60))
+
+# Most recipes one GET /api/recipes/batch/?ids= may ask for
+RECIPE_BATCH_MAX_IDS = int(os.getenv('RECIPE_BATCH_MAX_IDS', 50))
+# Most objects one request to the bulk create/update/delete endpoints may write
+API_BULK_MAX_ITEMS = int(os.getenv('API_BULK_MAX_ITEMS', 500))
+
+# Ingredient searches on the RecipeSignature table (PostgreSQL only)
+SEARCH_USE_SIGNATURES = os.getenv('SEARCH_USE_SIGNATURES', 'True') == 'True'
+
+# Cached search result pages (seconds, services/search_cache.py): fresh for
+# SEARCH_CACHE_TIMEOUT, then served stale for up to SEARCH_CACHE_STALE_TIMEOUT
+# while one process recomputes them; popular pages are refreshed early by a
+# Celery task (XFetch, a larger beta refreshes earlier)
+SEARCH_CACHE_TIMEOUT = int(os.getenv('SEARCH_CACHE_TIMEOUT', 60))
+SEARCH_CACHE_STALE_TIMEOUT = int(os.getenv('SEARCH_CACHE_STALE_TIMEOUT', 600))
+SEARCH_CACHE_XFETCH_BETA = float(os.getenv('SEARCH_CACHE_XFETCH_BETA', 1.0))
+
+# All ingredients (seconds), for ingredient choices and validating ingredient IDs;
+# dropped on every ingredient change
+INGREDIENT_CATALOGUE_TIMEOUT = int(os.getenv('INGREDIENT_CATALOGUE_TIMEOUT', 3600))
+
+# Rendered recipe detail fragments (seconds); invalidated by recipe version stamps
+RECIPE_FRAGMENT_CACHE_TIMEOUT = int(os.getenv('RECIPE_FRAGMENT_CACHE_TIMEOUT', 86400))
+
+# Response compression: bodies below COMPRESSION_MIN_SIZE bytes are sent as is;
+# shareable responses are cached compressed for COMPRESSION_CACHE_TIMEOUT seconds
+COMPRESSION_MIN_SIZE = int(os.getenv('COMPRESSION_MIN_SIZE', 1024))
+COMPRESSION_BROTLI_QUALITY = int(os.getenv('COMPRESSION_BROTLI_QUALITY', 5))
+COMPRESSION_CACHE_TIMEOUT = int(os.getenv('COMPRESSION_CACHE_TIMEOUT', 3600))
+
+# Per-request SQL profiling of a sample of requests (0-1): query count, DB time and
+# slowest statements go to the log and the Server-Timing header; requests over
+# a threshold (milliseconds / query count) are logged as warnings
+QUERY_PROFILE_SAMPLE_RATE = float(os.getenv('QUERY_PROFILE_SAMPLE_RATE', 0.01))
+QUERY_PROFILE_SLOW_QUERY_MS = float(os.getenv('QUERY_PROFILE_SLOW_QUERY_MS', 100))
+QUERY_PROFILE_SLOW_DB_MS = float(os.getenv('QUERY_PROFILE_SLOW_DB_MS', 300))
+QUERY_PROFILE_MAX_QUERIES = int(os.getenv('QUERY_PROFILE_MAX_QUERIES', 50))
+QUERY_PROFILE_TOP_QUERIES = int(os.getenv('QUERY_PROFILE_TOP_QUERIES', 3))
+
+# Prometheus metrics at /metrics (and /health/db); scrapers must send
+# "Authorization: Bearer <METRICS_TOKEN>", without a token only DEBUG servers
+# answer. Multiple processes (gunicorn workers, Celery) share their metrics
+# through the PROMETHEUS_MULTIPROC_DIR directory.
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+
+# OpenTelemetry tracing (the tracing extra): '' (off), console, or file for one
+# JSON span per line in TRACING_FILE; OTEL_SERVICE_NAME names the process
+TRACING_EXPORTER = os.getenv('TRACING_EXPORTER', '')
+TRACING_FILE = os.getenv('TRACING_FILE', BASE_DIR / 'traces.jsonl')
+
+# Gemini retries (seconds): full-jitter exponential backoff for 429/5xx/timeouts
+GEMINI_MAX_RETRIES = int(os.getenv('GEMINI_MAX_RETRIES', 5))
+GEMINI_RETRY_BACKOFF = int(os.getenv('GEMINI_RETRY_BACKOFF', 2))
+GEMINI_RETRY_BACKOFF_MAX = int(os.getenv('GEMINI_RETRY_BACKOFF_MAX', 300))
+
+# Shared (Redis) circuit breaker around Gemini calls
+GEMINI_CIRCUIT_FAILURE_THRESHOLD = int(
+    os.getenv('GEMINI_CIRCUIT_FAILURE_THRESHOLD', 5))
+GEMINI_CIRCUIT_FAILURE_WINDOW = int(os.getenv('GEMINI_CIRCUIT_FAILURE_WINDOW', 60))
+GEMINI_CIRCUIT_RECOVERY_TIMEOUT = int(os.getenv('GEMINI_CIRCUIT_RECOVERY_TIMEOUT', 120))
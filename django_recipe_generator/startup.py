@@ -0,0 +1,157 @@
+"""Worker startup helpers.
+
+- opt-in lazy loading of rarely used subsystems (``LAZY_SUBSYSTEMS``),
+- fork hooks for running gunicorn with ``--preload``,
+- ``-X importtime`` parsing and time-to-first-request measurement used by
+  the ``profile_startup`` management command.
+"""
+import json
+import os
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+
+def is_lazy(subsystem):
+    """Return True if ``subsystem`` is configured to load on first use."""
+    return subsystem in settings.LAZY_SUBSYSTEMS
+
+
+def lazy_api_view(dotted_path, **initkwargs):
+    """Return a DRF view that imports ``dotted_path`` on its first request.
+
+    The wrapper is csrf-exempt like ``APIView.as_view()``; DRF applies its
+    own CSRF checks once the real view runs.
+    """
+    view = None
+
+    def view_func(request, *args, **kwargs):
+        nonlocal view
+        if view is None:
+            view = import_string(dotted_path).as_view(**initkwargs)
+        return view(request, *args, **kwargs)
+
+    view_func.csrf_exempt = True
+    return view_func
+
+
+def api_view(subsystem, dotted_path, **initkwargs):
+    """Import the DRF view now, or defer it if ``subsystem`` is lazy."""
+    if is_lazy(subsystem):
+        return lazy_api_view(dotted_path, **initkwargs)
+    return import_string(dotted_path).as_view(**initkwargs)
+
+
+def lazy_include(urlconf_module, namespace):
+    """Like ``include()`` but the URLconf module is imported on first resolve.
+
+    Only namespaced includes stay lazy: ``reverse()`` of non-namespaced names
+    walks every resolver, whereas a namespace is entered only when one of
+    its own names is reversed or one of its URLs is requested.
+    """
+    return (urlconf_module, namespace, namespace)
+
+
+def close_connections_before_fork():
+    """Drop DB and Redis connections opened while preloading the app.
+
+    Called in the gunicorn master: sockets inherited by forked workers
+    would otherwise be shared between processes (and psycopg pools lose
+    their threads).
+    """
+    from django.db import connections
+    from django_recipe_generator.services import db_pools, redis_client
+
+    connections.close_all()
+    db_pools.close_pools()
+    redis_client.reset()
+
+
+def reset_connections_after_fork():
+    """Make sure a freshly forked worker opens its own connections."""
+    from django_recipe_generator.services import redis_client
+
+    redis_client.reset(disconnect=False)
+
+
+def warm_up():
+    """Build URL resolvers once so preloaded workers inherit them."""
+    from django.urls import get_resolver, reverse
+
+    get_resolver().url_patterns
+    reverse('index')
+
+
+def parse_importtime(stderr):
+    """Parse ``python -X importtime`` output.
+
+    Returns a list of (module, self_us, cumulative_us, depth) tuples in
+    the order Python reported them.
+    """
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip())) // 2
+        rows.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    return rows
+
+
+FIRST_REQUEST_SCRIPT = """
+import json, sys, time
+from wsgiref.util import setup_testing_defaults
+
+started = time.time()
+from django_recipe_generator.wsgi import application
+loaded = time.time()
+
+environ = {{'PATH_INFO': {path!r}, 'HTTP_HOST': {host!r}}}
+setup_testing_defaults(environ)
+status = []
+body = application(environ, lambda s, h, exc_info=None: status.append(s))
+b''.join(body)
+body.close()
+done = time.time()
+
+print(json.dumps({{
+    'started': started, 'loaded': loaded, 'done': done,
+    'status': status[0],
+    'modules': sorted(m for m in sys.modules if m.startswith({prefixes!r})),
+}}))
+"""
+
+
+def profile_startup(path='/', host='localhost', env=None, watch=()):
+    """Boot the WSGI app in a fresh interpreter and serve one request.
+
+    Returns a dict with ``imports`` (see ``parse_importtime``), timings in
+    milliseconds (``app_load_ms``, ``first_request_ms`` and
+    ``time_to_first_request_ms`` measured from process launch), the response
+    ``status`` and which of the ``watch`` module prefixes got imported.
+    """
+    env = {**os.environ, **(env or {})}
+    env.setdefault('DJANGO_SETTINGS_MODULE', 'django_recipe_generator.settings')
+    script = FIRST_REQUEST_SCRIPT.format(path=path, host=host,
+                                         prefixes=tuple(watch))
+
+    launched = time.time()
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', script],
+        cwd=settings.BASE_DIR, env=env, capture_output=True, text=True,
+    )
+    if result.returncode:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+
+    report = json.loads(result.stdout.strip().splitlines()[-1])
+    return {
+        'imports': parse_importtime(result.stderr),
+        'app_load_ms': (report['loaded'] - report['started']) * 1000,
+        'first_request_ms': (report['done'] - report['loaded']) * 1000,
+        'time_to_first_request_ms': (report['done'] - launched) * 1000,
+        'status': report['status'],
+        'modules': report['modules'],
+    }
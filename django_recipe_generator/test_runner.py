@@ -0,0 +1,48 @@
+"""Test runner keeping the tests off the shared Redis.
+
+``TEST_RUNNER`` points here, so ``manage.py test``, ``python -m django
+test`` and anything else running Django's test command get in-memory
+cache tiers, unless ``CACHE_BACKEND`` is set explicitly (e.g. to run the
+tests against Redis). Runners that bypass the test command (pytest) need
+``CACHE_BACKEND=locmem`` in their environment.
+
+The throttles, the Gemini circuit breaker and the twist status pub/sub
+(``get_redis()``) are pointed at ``TEST_REDIS_URL``, by default a port
+nothing listens on: they then run their Redis-down paths instead of
+counting test requests against, or publishing to, the live Redis of the
+``web`` container. Tests exercising them patch ``get_redis``.
+"""
+import os
+
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+from django_recipe_generator.services import redis_client
+from django_recipe_generator.settings import cache_tiers
+
+# connections are refused right away
+NO_REDIS_URL = 'redis://127.0.0.1:1/0'
+
+
+class TestRunner(DiscoverRunner):
+    """``DiscoverRunner`` with the cache tiers in process memory, off Redis."""
+
+    def setup_test_environment(self, **kwargs):
+        """Swap the cache tiers and ``REDIS_URL`` before the tests run."""
+        super().setup_test_environment(**kwargs)
+        self.cache_settings = None
+        if not os.getenv('CACHE_BACKEND'):
+            self.cache_settings = override_settings(CACHES=cache_tiers('locmem'))
+            self.cache_settings.enable()
+        self.redis_settings = override_settings(
+            REDIS_URL=os.getenv('TEST_REDIS_URL', NO_REDIS_URL))
+        self.redis_settings.enable()
+        redis_client.reset()
+
+    def teardown_test_environment(self, **kwargs):
+        """Restore the configured cache tiers and Redis."""
+        self.redis_settings.disable()
+        redis_client.reset()
+        if self.cache_settings is not None:
+            self.cache_settings.disable()
+        super().teardown_test_environment(**kwargs)
@@ -0,0 +1,203 @@
+"""OpenTelemetry tracing across requests, Celery tasks and Gemini calls.
+
+Enabled with ``TRACING_EXPORTER`` (``console`` or ``file``, one JSON span
+per line in ``TRACING_FILE``) when the ``tracing`` extra is installed.
+The trace context travels from the web process to the worker in the Celery
+message headers, so a recipe save, the ``generate_ai_twist`` task it
+queues and the task's Gemini call end up in one trace:
+
+- ``TracingMiddleware``: a span per request,
+- ``traced``/``span``: spans around signal handlers, ORM query groups and
+  the Gemini call,
+- ``TracedTask``: a span around publishing a task; ``task_prerun`` and
+  ``task_postrun`` open and close a span around running it.
+
+Every span also counts the SQL queries run while it is current
+(``db.query_count``, ``db.duration_ms``). Use ``manage.py show_traces``
+to read a trace file as span trees.
+"""
+import contextlib
+import functools
+import os
+import time
+
+from celery import Task
+from celery.signals import (
+    before_task_publish, task_failure, task_postrun, task_prerun,
+    worker_process_shutdown)
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+try:
+    from opentelemetry import context, propagate, trace
+    from opentelemetry.sdk.resources import SERVICE_NAME, Resource
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import (
+        BatchSpanProcessor, ConsoleSpanExporter)
+except ImportError:  # optional: pip install .[tracing]
+    trace = None
+
+_enabled = False
+
+
+def enabled():
+    """Whether spans are recorded and exported in this process."""
+    return _enabled
+
+
+def configure(exporter=None):
+    """Set up tracing per ``TRACING_EXPORTER``, or with ``exporter``.
+
+    Called once per process when the app is ready; a no-op when tracing is
+    off or the ``tracing`` extra is not installed.
+    """
+    global _enabled
+    if trace is None or _enabled:
+        return
+    exporter = exporter or build_exporter()
+    if exporter is None:
+        return
+
+    provider = TracerProvider(resource=Resource.create({
+        SERVICE_NAME: os.getenv('OTEL_SERVICE_NAME', 'recipe-generator')}))
+    provider.add_span_processor(BatchSpanProcessor(exporter))
+    trace.set_tracer_provider(provider)
+
+    connection_created.connect(install_query_counter,
+                               dispatch_uid='install_query_counter')
+    for connection in connections.all(initialized_only=True):
+        install_query_counter(connection)
+    before_task_publish.connect(inject_task_context,
+                                dispatch_uid='inject_task_context')
+    task_prerun.connect(start_task_span, dispatch_uid='start_task_span')
+    task_failure.connect(record_task_failure, dispatch_uid='record_task_failure')
+    task_postrun.connect(end_task_span, dispatch_uid='end_task_span')
+    worker_process_shutdown.connect(flush, dispatch_uid='flush_spans')
+    _enabled = True
+
+
+def build_exporter():
+    """Span exporter selected by ``TRACING_EXPORTER``, None when off."""
+    if settings.TRACING_EXPORTER == 'console':
+        return ConsoleSpanExporter()
+    if settings.TRACING_EXPORTER == 'file':
+        out = open(settings.TRACING_FILE, 'a', buffering=1)
+        return ConsoleSpanExporter(
+            out=out, formatter=lambda span: span.to_json(indent=None) + '\n')
+    if settings.TRACING_EXPORTER:
+        raise ImproperlyConfigured(
+            f"TRACING_EXPORTER must be console or file, "
+            f"not {settings.TRACING_EXPORTER!r}")
+    return None
+
+
+def flush(**kwargs):
+    """Export the spans still buffered, e.g. before a worker process exits."""
+    if _enabled:
+        trace.get_tracer_provider().force_flush()
+
+
+def span(name, kind='internal', attributes=None, context=None):
+    """Context manager running the block in a new current span."""
+    if not _enabled:
+        return contextlib.nullcontext()
+    return trace.get_tracer(__name__).start_as_current_span(
+        name, context=context, kind=trace.SpanKind[kind.upper()],
+        attributes=attributes)
+
+
+def traced(name=None):
+    """Decorate a function to run in a span named ``name`` (its own name)."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name or func.__qualname__):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def count_query(execute, sql, params, many, context):
+    """Database execute wrapper adding up queries on the current span."""
+    current = trace.get_current_span()
+    if not current.is_recording():
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        duration_ms = (time.perf_counter() - started) * 1000
+        current.set_attributes({
+            'db.query_count': current.attributes.get('db.query_count', 0) + 1,
+            'db.duration_ms': round(
+                current.attributes.get('db.duration_ms', 0) + duration_ms, 3),
+        })
+
+
+def install_query_counter(connection, **kwargs):
+    """Add ``count_query`` to ``connection``'s execute wrappers, once."""
+    if count_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(count_query)
+
+
+class TracedTask(Task):
+    """Celery task class publishing tasks in a ``celery.publish`` span."""
+
+    def apply_async(self, args=None, kwargs=None, **options):
+        """Queue the task; ``inject_task_context`` adds the span to its headers."""
+        with span(f'celery.publish {self.name}', kind='producer',
+                  attributes={'messaging.system': 'celery'}):
+            return super().apply_async(args, kwargs, **options)
+
+
+def inject_task_context(headers=None, **kwargs):
+    """``before_task_publish``: pass the current trace on in the headers."""
+    propagate.inject(headers)
+
+
+class RequestGetter:
+    """Propagator getter reading message headers from ``task.request``.
+
+    Workers set them as request attributes, eager ``apply(headers=...)``
+    calls in ``request.headers``.
+    """
+
+    def get(self, carrier, key):
+        value = getattr(carrier, key, None) or (carrier.headers or {}).get(key)
+        return [value] if value is not None else None
+
+    def keys(self, carrier):
+        return []
+
+
+def start_task_span(task_id=None, task=None, **kwargs):
+    """``task_prerun``: run the task in a span continuing the publisher's trace."""
+    parent = propagate.extract(task.request, getter=RequestGetter())
+    if not trace.get_current_span(parent).get_span_context().is_valid:
+        parent = None  # eager or untraced publisher: nest under the current span
+    task_span = trace.get_tracer(__name__).start_span(
+        f'celery.run {task.name}', context=parent, kind=trace.SpanKind.CONSUMER,
+        attributes={'messaging.system': 'celery', 'celery.task_id': task_id,
+                    'celery.retries': task.request.retries or 0})
+    token = context.attach(trace.set_span_in_context(task_span, parent))
+    task.request.trace_span = (task_span, token)
+
+
+def record_task_failure(exception=None, **kwargs):
+    """``task_failure``: mark the running task's span failed."""
+    current = trace.get_current_span()
+    current.record_exception(exception)
+    current.set_status(trace.StatusCode.ERROR, type(exception).__name__)
+
+
+def end_task_span(task=None, state=None, **kwargs):
+    """``task_postrun``: close the span opened by ``start_task_span``."""
+    task_span, token = getattr(task.request, 'trace_span', (None, None))
+    if task_span is None:
+        return
+    del task.request.trace_span
+    task_span.set_attribute('celery.state', state or '')
+    context.detach(token)
+    task_span.end()
@@ -5,20 +5,22 @@ This module defines the URL patterns for the project, including:
 - The root URL serving a project description page.
 - The recipe_generator app URLs.
 - The Django admin interface.
+- The Prometheus metrics endpoint and the database health check.
 """
-from django.contrib import admin
-from allauth.account.decorators import secure_admin_login
 from django.urls import path
 from django.urls import include
 from django.views.generic import TemplateView
 
-# allauth admin
-admin.autodiscover()
-admin.site.login = secure_admin_login(admin.site.login)
+from django_recipe_generator.metrics import db_health_view, metrics_view
+from django_recipe_generator.startup import is_lazy, lazy_include
 
 urlpatterns = [
     path('', TemplateView.as_view(template_name="project_page.html")),
     path('recipe_generator/',
          include('django_recipe_generator.recipe_generator.urls')),
-    path('admin/', admin.site.urls),
+    path('admin/',
+         lazy_include('django_recipe_generator.admin_urls', namespace='admin')
+         if is_lazy('admin') else include('django_recipe_generator.admin_urls')),
+    path('metrics', metrics_view, name='metrics'),
+    path('health/db', db_health_view, name='db_health'),
 ]
@@ -28,5 +28,9 @@ echo "Upload recipes..."
 python manage.py load_data
 
 echo "Starting server..."
-gunicorn django_recipe_generator.wsgi:application --bind 0.0.0.0:8000 --timeout 120 --access-logfile -
+if [ "$SERVER_MODE" = "asgi" ]; then
+  gunicorn django_recipe_generator.asgi:application --config gunicorn.conf.py
+else
+  gunicorn django_recipe_generator.wsgi:application --config gunicorn.conf.py
+fi
 #uv run manage.py runserver 0.0.0.0:8000
@@ -0,0 +1,48 @@
+"""Gunicorn configuration.
+
+Set SERVER_MODE=asgi to run uvicorn workers with the async views.
+
+Set GUNICORN_PRELOAD=True to import the Django app once in the master
+and fork workers from it (faster worker boot/recycling, shared memory).
+Connections opened while preloading are closed before forking so every
+worker gets its own DB and Redis sockets.
+
+With PROMETHEUS_MULTIPROC_DIR set, exited workers are marked dead for
+prometheus_client's multiprocess mode.
+"""
+import os
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:8000')
+workers = int(os.getenv('GUNICORN_WORKERS', 1))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 120))
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', 0))
+max_requests_jitter = int(os.getenv('GUNICORN_MAX_REQUESTS_JITTER', 0))
+preload_app = os.getenv('GUNICORN_PRELOAD', 'False') == 'True'
+# SERVER_MODE=asgi: serve django_recipe_generator.asgi:application with uvicorn
+if os.getenv('SERVER_MODE', 'wsgi') == 'asgi':
+    worker_class = 'uvicorn_worker.UvicornWorker'
+accesslog = '-'
+
+
+def when_ready(server):
+    if preload_app:
+        from django_recipe_generator.startup import warm_up
+        warm_up()
+
+
+def pre_fork(server, worker):
+    if preload_app:
+        from django_recipe_generator.startup import close_connections_before_fork
+        close_connections_before_fork()
+
+
+def post_fork(server, worker):
+    if preload_app:
+        from django_recipe_generator.startup import reset_connections_after_fork
+        reset_connections_after_fork()
+
+
+def child_exit(server, worker):
+    if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)